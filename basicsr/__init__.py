@@ -1,11 +1,23 @@
 # https://github.com/xinntao/BasicSR
 # flake8: noqa
-from .archs import *
-from .data import *
-from .losses import *
-from .metrics import *
-from .models import *
-from .test import *
-from .train import *
-from .utils import *
+# Sub-packages are imported lazily on first access (PEP 562), so importing a single
+# module such as basicsr.archs.pft_arch does not pull in the whole training stack.
+import importlib
+
+_SUBMODULES = ('archs', 'data', 'losses', 'metrics', 'models', 'test', 'train', 'utils')
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'.{name}', __name__)
+    # names re-exported from the sub-packages (formerly `from .xxx import *`)
+    if not name.startswith('_'):
+        for submodule in _SUBMODULES:
+            module = importlib.import_module(f'.{submodule}', __name__)
+            if hasattr(module, name):
+                value = getattr(module, name)
+                globals()[name] = value
+                return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
 # from .version import __gitsha__, __version__
@@ -2,20 +2,33 @@ import importlib
 from copy import deepcopy
 from os import path as osp
 
-from basicsr.utils import get_root_logger, scandir
+from basicsr.utils.logger import get_root_logger
+from basicsr.utils.misc import scandir
 from basicsr.utils.registry import ARCH_REGISTRY
 
 __all__ = ['build_network']
 
-# automatically scan and import arch modules for registry
-# scan all the files under the 'archs' folder and collect files ending with '_arch.py'
-arch_folder = osp.dirname(osp.abspath(__file__))
-arch_filenames = [osp.splitext(osp.basename(v))[0] for v in scandir(arch_folder) if v.endswith('_arch.py')]
-# import all the arch modules
-_arch_modules = [importlib.import_module(f'basicsr.archs.{file_name}') for file_name in arch_filenames]
+_arch_modules = None
+
+
+def import_arch_modules():
+    """Scan and import all the arch modules for registry.
+
+    This is deferred to the first build_network call, so importing a single arch
+    module (e.g. basicsr.archs.pft_arch for inference) does not import them all.
+    """
+    global _arch_modules
+    if _arch_modules is None:
+        # scan all the files under the 'archs' folder and collect files ending with '_arch.py'
+        arch_folder = osp.dirname(osp.abspath(__file__))
+        arch_filenames = [osp.splitext(osp.basename(v))[0] for v in scandir(arch_folder) if v.endswith('_arch.py')]
+        # import all the arch modules
+        _arch_modules = [importlib.import_module(f'basicsr.archs.{file_name}') for file_name in arch_filenames]
+    return _arch_modules
 
 
 def build_network(opt):
+    import_arch_modules()
     opt = deepcopy(opt)
     network_type = opt.pop('type')
     net = ARCH_REGISTRY.get(network_type)(**opt)
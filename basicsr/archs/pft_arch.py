@@ -12,11 +12,15 @@ import torch.nn as nn
 import torch.utils.checkpoint as checkpoint
 import torch.nn.functional as F
 from basicsr.archs.arch_util import to_2tuple, trunc_normal_
-from fairscale.nn import checkpoint_wrapper
 from basicsr.utils.registry import ARCH_REGISTRY
 from torch.autograd import Function
 from torch.autograd.function import once_differentiable
-import smm_cuda
+
+try:
+    import smm_cuda
+except ImportError:
+    # The CUDA extension (ops_smm) is optional: without it, sparse attention falls back to dense PyTorch ops.
+    smm_cuda = None
 
 
 class SMM_QmK(Function):
@@ -137,6 +141,33 @@ class SMM_AmV(Function):
 
 
 
+def smm_qmk(A, B, index):
+    """
+    Sparse matrix multiplication of query (A, (b, n, d)) and transposed key (B, (b, d, n)) matrices
+    at the given indices (index, (b, n, topk)).
+
+    Uses the CUDA kernel when available, otherwise computes the dense product and gathers the
+    selected entries (same result and memory footprint as the dense attention layers).
+    """
+    if smm_cuda is not None and A.is_cuda:
+        return SMM_QmK.apply(A, B, index)
+    return torch.gather(A @ B, dim=-1, index=index.long())
+
+
+def smm_amv(A, B, index):
+    """
+    Sparse matrix multiplication of the top-k attention values (A, (b, n, topk)) scattered at the
+    given indices (index, (b, n, topk)) and the value matrix (B, (b, n, d)).
+
+    Uses the CUDA kernel when available, otherwise scatters the attention into a dense map.
+    """
+    if smm_cuda is not None and A.is_cuda:
+        return SMM_AmV.apply(A, B, index)
+    n = B.shape[1]
+    attn = A.new_zeros(A.shape[0], A.shape[1], n).scatter_(-1, index.long(), A)
+    return attn @ B
+
+
 class dwconv(nn.Module):
     def __init__(self, hidden_features, kernel_size=5):
         super(dwconv, self).__init__()
@@ -273,7 +304,7 @@ class WindowAttention(nn.Module):
             q = q.contiguous().view(b_ * self.num_heads, n, c // self.num_heads)
             k = k.contiguous().view(b_ * self.num_heads, n, c // self.num_heads).transpose(-2, -1)
             smm_index = pfa_indices[shift].view(b_ * self.num_heads, n, topk).int()
-            attn = SMM_QmK.apply(q, k, smm_index).view(b_, self.num_heads, n, topk)
+            attn = smm_qmk(q, k, smm_index).view(b_, self.num_heads, n, topk)
 
             relative_position_bias = self.relative_position_bias_table[rpi.view(-1)].view(self.window_size[0] * self.window_size[1], self.window_size[0] * self.window_size[1], -1)  # Wh*Ww,Wh*Ww,nH
             relative_position_bias = relative_position_bias.permute(2, 0, 1).contiguous().unsqueeze(0).expand(b_, self.num_heads, n, n)  # nH, Wh*Ww, Wh*Ww
@@ -335,7 +366,7 @@ class WindowAttention(nn.Module):
             attn = attn.view(b_ * self.num_heads, n, topk)
             v = v.contiguous().view(b_ * self.num_heads, n, c // self.num_heads)
             smm_index = pfa_indices[shift].view(b_ * self.num_heads, n, topk).int()
-            x = (SMM_AmV.apply(attn, v, smm_index).view(b_, self.num_heads, n, c // self.num_heads)+ v_lepe).transpose(1, 2).reshape(b_, n, c)
+            x = (smm_amv(attn, v, smm_index).view(b_, self.num_heads, n, c // self.num_heads)+ v_lepe).transpose(1, 2).reshape(b_, n, c)
 
         # only in inference. After use, delete unnecessary variables to free memory
         if not self.training:
@@ -364,6 +395,58 @@ class WindowAttention(nn.Module):
         flops += n * self.dim * self.dim
         return flops
 
+    def memory(self, num_windows, prev_topk=None, shift=False, element_size=4, sparse_kernel=True):
+        """
+        Estimated peak memory allocated inside forward() at inference, and the size of the PFA state
+        (values and indices) it leaves for its shift.
+
+        Args:
+            num_windows: Number of windows, times the batch size
+            prev_topk: Top-k of the PFA indices of the previous layer with the same shift, or None
+                (no indices yet: dense n x n attention)
+            shift: Shifted windows (the attention mask is added out of place)
+            element_size: Bytes per activation value
+            sparse_kernel: The SMM CUDA kernels are used (otherwise smm_qmk / smm_amv build
+                dense n x n maps)
+
+        Returns:
+            (peak bytes, PFA state bytes)
+        """
+        e = element_size
+        n = self.window_size[0] * self.window_size[1]
+        rows = num_windows * self.num_heads * n  # attention rows
+        act = num_windows * n * self.dim * e  # one (windows, n, c) activation
+        dense = prev_topk is None
+        k_in = n if dense else prev_topk
+
+        # q * scale (and the contiguous k of the sparse path)
+        live = act if dense else 2 * act
+        attn = rows * k_in * e
+        if dense:
+            # the shift mask is added out of place
+            peak = live + attn * (2 if shift else 1)
+        else:
+            index = rows * k_in * 4  # int32 SMM index
+            qmk = rows * (n * e + k_in * 8) if not sparse_kernel else 0  # dense product + int64 index
+            bias = self.relative_position_bias_table.shape[1] * n * n * e
+            live += index
+            peak = live + max(qmk + attn, attn + bias + rows * k_in * e)
+
+        # top-k selection: values, int64 indices (and the gathered PFA indices)
+        if self.topk < n:
+            k_out = self.topk
+            selected = rows * k_out * (e + 8) + (0 if dense else rows * k_out * 8)
+            peak = max(peak, live + attn + selected)
+            state = rows * k_out * (e + 8)
+        else:
+            k_out = k_in
+            state = attn + (0 if dense else rows * k_in * 8)
+
+        # attn @ v (+ LePE, transposed copy); smm_amv without the kernel scatters a dense map
+        amv = rows * (n * e + k_out * 8) if not sparse_kernel and k_out < n else 0
+        peak = max(peak, live + state + amv + 3 * act)
+        return peak, state
+
 class PFTransformerLayer(nn.Module):
     r"""
     PFT Transformer Layer
@@ -496,6 +579,42 @@ class PFTransformerLayer(nn.Module):
 
         return flops
 
+    def memory(self, input_resolution, batch=1, element_size=4, prev_topk=None, sparse_kernel=True):
+        """
+        Estimated peak memory allocated inside forward() at inference (the input and the PFA state
+        of earlier layers are counted by the caller), and the size of the PFA state it leaves.
+
+        The locals of forward() stay alive until it returns, so the qkv projection, the qkvp
+        concat (4c) and its windows are still allocated while the ConvFFN runs.
+
+        Args:
+            input_resolution: (h, w), multiples of the window size
+            batch: Batch size
+            element_size: Bytes per activation value
+            prev_topk: Top-k of the PFA indices of the previous layer with the same shift, or None
+            sparse_kernel: The SMM CUDA kernels are used
+
+        Returns:
+            (peak bytes, PFA state bytes)
+        """
+        h, w = input_resolution
+        shift = self.shift_size > 0
+        act = batch * h * w * self.dim * element_size
+        hidden = act * self.mlp_ratio
+        num_windows = batch * (h // self.window_size) * (w // self.window_size)
+
+        # norm1, qkv (3c) and the LePE convolution (transposed copy, conv, GELU)
+        lepe = act * 7
+        # norm1, qkv, LePE, qkvp concat (4c), rolled copy (4c), windows (4c)
+        before_attn = act * (13 + (4 if shift else 0))
+        attn_peak, state = self.attn_win.memory(num_windows, prev_topk, shift, element_size, sparse_kernel)
+        # output, window_reverse, reverse roll and the residual sum, then norm2 and the ConvFFN
+        # (fc1, GELU, transposed copy, conv, GELU, sum)
+        after_attn = act * (15 + (1 if shift else 0))
+        convffn = after_attn + act + hidden * 4
+
+        return int(max(lepe, before_attn + attn_peak, convffn)), state
+
 class PatchMerging(nn.Module):
     r""" Patch Merging Layer.
 
@@ -612,7 +731,7 @@ class BasicBlock(nn.Module):
 
     def forward(self, x, pfa_list, x_size, params):
         for layer in self.layers:
-            #checkpoint_wrapper is not yet supported for PFT
+            #checkpoint_wrapper (from fairscale.nn) is not yet supported for PFT
             # idx_checkpoint = 4
             # if self.use_checkpoint and self.idx < idx_checkpoint:
             #     layer = checkpoint_wrapper(layer, offload_to_cpu=False)
@@ -832,6 +951,17 @@ class Upsample(nn.Sequential):
             # flops += self.num_feat * 9 * self.num_feat * 25 * x * y
         return flops
 
+    def memory(self, input_resolution, batch=1, element_size=4):
+        """Estimated peak memory of the conv / pixel shuffle stages (input, conv output and shuffled output)"""
+        h, w = input_resolution
+        factors = [2] * int(math.log(self.scale, 2)) if (self.scale & (self.scale - 1)) == 0 else [3]
+        peak = 0
+        for f in factors:
+            pixels = batch * h * w * element_size
+            peak = max(peak, pixels * self.num_feat * (1 + 2 * f * f))
+            h, w = h * f, w * f
+        return peak
+
 class UpsampleOneStep(nn.Sequential):
     """UpsampleOneStep module (the difference with Upsample is that it always only has 1conv + 1pixelshuffle)
        Used in lightweight SR to save parameters.
@@ -856,6 +986,12 @@ class UpsampleOneStep(nn.Sequential):
         flops = h * w * self.num_feat * 3 * 9
         return flops
 
+    def memory(self, input_resolution, batch=1, element_size=4):
+        """Estimated peak memory: input, conv output (scale^2 * 3 channels) and shuffled output"""
+        h, w = self.input_resolution if input_resolution is None else input_resolution
+        conv = self[0]
+        return batch * h * w * element_size * (self.num_feat + 2 * conv.out_channels)
+
 @ARCH_REGISTRY.register()
 class PFT(nn.Module):
     r""" PFT
@@ -1144,6 +1280,19 @@ class PFT(nn.Module):
 
         return x
 
+    def profile(self, synchronize=True, trace=False):
+        """
+        Per-module timing, FLOPs and memory instrumentation (see PFTProfiler), e.g.
+
+            with model.profile() as prof:
+                model(x)
+            prof.print_table()
+
+        Nothing is recorded (and the forward is unchanged) outside of the context.
+        """
+        from basicsr.archs.pft_profiler import PFTProfiler
+        return PFTProfiler(self, synchronize=synchronize, trace=trace)
+
     def flops(self, input_resolution=None):
         flops = 0
         resolution = self.patches_resolution if input_resolution is None else input_resolution
@@ -1160,6 +1309,81 @@ class PFT(nn.Module):
 
         return flops
 
+    def memory(self, input_resolution=None, batch=1, dtype=None, sparse_kernel=None, per_layer=False):
+        """
+        Analytic estimate of the peak activation memory of forward() at inference (torch.no_grad),
+        the memory counterpart of flops(). Weights are not included.
+
+        Counted: the padded input, the shift mask, the shallow features, per PFTransformerLayer the
+        qkv / LePE / qkvp concat / window buffers, the attention maps (dense n x n while the PFA
+        top-k is the window size, (n, top-k) afterwards) with the PFA state of both shifts, the
+        ConvFFN, and the upsampler outputs. Allocator caching and workspace memory of the conv /
+        matmul backends are not.
+
+        Args:
+            input_resolution: (h, w) of the input (padded to the window size), default: img_size
+            batch: Batch size
+            dtype: Activation dtype (default: dtype of the parameters)
+            sparse_kernel: The SMM CUDA kernels are used (default: ops_smm is built and the model is
+                on CUDA). Without them, the sparse layers build dense n x n maps.
+            per_layer: Also return the estimated peak of each stage
+
+        Returns:
+            int: Peak bytes, or (peak bytes, OrderedDict stage name -> peak bytes) if per_layer
+        """
+        from collections import OrderedDict
+
+        parameter = next(self.parameters())
+        dtype = parameter.dtype if dtype is None else dtype
+        e = torch.empty((), dtype=dtype).element_size()
+        if sparse_kernel is None:
+            sparse_kernel = smm_cuda is not None and parameter.is_cuda
+
+        h, w = self.patches_resolution if input_resolution is None else input_resolution
+        mod = self.window_size
+        h, w = -(-h // mod) * mod, -(-w // mod) * mod
+        n = mod * mod
+        act = batch * h * w * self.embed_dim * e
+
+        stages = OrderedDict()
+        # padded and normalized input, shift mask (float32), shallow features (kept for the residual)
+        image = batch * 3 * h * w * e * 2 + (h // mod) * (w // mod) * n * n * 4
+        stages['conv_first'] = image + act
+        # + the input of the current PFTB (the patch embedding for the first one)
+        base = image + act * 2
+        stages['patch_embed'] = base
+
+        states = [0, 0]
+        topk = [None, None]
+        for i, block in enumerate(self.layers):
+            for layer in block.residual_group.layers:
+                shift = 1 if layer.shift_size > 0 else 0
+                peak, state = layer.memory((h, w), batch, e, topk[shift], sparse_kernel)
+                # layer input (+ the PFTB input it started from) and the PFA state of both shifts
+                stages[f'PFTB{i}.layer{layer.layer_id}'] = base + act + sum(states) + peak
+                states[shift] = state
+                if layer.attn_win.topk < n:
+                    topk[shift] = layer.attn_win.topk
+            # residual group output, conv and the residual sum
+            stages[f'PFTB{i}.conv'] = base + sum(states) + act * 3
+
+        # norm, conv_after_body and the residual sum (the PFA state is released)
+        stages['conv_after_body'] = image + act * 4
+        hr = batch * 3 * h * w * self.upscale * self.upscale * e
+        if self.upsampler == 'pixelshuffle':
+            features = batch * self.conv_before_upsample[0].out_channels * h * w * e
+            stages['upsample'] = image + self.upsample.memory((h, w), batch, e)
+            stages['conv_last'] = image + features * self.upscale * self.upscale + hr
+        elif self.upsampler == 'pixelshuffledirect':
+            stages['upsample'] = image + self.upsample.memory((h, w), batch, e)
+        # output and its denormalized copies
+        stages['output'] = image + hr * 3
+
+        peak = int(max(stages.values()))
+        if per_layer:
+            return peak, OrderedDict((name, int(value)) for name, value in stages.items())
+        return peak
+
 
 if __name__ == '__main__':
     upscale = 2
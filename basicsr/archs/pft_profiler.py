@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import torch
+import torch.nn as nn
+
+
+def _current_rss():
+    """Resident set size in bytes (Linux), or 0"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _conv_flops(module, x):
+    """FLOPs of the (stride 1) convolutions in module, applied to x (b, c, h, w)"""
+    flops = 0
+    for m in module.modules():
+        if isinstance(m, nn.Conv2d):
+            kh, kw = m.kernel_size
+            flops += x.shape[0] * x.shape[-2] * x.shape[-1] * m.out_channels * (m.in_channels // m.groups) * kh * kw
+    return flops
+
+
+class PFTProfiler:
+    """
+    Opt-in per-module timing, FLOPs and memory instrumentation of a PFT model
+
+    Forward hooks are registered on entering the context and removed on exit, so
+    the model runs unchanged (no overhead) outside of it. Recorded per call and
+    aggregated across calls:
+        - each PFTB, each PFTransformerLayer and, inside the layers, the norms,
+          the qkv projection, the LePE convolution, the window attention (dense or
+          sparse, depending on whether PFA indices are present) and the ConvFFN
+        - the shallow feature conv, the PFTB / body convs and the upsampler
+    FLOPs reuse the flops() methods of the modules (multiplied by the batch size).
+    Memory is the change of allocated CUDA memory, or of the process RSS on CPU.
+
+    Example:
+        with PFTProfiler(model, trace=True) as prof:
+            model(x)
+        prof.print_table()
+        prof.save_chrome_trace('pft_trace.json')
+    """
+
+    CATEGORIES = ('attention (dense)', 'attention (sparse)', 'convffn', 'qkv projection', 'lepe', 'norm',
+                  'pftb conv', 'shallow / body conv', 'upsampler')
+
+    def __init__(self, model, synchronize=True, trace=False):
+        """
+        Args:
+            model: PFT model
+            synchronize: Synchronize CUDA around each module (exact timings, slower)
+            trace: Keep every call for save_chrome_trace()
+        """
+        self.model = model
+        self.synchronize = synchronize
+        self.trace = trace
+        self.stats = OrderedDict()  # name -> {'kind', 'calls', 'time', 'flops', 'mem'}
+        self.events = []
+        self._handles = []
+        self._starts = {}
+        self._origin = None
+
+    # ---------------------------------------------------------------- hooks
+
+    def _targets(self):
+        """(name, module, kind) of the instrumented modules, outermost first"""
+        model = self.model
+        targets = [('PFT', model, 'model')]
+        for name in ('conv_first', 'conv_after_body'):
+            if hasattr(model, name):
+                targets.append((name, getattr(model, name), 'shallow / body conv'))
+        for i, block in enumerate(model.layers):
+            targets.append((f'PFTB{i}', block, 'pftb'))
+            targets.append((f'PFTB{i}.conv', block.conv, 'pftb conv'))
+            for j, layer in enumerate(block.residual_group.layers):
+                prefix = f'PFTB{i}.layer{layer.layer_id}'
+                targets.append((prefix, layer, 'layer'))
+                targets.append((f'{prefix}.norm1', layer.norm1, 'norm'))
+                targets.append((f'{prefix}.wqkv', layer.wqkv, 'qkv projection'))
+                targets.append((f'{prefix}.lepe', layer.v_LePE, 'lepe'))
+                targets.append((f'{prefix}.attn', layer.attn_win, 'attention'))
+                targets.append((f'{prefix}.norm2', layer.norm2, 'norm'))
+                targets.append((f'{prefix}.convffn', layer.convffn, 'convffn'))
+        if hasattr(model, 'norm'):
+            targets.append(('norm', model.norm, 'norm'))
+        for name in ('conv_before_upsample', 'upsample', 'conv_last'):
+            if hasattr(model, name):
+                targets.append((name, getattr(model, name), 'upsampler'))
+        return targets
+
+    def _memory(self):
+        if self._cuda:
+            return torch.cuda.memory_allocated()
+        return _current_rss()
+
+    def _flops(self, module, kind, args, output):
+        if kind == 'model':
+            x = args[0]
+            h, w = x.shape[-2:]
+            pad = self.model.window_size
+            return self.model.flops((-(-h // pad) * pad, -(-w // pad) * pad)) * x.shape[0]
+        if kind in ('pftb conv', 'shallow / body conv', 'upsampler'):
+            x = args[0]
+            if hasattr(module, 'flops'):
+                return module.flops(tuple(x.shape[-2:])) * x.shape[0]
+            return _conv_flops(module, x)
+        if kind in ('pftb', 'layer'):
+            x, x_size = args[0], args[2]
+            return module.flops(x_size) * x.shape[0]
+        if kind == 'attention':
+            # called on (windows * batch, n, 4c); WindowAttention.flops() is per window
+            qkvp = args[0]
+            return module.flops(qkvp.shape[1]) * qkvp.shape[0]
+        if kind == 'norm':
+            return args[0].numel()
+        if kind == 'qkv projection':
+            return output.numel() * module.in_features
+        if kind == 'lepe':
+            conv = module.depthwise_conv[0]
+            return output.numel() * conv.kernel_size[0] * conv.kernel_size[1]
+        if kind == 'convffn':
+            x = args[0]
+            tokens = x.shape[0] * x.shape[1]
+            conv = module.dwconv.depthwise_conv[0]
+            hidden = module.fc1.out_features
+            return tokens * (module.fc1.in_features * hidden + hidden * module.fc2.out_features
+                             + hidden * conv.kernel_size[0] * conv.kernel_size[1])
+        return 0
+
+    def _pre_hook(self, name):
+        def hook(module, args, kwargs):
+            if self._cuda and self.synchronize:
+                torch.cuda.synchronize()
+            self._starts[name] = (time.perf_counter(), self._memory())
+        return hook
+
+    def _post_hook(self, name, kind):
+        def hook(module, args, kwargs, output):
+            if self._cuda and self.synchronize:
+                torch.cuda.synchronize()
+            end = time.perf_counter()
+            start, memory = self._starts.pop(name)
+
+            if kind == 'attention':
+                # the forward fills in the PFA indices, so dense / sparse is decided in the pre-hook
+                kind_name = 'attention (dense)' if name in self._dense else 'attention (sparse)'
+            else:
+                kind_name = kind
+
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = {'kind': kind_name, 'calls': 0, 'time': 0.0, 'flops': 0, 'mem': 0}
+            stats['calls'] += 1
+            stats['time'] += end - start
+            stats['flops'] += self._flops(module, kind, args, output)
+            stats['mem'] += self._memory() - memory
+            if self.trace:
+                self.events.append({'name': name, 'cat': kind_name, 'ph': 'X', 'pid': os.getpid(),
+                                    'tid': threading.get_ident(), 'ts': (start - self._origin) * 1e6,
+                                    'dur': (end - start) * 1e6})
+        return hook
+
+    def _attention_pre_hook(self, name):
+        timing_hook = self._pre_hook(name)
+
+        def hook(module, args, kwargs):
+            pfa_indices = kwargs['pfa_indices'] if 'pfa_indices' in kwargs else args[2]
+            shift = kwargs['shift'] if 'shift' in kwargs else (args[5] if len(args) > 5 else 0)
+            if pfa_indices[shift] is None:
+                self._dense.add(name)
+            else:
+                self._dense.discard(name)
+            timing_hook(module, args, kwargs)
+        return hook
+
+    def __enter__(self):
+        self._cuda = next(self.model.parameters()).is_cuda
+        self._dense = set()
+        if self._origin is None:
+            self._origin = time.perf_counter()
+        for name, module, kind in self._targets():
+            pre_hook = self._attention_pre_hook(name) if kind == 'attention' else self._pre_hook(name)
+            self._handles.append(module.register_forward_pre_hook(pre_hook, with_kwargs=True))
+            self._handles.append(module.register_forward_hook(self._post_hook(name, kind), with_kwargs=True))
+        return self
+
+    def __exit__(self, *exc):
+        for handle in self._handles:
+            handle.remove()
+        self._handles = []
+        self._starts = {}
+        return False
+
+    # ---------------------------------------------------------------- reports
+
+    def summary(self):
+        """Time, FLOPs and memory per category of leaf modules, and the total"""
+        summary = OrderedDict((kind, {'time': 0.0, 'flops': 0, 'mem': 0}) for kind in self.CATEGORIES)
+        for stats in self.stats.values():
+            if stats['kind'] in summary:
+                for key in ('time', 'flops', 'mem'):
+                    summary[stats['kind']][key] += stats[key]
+        total = self.stats.get('PFT', {'time': 0.0, 'flops': 0, 'mem': 0, 'calls': 0})
+        other = total['time'] - sum(item['time'] for item in summary.values())
+        summary['other'] = {'time': max(other, 0.0), 'flops': 0, 'mem': 0}
+        summary['total'] = {'time': total['time'], 'flops': total['flops'], 'mem': total['mem']}
+        return summary
+
+    def print_table(self, kinds=('model', 'pftb', 'layer'), summary=True):
+        """
+        Print the aggregated statistics
+
+        Args:
+            kinds: Module kinds listed individually (e.g. add 'attention', 'convffn', 'norm')
+            summary: Also print the per-category summary
+        """
+        total = self.stats.get('PFT', {}).get('time') or sum(s['time'] for s in self.stats.values()) or 1e-9
+        header = f"{'module':<32} {'kind':<20} {'calls':>6} {'time ms':>10} {'%':>6} {'GFLOPs':>9} " \
+                 f"{'GFLOP/s':>9} {'mem MB':>9}"
+        print(header)
+        print('-' * len(header))
+        for name, stats in self.stats.items():
+            kind = 'attention' if stats['kind'].startswith('attention') else stats['kind']
+            if kind not in kinds:
+                continue
+            print(f"{name:<32} {stats['kind']:<20} {stats['calls']:>6} {stats['time'] * 1000:>10.2f} "
+                  f"{100 * stats['time'] / total:>6.1f} {stats['flops'] / 1e9:>9.3f} "
+                  f"{stats['flops'] / 1e9 / max(stats['time'], 1e-9):>9.2f} {stats['mem'] / 1024 ** 2:>9.1f}")
+
+        if summary:
+            print()
+            print(f"{'category':<32} {'time ms':>10} {'%':>6} {'GFLOPs':>9} {'GFLOP/s':>9}")
+            for kind, item in self.summary().items():
+                print(f"{kind:<32} {item['time'] * 1000:>10.2f} {100 * item['time'] / total:>6.1f} "
+                      f"{item['flops'] / 1e9:>9.3f} {item['flops'] / 1e9 / max(item['time'], 1e-9):>9.2f}")
+
+    def save_chrome_trace(self, path):
+        """Write the recorded calls (trace=True) as Chrome trace JSON (chrome://tracing, Perfetto)"""
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+    def reset(self):
+        self.stats.clear()
+        self.events = []
+        self._origin = time.perf_counter()
@@ -8,6 +8,7 @@ from functools import partial
 from os import path as osp
 
 from basicsr.data.prefetch_dataloader import PrefetchDataLoader
+from basicsr.data.transforms import PairedBatchAugment
 from basicsr.utils import get_root_logger, scandir
 from basicsr.utils.dist_util import get_dist_info
 from basicsr.utils.registry import DATASET_REGISTRY
@@ -46,6 +47,8 @@ def build_dataloader(dataset, dataset_opt, num_gpu=1, dist=False, sampler=None,
             phase (str): 'train' or 'val'.
             num_worker_per_gpu (int): Number of workers for each GPU.
             batch_size_per_gpu (int): Training batch size for each GPU.
+            batch_augment (str | None): 'collate' to flip / rotate the uint8
+                crops of the dataset per batch in the collate function.
         num_gpu (int): Number of GPUs. Used only in the train phase.
             Default: 1.
         dist (bool): Whether in distributed training. Used only in the train
@@ -74,6 +77,10 @@ def build_dataloader(dataset, dataset_opt, num_gpu=1, dist=False, sampler=None,
             dataloader_args['shuffle'] = True
         dataloader_args['worker_init_fn'] = partial(
             worker_init_fn, num_workers=num_workers, rank=rank, seed=seed) if seed is not None else None
+        if dataset_opt.get('batch_augment') == 'collate':
+            # the dataset returns uint8 crops, flipped / rotated here per batch
+            dataloader_args['collate_fn'] = PairedBatchAugment(
+                dataset_opt.get('use_hflip', True), dataset_opt.get('use_rot', True)).collate
     elif phase in ['val', 'test']:  # validation
         dataloader_args = dict(dataset=dataset, batch_size=1, shuffle=False, num_workers=0)
     else:
@@ -0,0 +1,143 @@
+import math
+import numpy as np
+import random
+import torch
+from torch.nn import functional as F
+
+from basicsr.data.degradations import circular_lowpass_kernel, random_add_gaussian_noise_pt, random_add_poisson_noise_pt
+from basicsr.data.degradations import random_mixed_kernels
+from basicsr.data.kernel_bank import KERNEL_DEFAULTS, KernelBank
+from basicsr.utils.diffjpeg import DiffJPEG
+from basicsr.utils.img_process_util import filter2D
+
+
+class BatchDegradation():
+    """Batched degradation stage: synthesize LQ batches from GT batches.
+
+    Runs after the prefetcher, on the training device, on whole batches: blur
+    with a kernel per sample (filter2D), random resize, Gaussian or Poisson
+    noise and JPEG compression (DiffJPEG), then resize to the LQ size, as
+    the first-order degradation of Real-ESRGAN. Only the kernels are drawn
+    per sample (with random_mixed_kernels / circular_lowpass_kernel), every
+    image operation is a single batched op.
+
+    Args:
+        opt (dict): Config of the degradation. It contains the following keys:
+        kernel_list (list[str]): Kernel types of random_mixed_kernels.
+            Default: ['iso', 'aniso', 'generalized_iso', 'generalized_aniso', 'plateau_iso', 'plateau_aniso'].
+        kernel_prob (list[float]): Probability of each kernel type.
+            Default: [0.45, 0.25, 0.12, 0.03, 0.12, 0.03].
+        kernel_range (list[int]): Odd kernel sizes drawn from. Default: [7, 9, ..., 21].
+        blur_kernel_size (int): Size the kernels are padded to. Default: 21.
+        blur_sigma (list[float]): Sigma range. Default: [0.2, 3].
+        betag_range (list[float]): Beta range of generalized Gaussian kernels. Default: [0.5, 4].
+        betap_range (list[float]): Beta range of plateau kernels. Default: [1, 2].
+        sinc_prob (float): Probability of a sinc (circular lowpass) kernel. Default: 0.1.
+        resize_prob (list[float]): Probability of up, down and keep. Default: [0.2, 0.7, 0.1].
+        resize_range (list[float]): Resize factor range. Default: [0.15, 1.5].
+        gaussian_noise_prob (float): Probability of Gaussian (else Poisson) noise. Default: 0.5.
+        noise_range (list[float]): Gaussian noise sigma range (in [0, 255]). Default: [1, 30].
+        poisson_scale_range (list[float]): Poisson noise scale range. Default: [0.05, 3].
+        gray_noise_prob (float): Probability of gray noise. Default: 0.4.
+        jpeg_range (list[float]): JPEG quality range. Default: [30, 95].
+        kernel_bank (str | None): Draw the kernels from this precomputed bank
+            (basicsr/data/kernel_bank.py) instead of computing them. Default: None.
+        scale (int): Scale factor.
+        device (torch.device): Device of the batches.
+    """
+
+    def __init__(self, opt, scale, device=torch.device('cpu')):
+        self.scale = scale
+        for key, default in KERNEL_DEFAULTS.items():
+            setattr(self, key, opt.get(key, default))
+        self.kernel_bank = None
+        if opt.get('kernel_bank') is not None:
+            self.kernel_bank = KernelBank(opt['kernel_bank'])
+            self.kernel_bank.check({key: getattr(self, key) for key in KERNEL_DEFAULTS})
+        self.resize_prob = opt.get('resize_prob', [0.2, 0.7, 0.1])
+        self.resize_range = opt.get('resize_range', [0.15, 1.5])
+        self.gaussian_noise_prob = opt.get('gaussian_noise_prob', 0.5)
+        self.noise_range = opt.get('noise_range', [1, 30])
+        self.poisson_scale_range = opt.get('poisson_scale_range', [0.05, 3])
+        self.gray_noise_prob = opt.get('gray_noise_prob', 0.4)
+        self.jpeg_range = opt.get('jpeg_range', [30, 95])
+        self.device = device
+        self.jpeger = DiffJPEG(differentiable=False).to(device)
+
+    def sample_kernel(self):
+        """One blur kernel (ndarray, blur_kernel_size x blur_kernel_size), drawn as in RealESRGANDataset."""
+        if self.kernel_bank is not None:
+            return np.array(self.kernel_bank.sample_kernel(self.kernel_prob, self.sinc_prob))
+        kernel_size = random.choice(self.kernel_range)
+        if np.random.uniform() < self.sinc_prob:
+            # this sinc filter setting is for kernels ranging from [7, 21]
+            if kernel_size < 13:
+                omega_c = np.random.uniform(np.pi / 3, np.pi)
+            else:
+                omega_c = np.random.uniform(np.pi / 5, np.pi)
+            kernel = circular_lowpass_kernel(omega_c, kernel_size, pad_to=False)
+        else:
+            kernel = random_mixed_kernels(
+                self.kernel_list,
+                self.kernel_prob,
+                kernel_size,
+                self.blur_sigma,
+                self.blur_sigma, [-math.pi, math.pi],
+                self.betag_range,
+                self.betap_range,
+                noise_range=None)
+        # pad kernel
+        pad_size = (self.blur_kernel_size - kernel_size) // 2
+        return np.pad(kernel, ((pad_size, pad_size), (pad_size, pad_size)))
+
+    def sample_kernels(self, batch_size):
+        """Kernels of a batch, (b, k, k) float32 tensor on the device."""
+        if self.kernel_bank is not None:
+            kernels = self.kernel_bank.sample_kernels(batch_size, self.kernel_prob, self.sinc_prob)
+        else:
+            kernels = np.stack([self.sample_kernel() for _ in range(batch_size)]).astype(np.float32)
+        return torch.from_numpy(kernels).to(self.device, non_blocking=True)
+
+    @torch.no_grad()
+    def __call__(self, gt, kernels=None):
+        """Degrade a GT batch.
+
+        Args:
+            gt (Tensor): GT batch, (b, c, h, w), RGB, [0, 1], h and w divisible by the scale.
+            kernels (Tensor | None): Blur kernels, (b, k, k). Default: drawn with sample_kernels.
+
+        Returns:
+            Tensor: LQ batch, (b, c, h / scale, w / scale), [0, 1], rounded to uint8 levels.
+        """
+        b, _, h, w = gt.size()
+        if kernels is None:
+            kernels = self.sample_kernels(b)
+
+        # blur
+        out = filter2D(gt, kernels)
+        # random resize
+        updown_type = random.choices(['up', 'down', 'keep'], self.resize_prob)[0]
+        if updown_type == 'up':
+            resize_scale = np.random.uniform(1, self.resize_range[1])
+        elif updown_type == 'down':
+            resize_scale = np.random.uniform(self.resize_range[0], 1)
+        else:
+            resize_scale = 1
+        mode = random.choice(['area', 'bilinear', 'bicubic'])
+        out = F.interpolate(out, scale_factor=resize_scale, mode=mode)
+        # add noise
+        if np.random.uniform() < self.gaussian_noise_prob:
+            out = random_add_gaussian_noise_pt(
+                out, sigma_range=self.noise_range, clip=True, rounds=False, gray_prob=self.gray_noise_prob)
+        else:
+            out = random_add_poisson_noise_pt(
+                out, scale_range=self.poisson_scale_range, gray_prob=self.gray_noise_prob, clip=True, rounds=False)
+        # JPEG compression
+        jpeg_p = out.new_zeros(b).uniform_(*self.jpeg_range)
+        out = torch.clamp(out, 0, 1)
+        out = self.jpeger(out, quality=jpeg_p)
+        # resize to the LQ size
+        mode = random.choice(['area', 'bilinear', 'bicubic'])
+        out = F.interpolate(out, size=(h // self.scale, w // self.scale), mode=mode)
+        # clamp and round
+        return torch.clamp((out * 255.0).round(), 0, 255) / 255.
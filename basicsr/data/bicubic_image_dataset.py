@@ -0,0 +1,140 @@
+import numpy as np
+import random
+from os import path as osp
+from torch.utils import data as data
+from torchvision.transforms.functional import normalize
+
+from basicsr.data.data_util import paths_from_folder, paths_from_lmdb
+from basicsr.data.transforms import augment, mod_crop
+from basicsr.utils import FileClient, bgr2ycbcr, imfrombytes, img2tensor
+from basicsr.utils.matlab_functions import imresize
+from basicsr.utils.registry import DATASET_REGISTRY
+
+
+@DATASET_REGISTRY.register()
+class BicubicImageDataset(data.Dataset):
+    """GT image dataset generating the LQ images on the fly with MATLAB bicubic.
+
+    Gives the samples of PairedImageDataset on LR-bicubic folders (MATLAB
+    imresize, rounded to uint8), but only the GT images are stored, so x2, x3
+    and x4 training share a single HR store.
+
+    For training, the GT crop is aligned to the LQ grid and downscaled with a
+    margin of `margin` LQ pixels around it (clamped at the image borders), so
+    the LQ crop is the one of the LQ image of the whole (mod-cropped) GT. For
+    validation and testing, the whole mod-cropped GT image is downscaled.
+
+    There are three modes:
+
+    1. **lmdb**: Use lmdb files. If opt['io_backend'] == lmdb.
+    2. **meta_info_file**: Use meta information file to generate paths. \
+        If opt['io_backend'] != lmdb and opt['meta_info_file'] is not None.
+    3. **folder**: Scan folders to generate paths. The rest.
+
+    Args:
+        opt (dict): Config for train datasets. It contains the following keys:
+        dataroot_gt (str): Data root path for gt.
+        meta_info_file (str): Path for meta information file.
+        io_backend (dict): IO backend type and other kwarg.
+        gt_size (int): Cropped patched size for gt patches. Must be divisible by the scale.
+        use_hflip (bool): Use horizontal flips.
+        use_rot (bool): Use rotation (use vertical flip and transposing h and w for implementation).
+        scale (bool): Scale, which will be added automatically.
+        phase (str): 'train' or 'val'.
+        round_lq (bool): Round the LQ images to uint8 levels, as stored LR images. Default: True.
+        margin (int): LQ pixels downscaled around the crop. Default: 4.
+        return_lq (bool): Generate the LQ images. False returns GT crops only,
+            for the batch degradation stage of the model (`degradation` option),
+            which synthesizes the LQ batches on the device. Default: True.
+    """
+
+    def __init__(self, opt):
+        super(BicubicImageDataset, self).__init__()
+        self.opt = opt
+        # file client (io backend)
+        self.file_client = None
+        self.io_backend_opt = opt['io_backend']
+        self.mean = opt['mean'] if 'mean' in opt else None
+        self.std = opt['std'] if 'std' in opt else None
+        self.round_lq = opt.get('round_lq', True)
+        self.margin = opt.get('margin', 4)
+        self.return_lq = opt.get('return_lq', True)
+
+        self.gt_folder = opt['dataroot_gt']
+        if self.io_backend_opt['type'] == 'lmdb':
+            self.io_backend_opt['db_paths'] = [self.gt_folder]
+            self.io_backend_opt['client_keys'] = ['gt']
+            self.paths = paths_from_lmdb(self.gt_folder)
+        elif 'meta_info_file' in self.opt and self.opt['meta_info_file'] is not None:
+            with open(self.opt['meta_info_file'], 'r') as fin:
+                self.paths = [osp.join(self.gt_folder, line.strip().split(' ')[0]) for line in fin]
+        else:
+            self.paths = sorted(paths_from_folder(self.gt_folder))
+
+        if self.io_backend_opt['type'] == 'shm':
+            # load all the files now, before the workers fork, so that they share the segment
+            # (the file list is passed directly, not stored in the options)
+            io_backend_opt = self.io_backend_opt.copy()
+            self.file_client = FileClient(io_backend_opt.pop('type'), filepaths=self.paths, **io_backend_opt)
+
+    def downscale(self, img):
+        """MATLAB bicubic downscaling by the scale of a HWC BGR float32 image."""
+        img_lq = np.ascontiguousarray(imresize(img, 1 / self.opt['scale']))
+        if self.round_lq:
+            img_lq = np.clip(np.round(img_lq * 255.), 0, 255).astype(np.float32) / 255.
+        return img_lq
+
+    def __getitem__(self, index):
+        if self.file_client is None:
+            self.file_client = FileClient(self.io_backend_opt.pop('type'), **self.io_backend_opt)
+
+        scale = self.opt['scale']
+
+        # Load gt images. Dimension order: HWC; channel order: BGR;
+        # image range: [0, 1], float32.
+        gt_path = self.paths[index]
+        img_bytes = self.file_client.get(gt_path, 'gt')
+        img_gt = imfrombytes(img_bytes, float32=True)
+
+        if self.opt['phase'] == 'train':
+            lq_size = self.opt['gt_size'] // scale
+            h_lq, w_lq = img_gt.shape[0] // scale, img_gt.shape[1] // scale
+            if h_lq < lq_size or w_lq < lq_size:
+                raise ValueError(f'LQ ({h_lq}, {w_lq}) is smaller than patch size '
+                                 f'({lq_size}, {lq_size}). Please remove {gt_path}.')
+            # randomly choose top and left coordinates for lq patch
+            top = random.randint(0, h_lq - lq_size)
+            left = random.randint(0, w_lq - lq_size)
+            if not self.return_lq:
+                img_gt = img_gt[top * scale:(top + lq_size) * scale, left * scale:(left + lq_size) * scale, ...]
+                img_gt = augment(img_gt, self.opt['use_hflip'], self.opt['use_rot'])
+                img_gt = img2tensor(img_gt, bgr2rgb=True, float32=True)
+                return {'gt': img_gt, 'gt_path': gt_path}
+            # downscale the crop with a margin for the bicubic kernel, keep the center
+            top_m, left_m = max(top - self.margin, 0), max(left - self.margin, 0)
+            bottom_m, right_m = min(top + lq_size + self.margin, h_lq), min(left + lq_size + self.margin, w_lq)
+            img_lq = self.downscale(img_gt[top_m * scale:bottom_m * scale, left_m * scale:right_m * scale, ...])
+            img_lq = img_lq[top - top_m:top - top_m + lq_size, left - left_m:left - left_m + lq_size, ...]
+            img_gt = img_gt[top * scale:(top + lq_size) * scale, left * scale:(left + lq_size) * scale, ...]
+            # flip, rotation
+            img_gt, img_lq = augment([img_gt, img_lq], self.opt['use_hflip'], self.opt['use_rot'])
+        else:
+            img_gt = mod_crop(img_gt, scale)
+            img_lq = self.downscale(img_gt)
+
+        # color space transform
+        if 'color' in self.opt and self.opt['color'] == 'y':
+            img_gt = bgr2ycbcr(img_gt, y_only=True)[..., None]
+            img_lq = bgr2ycbcr(img_lq, y_only=True)[..., None]
+
+        # BGR to RGB, HWC to CHW, numpy to tensor
+        img_gt, img_lq = img2tensor([img_gt, img_lq], bgr2rgb=True, float32=True)
+        # normalize
+        if self.mean is not None or self.std is not None:
+            normalize(img_lq, self.mean, self.std, inplace=True)
+            normalize(img_gt, self.mean, self.std, inplace=True)
+
+        return {'lq': img_lq, 'gt': img_gt, 'lq_path': gt_path, 'gt_path': gt_path}
+
+    def __len__(self):
+        return len(self.paths)
@@ -0,0 +1,219 @@
+import argparse
+import json
+import math
+import numpy as np
+import os
+import random
+import sys
+from multiprocessing import Pool
+from os import path as osp
+from tqdm import tqdm
+
+from basicsr.data.degradations import (bivariate_Gaussian, bivariate_generalized_Gaussian, bivariate_plateau,
+                                       circular_lowpass_kernel, mesh_grid)
+
+KERNELS_NAME = 'kernels.npy'
+META_INFO_NAME = 'meta_info.json'
+
+# defaults of the blur kernel options of BatchDegradation
+KERNEL_DEFAULTS = {
+    'kernel_list': ['iso', 'aniso', 'generalized_iso', 'generalized_aniso', 'plateau_iso', 'plateau_aniso'],
+    'kernel_prob': [0.45, 0.25, 0.12, 0.03, 0.12, 0.03],
+    'kernel_range': list(range(7, 22, 2)),
+    'blur_kernel_size': 21,
+    'blur_sigma': [0.2, 3],
+    'betag_range': [0.5, 4],
+    'betap_range': [1, 2],
+    'sinc_prob': 0.1,
+}
+
+
+def _stratified(rng, n):
+    """n samples of U(0, 1), one in each of n equal strata, in random order."""
+    return (rng.permutation(n) + rng.random(n)) / n
+
+
+def _beta_from_quantile(q, beta_range):
+    """Inverse CDF of the beta of random_bivariate_generalized_Gaussian / plateau:
+    U(beta_range[0], 1) and U(1, beta_range[1]) with probability 0.5 each."""
+    return np.where(q < 0.5, beta_range[0] + q / 0.5 * (1 - beta_range[0]),
+                    1 + (q - 0.5) / 0.5 * (beta_range[1] - 1))
+
+
+def kernel_block_worker(kernel_type, kernel_size, num, opt, seed):
+    """Kernels of one (type, size) block of the bank.
+
+    The parameters follow the distributions of the on-the-fly functions
+    (random_bivariate_* via random_mixed_kernels, and the sinc setting of
+    BatchDegradation), stratified: each parameter gets one value in each of
+    `num` equal-probability strata, combined in random order (Latin hypercube).
+
+    Args:
+        kernel_type (str): A type of kernel_list, or 'sinc'.
+        kernel_size (int): Odd kernel size.
+        num (int): Number of kernels.
+        opt (dict): Kernel options (see KERNEL_DEFAULTS).
+        seed (int): Random seed of the block.
+
+    Returns:
+        ndarray: Kernels padded to blur_kernel_size, (num, k, k), float32.
+    """
+    rng = np.random.default_rng(seed)
+    pad = (opt['blur_kernel_size'] - kernel_size) // 2
+    kernels = np.zeros((num, opt['blur_kernel_size'], opt['blur_kernel_size']), dtype=np.float32)
+    crop = (slice(None), slice(pad, pad + kernel_size), slice(pad, pad + kernel_size))
+
+    if kernel_type == 'sinc':
+        # this sinc filter setting is for kernels ranging from [7, 21]
+        omega_low = np.pi / 3 if kernel_size < 13 else np.pi / 5
+        omegas = omega_low + _stratified(rng, num) * (np.pi - omega_low)
+        kernels[crop] = [circular_lowpass_kernel(omega_c, kernel_size) for omega_c in omegas]
+        return kernels
+
+    isotropic = kernel_type.endswith('iso') and not kernel_type.endswith('aniso')
+    sigma_low, sigma_high = opt['blur_sigma']
+    sigma_x = sigma_low + _stratified(rng, num) * (sigma_high - sigma_low)
+    if isotropic:
+        sigma_y, rotation = sigma_x, np.zeros(num)
+    else:
+        sigma_y = sigma_low + _stratified(rng, num) * (sigma_high - sigma_low)
+        rotation = -math.pi + _stratified(rng, num) * 2 * math.pi
+    if kernel_type.startswith('generalized'):
+        beta = _beta_from_quantile(_stratified(rng, num), opt['betag_range'])
+    elif kernel_type.startswith('plateau'):
+        beta = _beta_from_quantile(_stratified(rng, num), opt['betap_range'])
+
+    grid, _, _ = mesh_grid(kernel_size)
+    for i in range(num):
+        if kernel_type in ('iso', 'aniso'):
+            kernel = bivariate_Gaussian(kernel_size, sigma_x[i], sigma_y[i], rotation[i], grid, isotropic)
+        elif kernel_type.startswith('generalized'):
+            kernel = bivariate_generalized_Gaussian(kernel_size, sigma_x[i], sigma_y[i], rotation[i], beta[i], grid,
+                                                    isotropic)
+        elif kernel_type.startswith('plateau'):
+            kernel = bivariate_plateau(kernel_size, sigma_x[i], sigma_y[i], rotation[i], beta[i], grid, isotropic)
+        else:
+            raise ValueError(f'Unsupported kernel type: {kernel_type}.')
+        kernels[crop][i] = kernel
+    return kernels
+
+
+def _kernel_block_worker(args):
+    return kernel_block_worker(*args)
+
+
+def make_kernel_bank(bank_path, opt=None, kernels_per_block=512, n_thread=8, seed=0):
+    """Precompute a blur kernel bank into a memory-mapped array.
+
+    Contents of the bank:
+
+    ::
+
+        example.kbank
+        ├── kernels.npy
+        ├── meta_info.json
+
+    kernels.npy is a (blocks, kernels_per_block, k, k) float32 array with one
+    block per (kernel type, kernel size), sinc included; meta_info.json holds
+    the kernel options and the (type, size) of every block.
+
+    Args:
+        bank_path (str): Bank save path, ending with '.kbank'.
+        opt (dict | None): Kernel options of BatchDegradation (missing ones
+            take the KERNEL_DEFAULTS values). Default: None.
+        kernels_per_block (int): Kernels per (type, size). Default: 512.
+        n_thread (int): Number of processes. Default: 8.
+        seed (int): Random seed. Default: 0.
+    """
+    opt = {key: (opt or {}).get(key, default) for key, default in KERNEL_DEFAULTS.items()}
+    if not bank_path.endswith('.kbank'):
+        raise ValueError("bank_path must end with '.kbank'.")
+    if osp.exists(bank_path):
+        print(f'Folder {bank_path} already exists. Exit.')
+        sys.exit(1)
+    os.makedirs(bank_path)
+
+    blocks = [(kernel_type, kernel_size) for kernel_type in list(opt['kernel_list']) + ['sinc']
+              for kernel_size in opt['kernel_range']]
+    shape = (len(blocks), kernels_per_block, opt['blur_kernel_size'], opt['blur_kernel_size'])
+    print(f'Create kernel bank {bank_path}: {len(blocks)} blocks x {kernels_per_block} kernels, '
+          f'{np.prod(shape) * 4 / 1024 ** 2:.1f} MB...')
+    kernels = np.lib.format.open_memmap(osp.join(bank_path, KERNELS_NAME), mode='w+', dtype=np.float32, shape=shape)
+    tasks = [(kernel_type, kernel_size, kernels_per_block, opt, seed + i)
+             for i, (kernel_type, kernel_size) in enumerate(blocks)]
+    with Pool(n_thread) as pool:
+        for i, block in enumerate(tqdm(pool.imap(_kernel_block_worker, tasks), total=len(tasks), unit='block')):
+            kernels[i] = block
+    kernels.flush()
+    del kernels
+
+    with open(osp.join(bank_path, META_INFO_NAME), 'w') as fout:
+        json.dump({'opt': opt, 'kernels_per_block': kernels_per_block, 'seed': seed,
+                   'blocks': [list(block) for block in blocks]}, fout, indent=2)
+    print('Finish writing kernel bank.')
+
+
+class KernelBank():
+    """Sampler of a precomputed blur kernel bank.
+
+    The bank is memory mapped (shared by the DataLoader workers through the
+    page cache). A draw picks the kernel size, sinc or kernel type with the
+    probabilities of BatchDegradation.sample_kernel, then a random kernel of
+    that block, so the kernels follow the distribution of the on-the-fly
+    functions (resolution: kernels_per_block stratified draws per block).
+
+    Args:
+        bank_path (str): Bank path.
+    """
+
+    def __init__(self, bank_path):
+        self.bank_path = bank_path
+        with open(osp.join(bank_path, META_INFO_NAME), 'r') as fin:
+            meta_info = json.load(fin)
+        self.opt = meta_info['opt']
+        self.kernels_per_block = meta_info['kernels_per_block']
+        self.blocks = {tuple(block): i for i, block in enumerate(meta_info['blocks'])}
+        self.kernels = np.load(osp.join(bank_path, KERNELS_NAME), mmap_mode='r')
+
+    def check(self, opt):
+        """Raise if the kernel options differ from the ones of the bank."""
+        for key in ('kernel_list', 'kernel_range', 'blur_kernel_size', 'blur_sigma', 'betag_range', 'betap_range'):
+            if list(np.atleast_1d(opt[key])) != list(np.atleast_1d(self.opt[key])):
+                raise ValueError(f'{key} {opt[key]} differs from {self.opt[key]} of the kernel bank {self.bank_path}.')
+
+    def sample_index(self, kernel_prob=None, sinc_prob=None):
+        """(block, index) of a random kernel."""
+        kernel_prob = self.opt['kernel_prob'] if kernel_prob is None else kernel_prob
+        sinc_prob = self.opt['sinc_prob'] if sinc_prob is None else sinc_prob
+        kernel_size = random.choice(self.opt['kernel_range'])
+        if np.random.uniform() < sinc_prob:
+            kernel_type = 'sinc'
+        else:
+            kernel_type = random.choices(self.opt['kernel_list'], kernel_prob)[0]
+        return self.blocks[(kernel_type, kernel_size)], random.randrange(self.kernels_per_block)
+
+    def sample_kernel(self, kernel_prob=None, sinc_prob=None):
+        """A random kernel, (k, k) float32 (read-only view into the bank)."""
+        return self.kernels[self.sample_index(kernel_prob, sinc_prob)]
+
+    def sample_kernels(self, num, kernel_prob=None, sinc_prob=None):
+        """num random kernels, (num, k, k) float32, gathered in one indexing op."""
+        blocks, indices = zip(*[self.sample_index(kernel_prob, sinc_prob) for _ in range(num)])
+        return self.kernels[list(blocks), list(indices)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Precompute a blur kernel bank.')
+    parser.add_argument('--output', type=str, default='datasets/kernels.kbank', help='Bank path (.kbank).')
+    parser.add_argument('--kernels-per-block', type=int, default=512, help='Kernels per (type, size).')
+    parser.add_argument('--opt', type=str, default=None,
+                        help='JSON file of kernel options (default: the BatchDegradation defaults).')
+    parser.add_argument('--n-thread', type=int, default=8, help='Number of processes.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    args = parser.parse_args()
+
+    kernel_opt = None
+    if args.opt is not None:
+        with open(args.opt, 'r') as fin:
+            kernel_opt = json.load(fin)
+    make_kernel_bank(args.output, kernel_opt, args.kernels_per_block, args.n_thread, args.seed)
@@ -1,3 +1,7 @@
+import numpy as np
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from torch.utils import data as data
 from torchvision.transforms.functional import normalize
 
@@ -20,6 +24,15 @@ class PairedImageDataset(data.Dataset):
         If opt['io_backend'] != lmdb and opt['meta_info_file'] is not None.
     3. **folder**: Scan folders to generate paths. The rest.
 
+    With opt['io_backend'] == shm, the files found by modes 2 and 3 are loaded
+    into shared memory when the dataset is created, before the workers fork.
+
+    With opt['cache'], the decoded (uint8) images are kept in memory: they are
+    all read and decoded once, in parallel, on the first access, and later
+    epochs / validations only convert them. It is meant for validation and
+    test sets, read in the main process (each DataLoader worker would hold
+    its own copy).
+
     Args:
         opt (dict): Config for train datasets. It contains the following keys:
         dataroot_gt (str): Data root path for gt.
@@ -33,6 +46,11 @@ class PairedImageDataset(data.Dataset):
         use_rot (bool): Use rotation (use vertical flip and transposing h and w for implementation).
         scale (bool): Scale, which will be added automatically.
         phase (str): 'train' or 'val'.
+        batch_augment (str | None): 'collate' or 'device' to return uint8 crops
+            and flip / rotate whole batches (train only). Default: None.
+        cache (bool): Keep the decoded images in memory. Default: False.
+        cache_threads (int): Threads reading and decoding the images into the
+            cache. Default: 8.
     """
 
     def __init__(self, opt):
@@ -43,6 +61,17 @@ class PairedImageDataset(data.Dataset):
         self.io_backend_opt = opt['io_backend']
         self.mean = opt['mean'] if 'mean' in opt else None
         self.std = opt['std'] if 'std' in opt else None
+        # 'collate' | 'device': return uint8 crops, flipped / rotated and
+        # converted to float32 for the whole batch by PairedBatchAugment
+        self.batch_augment = opt.get('batch_augment') if opt['phase'] == 'train' else None
+        if self.batch_augment not in (None, 'collate', 'device'):
+            raise ValueError(f"Wrong batch_augment {self.batch_augment}. Supported ones are: None, 'collate', 'device'.")
+        if self.batch_augment is not None and (self.opt.get('color') == 'y' or self.mean is not None
+                                               or self.std is not None):
+            raise ValueError('batch_augment does not support color y, mean or std.')
+        # decoded uint8 (gt, lq) pairs, filled on the first access
+        self.cache = opt.get('cache', False)
+        self.cached_imgs = None
 
         self.gt_folder, self.lq_folder = opt['dataroot_gt'], opt['dataroot_lq']
         if 'filename_tmpl' in opt:
@@ -61,6 +90,29 @@ class PairedImageDataset(data.Dataset):
         else:
             self.paths = paired_paths_from_folder([self.lq_folder, self.gt_folder], ['lq', 'gt'], self.filename_tmpl)
 
+        if self.io_backend_opt['type'] == 'shm':
+            # load all the files now, before the workers fork, so that they share the segment
+            # (the file list is passed directly, not stored in the options)
+            io_backend_opt = self.io_backend_opt.copy()
+            filepaths = [v for path in self.paths for v in path.values()]
+            self.file_client = FileClient(io_backend_opt.pop('type'), filepaths=filepaths, **io_backend_opt)
+
+    def _load_cache(self):
+        """Read and decode all the images with a thread pool (cv2 decoding releases the GIL)."""
+        # lmdb (one shared read transaction) and memcached clients are not thread safe:
+        # serialize their reads, the decoding still runs in parallel
+        lock = threading.Lock() if self.file_client.backend in ('lmdb', 'memcached') else nullcontext()
+
+        def load(index):
+            with lock:
+                gt_path = self.paths[index]['gt_path']
+                lq_path = self.paths[index]['lq_path']
+                gt_bytes, lq_bytes = self.file_client.get_many([gt_path, lq_path], ['gt', 'lq'])
+            return imfrombytes(gt_bytes), imfrombytes(lq_bytes)
+
+        with ThreadPoolExecutor(self.opt.get('cache_threads', 8)) as executor:
+            self.cached_imgs = list(executor.map(load, range(len(self.paths))))
+
     def __getitem__(self, index):
         if self.file_client is None:
             self.file_client = FileClient(self.io_backend_opt.pop('type'), **self.io_backend_opt)
@@ -70,11 +122,20 @@ class PairedImageDataset(data.Dataset):
         # Load gt and lq images. Dimension order: HWC; channel order: BGR;
         # image range: [0, 1], float32.
         gt_path = self.paths[index]['gt_path']
-        img_bytes = self.file_client.get(gt_path, 'gt')
-        img_gt = imfrombytes(img_bytes, float32=True)
         lq_path = self.paths[index]['lq_path']
-        img_bytes = self.file_client.get(lq_path, 'lq')
-        img_lq = imfrombytes(img_bytes, float32=True)
+        if self.cache:
+            if self.cached_imgs is None:
+                self._load_cache()
+            # convert / copy, so that the cached images are never modified
+            img_gt, img_lq = self.cached_imgs[index]
+            if self.batch_augment is None:
+                img_gt, img_lq = img_gt.astype(np.float32) / 255., img_lq.astype(np.float32) / 255.
+            else:
+                img_gt, img_lq = img_gt.copy(), img_lq.copy()
+        else:
+            gt_bytes, lq_bytes = self.file_client.get_many([gt_path, lq_path], ['gt', 'lq'])
+            img_gt = imfrombytes(gt_bytes, float32=self.batch_augment is None)
+            img_lq = imfrombytes(lq_bytes, float32=self.batch_augment is None)
 
         # augmentation for training
         if self.opt['phase'] == 'train':
@@ -82,7 +143,8 @@ class PairedImageDataset(data.Dataset):
             # random crop
             img_gt, img_lq = paired_random_crop(img_gt, img_lq, gt_size, scale, gt_path)
             # flip, rotation
-            img_gt, img_lq = augment([img_gt, img_lq], self.opt['use_hflip'], self.opt['use_rot'])
+            if self.batch_augment is None:
+                img_gt, img_lq = augment([img_gt, img_lq], self.opt['use_hflip'], self.opt['use_rot'])
 
         # color space transform
         if 'color' in self.opt and self.opt['color'] == 'y':
@@ -95,7 +157,7 @@ class PairedImageDataset(data.Dataset):
             img_gt = img_gt[0:img_lq.shape[0] * scale, 0:img_lq.shape[1] * scale, :]
 
         # BGR to RGB, HWC to CHW, numpy to tensor
-        img_gt, img_lq = img2tensor([img_gt, img_lq], bgr2rgb=True, float32=True)
+        img_gt, img_lq = img2tensor([img_gt, img_lq], bgr2rgb=True, float32=self.batch_augment is None)
         # normalize
         if self.mean is not None or self.std is not None:
             normalize(img_lq, self.mean, self.std, inplace=True)
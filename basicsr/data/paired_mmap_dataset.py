@@ -0,0 +1,101 @@
+import numpy as np
+from torch.utils import data as data
+from torchvision.transforms.functional import normalize
+
+from basicsr.data.transforms import augment, paired_random_crop
+from basicsr.utils import bgr2ycbcr, img2tensor
+from basicsr.utils.mmap_util import MmapImageReader
+from basicsr.utils.registry import DATASET_REGISTRY
+
+
+@DATASET_REGISTRY.register()
+class PairedMmapDataset(data.Dataset):
+    """Paired image dataset reading from memory-mapped raw uint8 containers.
+
+    Same samples as PairedImageDataset, but GT and LQ are stored decoded (see
+    basicsr/utils/create_mmap.py) and cropped directly from the mapping: only
+    the cropped rows are read and converted to float32, so the per-sample cost
+    is proportional to the crop instead of a full PNG decode.
+
+    Args:
+        opt (dict): Config for train datasets. It contains the following keys:
+        dataroot_gt (str): GT container path (.mmap).
+        dataroot_lq (str): LQ container path (.mmap).
+        filename_tmpl (str): Template of the LQ key from the GT key, e.g. '{}x2'.
+            Default: '{}'.
+        gt_size (int): Cropped patched size for gt patches.
+        use_hflip (bool): Use horizontal flips.
+        use_rot (bool): Use rotation (use vertical flip and transposing h and w for implementation).
+        scale (bool): Scale, which will be added automatically.
+        phase (str): 'train' or 'val'.
+        batch_augment (str | None): 'collate' or 'device' to return uint8 crops
+            and flip / rotate whole batches (train only). Default: None.
+    """
+
+    def __init__(self, opt):
+        super(PairedMmapDataset, self).__init__()
+        self.opt = opt
+        self.mean = opt['mean'] if 'mean' in opt else None
+        self.std = opt['std'] if 'std' in opt else None
+        self.filename_tmpl = opt['filename_tmpl'] if 'filename_tmpl' in opt else '{}'
+        # 'collate' | 'device': return uint8 crops, flipped / rotated and
+        # converted to float32 for the whole batch by PairedBatchAugment
+        self.batch_augment = opt.get('batch_augment') if opt['phase'] == 'train' else None
+        if self.batch_augment not in (None, 'collate', 'device'):
+            raise ValueError(f"Wrong batch_augment {self.batch_augment}. Supported ones are: None, 'collate', 'device'.")
+        if self.batch_augment is not None and (self.opt.get('color') == 'y' or self.mean is not None
+                                               or self.std is not None):
+            raise ValueError('batch_augment does not support color y, mean or std.')
+
+        self.gt_folder, self.lq_folder = opt['dataroot_gt'], opt['dataroot_lq']
+        self.gt_reader = MmapImageReader(self.gt_folder)
+        self.lq_reader = MmapImageReader(self.lq_folder)
+
+        self.paths = []
+        for gt_key in sorted(self.gt_reader.index):
+            lq_key = self.filename_tmpl.format(gt_key)
+            if lq_key not in self.lq_reader.index:
+                raise ValueError(f'{lq_key} is not in {self.lq_folder}.')
+            self.paths.append({'lq_path': lq_key, 'gt_path': gt_key})
+
+    def __getitem__(self, index):
+        scale = self.opt['scale']
+
+        # Zero-copy views into the containers. Dimension order: HWC; channel order: BGR; uint8.
+        gt_path = self.paths[index]['gt_path']
+        lq_path = self.paths[index]['lq_path']
+        img_gt = self.gt_reader.get(gt_path)
+        img_lq = self.lq_reader.get(lq_path)
+
+        if self.opt['phase'] == 'train':
+            # random crop on the views, so only the crop is read
+            img_gt, img_lq = paired_random_crop(img_gt, img_lq, self.opt['gt_size'], scale, gt_path)
+        else:
+            # crop the unmatched GT images during validation or testing
+            img_gt = img_gt[0:img_lq.shape[0] * scale, 0:img_lq.shape[1] * scale, :]
+
+        if self.batch_augment is None:
+            # image range: [0, 1], float32 (same values as imfrombytes(float32=True))
+            img_gt = img_gt.astype(np.float32) / 255.
+            img_lq = img_lq.astype(np.float32) / 255.
+
+            if self.opt['phase'] == 'train':
+                # flip, rotation
+                img_gt, img_lq = augment([img_gt, img_lq], self.opt['use_hflip'], self.opt['use_rot'])
+
+        # color space transform
+        if 'color' in self.opt and self.opt['color'] == 'y':
+            img_gt = bgr2ycbcr(img_gt, y_only=True)[..., None]
+            img_lq = bgr2ycbcr(img_lq, y_only=True)[..., None]
+
+        # BGR to RGB, HWC to CHW, numpy to tensor
+        img_gt, img_lq = img2tensor([img_gt, img_lq], bgr2rgb=True, float32=self.batch_augment is None)
+        # normalize
+        if self.mean is not None or self.std is not None:
+            normalize(img_lq, self.mean, self.std, inplace=True)
+            normalize(img_gt, self.mean, self.std, inplace=True)
+
+        return {'lq': img_lq, 'gt': img_gt, 'lq_path': lq_path, 'gt_path': gt_path}
+
+    def __len__(self):
+        return len(self.paths)
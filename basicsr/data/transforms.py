@@ -158,6 +158,77 @@ def augment(imgs, hflip=True, rotation=True, flows=None, return_status=False):
             return imgs
 
 
+def batch_augment(imgs, hflip=True, rotation=True):
+    """Batched augment: horizontal flips OR rotate (0, 90, 180, 270 degrees).
+
+    Same transforms as augment, drawn independently for each sample of the
+    batch and shared by all the tensors of the list (e.g. gt and lq), applied
+    as whole-batch tensor ops (on any device, any dtype).
+
+    Args:
+        imgs (list[Tensor] | Tensor): Batches to be augmented, (b, c, h, w).
+            Rotation needs square images.
+        hflip (bool): Horizontal flip. Default: True.
+        rotation (bool): Rotation. Default: True.
+
+    Returns:
+        list[Tensor] | Tensor: Augmented batches. If returned results only
+            have one element, just return Tensor.
+    """
+    if not isinstance(imgs, list):
+        imgs = [imgs]
+    hflips, vflips, rot90s = torch.rand(3, imgs[0].size(0)) < 0.5
+    if not hflip:
+        hflips.zero_()
+    if not rotation:
+        vflips.zero_()
+        rot90s.zero_()
+
+    def _augment(img):
+        for flags, op in ((hflips, lambda x: x.flip(-1)), (vflips, lambda x: x.flip(-2)),
+                          (rot90s, lambda x: x.transpose(-2, -1))):
+            if flags.any():  # flags live on the cpu: no device sync
+                img = torch.where(flags.to(img.device, non_blocking=True).view(-1, 1, 1, 1), op(img), img)
+        return img
+
+    imgs = [_augment(img) for img in imgs]
+    if len(imgs) == 1:
+        imgs = imgs[0]
+    return imgs
+
+
+class PairedBatchAugment():
+    """Batch stage for datasets with the `batch_augment` option.
+
+    The workers return uint8 crops (CHW, RGB, not flipped). Flips, rot90 and
+    the conversion to float32 in [0, 1] are done here for the whole batch,
+    either in the DataLoader collate (`batch_augment: collate`) or on the
+    training device after the transfer (`batch_augment: device`, the host to
+    device copy is then 4x smaller than float32).
+
+    Args:
+        use_hflip (bool): Use horizontal flips. Default: True.
+        use_rot (bool): Use rotation. Default: True.
+    """
+
+    def __init__(self, use_hflip=True, use_rot=True):
+        self.use_hflip = use_hflip
+        self.use_rot = use_rot
+
+    def __call__(self, lq, gt):
+        lq, gt = batch_augment([lq, gt], self.use_hflip, self.use_rot)
+        # same values as imfrombytes(float32=True): x.astype(np.float32) / 255.
+        return lq.float().div_(255.), gt.float().div_(255.)
+
+    def collate(self, samples):
+        """collate_fn of the DataLoader."""
+        from torch.utils.data.dataloader import default_collate
+
+        batch = default_collate(samples)
+        batch['lq'], batch['gt'] = self(batch['lq'], batch['gt'])
+        return batch
+
+
 def img_rotate(img, angle, center=None, scale=1.0):
     """Rotate image.
 
@@ -4,6 +4,8 @@ from os import path as osp
 from tqdm import tqdm
 
 from basicsr.archs import build_network
+from basicsr.data.batch_degradation import BatchDegradation
+from basicsr.data.transforms import PairedBatchAugment
 from basicsr.losses import build_loss
 from basicsr.metrics import calculate_metric
 from basicsr.utils import get_root_logger, imwrite, tensor2img
@@ -23,6 +25,8 @@ class SRModel(BaseModel):
         self.net_g = self.model_to_device(self.net_g)
 
         self.print_network(self.net_g)
+        self.batch_augment = None
+        self.degradation = None
 
         # load pretrained models
         load_path = self.opt['path'].get('pretrain_network_g', None)
@@ -39,6 +43,17 @@ class SRModel(BaseModel):
         self.net_g.train()
         train_opt = self.opt['train']
 
+        # uint8 crops of a train dataset with batch_augment: device are
+        # flipped / rotated and converted to float32 after the transfer
+        train_dataset_opt = self.opt.get('datasets', {}).get('train', {})
+        if train_dataset_opt.get('batch_augment') == 'device':
+            self.batch_augment = PairedBatchAugment(
+                train_dataset_opt.get('use_hflip', True), train_dataset_opt.get('use_rot', True))
+
+        # LQ batches synthesized from GT-only training batches
+        if self.opt.get('degradation') is not None:
+            self.degradation = BatchDegradation(self.opt['degradation'], self.opt['scale'], self.device)
+
         self.ema_decay = train_opt.get('ema_decay', 0)
         if self.ema_decay > 0:
             logger = get_root_logger()
@@ -88,9 +103,14 @@ class SRModel(BaseModel):
         self.optimizers.append(self.optimizer_g)
 
     def feed_data(self, data):
-        self.lq = data['lq'].to(self.device)
+        if 'lq' in data:
+            self.lq = data['lq'].to(self.device)
         if 'gt' in data:
             self.gt = data['gt'].to(self.device)
+        if self.batch_augment is not None and 'lq' in data and self.lq.dtype == torch.uint8:
+            self.lq, self.gt = self.batch_augment(self.lq, self.gt)
+        if self.degradation is not None and 'lq' not in data:
+            self.lq = self.degradation(self.gt)
 
     def optimize_parameters(self, current_iter):
         self.optimizer_g.zero_grad()
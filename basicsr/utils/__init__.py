@@ -1,12 +1,38 @@
-from .color_util import bgr2ycbcr, rgb2ycbcr, rgb2ycbcr_pt, ycbcr2bgr, ycbcr2rgb
-from .diffjpeg import DiffJPEG
-from .file_client import FileClient
-from .img_process_util import USMSharp, usm_sharp
-from .img_util import crop_border, imfrombytes, img2tensor, imwrite, tensor2img
-from .logger import AvgTimer, MessageLogger, get_env_info, get_root_logger, init_tb_logger, init_wandb_logger
-from .misc import check_resume, get_time_str, make_exp_dirs, mkdir_and_rename, scandir, set_random_seed, sizeof_fmt, \
-    scandir_SIDD
-from .options import yaml_load
+import importlib
+
+# Public names and the modules defining them. Modules are imported lazily on first access
+# (PEP 562), so e.g. importing basicsr.utils.registry does not import cv2, lmdb or torchvision.
+_LAZY_NAMES = {
+    'bgr2ycbcr': 'color_util',
+    'rgb2ycbcr': 'color_util',
+    'rgb2ycbcr_pt': 'color_util',
+    'ycbcr2bgr': 'color_util',
+    'ycbcr2rgb': 'color_util',
+    'DiffJPEG': 'diffjpeg',
+    'FileClient': 'file_client',
+    'USMSharp': 'img_process_util',
+    'usm_sharp': 'img_process_util',
+    'crop_border': 'img_util',
+    'imfrombytes': 'img_util',
+    'img2tensor': 'img_util',
+    'imwrite': 'img_util',
+    'tensor2img': 'img_util',
+    'AvgTimer': 'logger',
+    'MessageLogger': 'logger',
+    'get_env_info': 'logger',
+    'get_root_logger': 'logger',
+    'init_tb_logger': 'logger',
+    'init_wandb_logger': 'logger',
+    'check_resume': 'misc',
+    'get_time_str': 'misc',
+    'make_exp_dirs': 'misc',
+    'mkdir_and_rename': 'misc',
+    'scandir': 'misc',
+    'set_random_seed': 'misc',
+    'sizeof_fmt': 'misc',
+    'scandir_SIDD': 'misc',
+    'yaml_load': 'options',
+}
 
 __all__ = [
     #  color_util.py
@@ -47,3 +73,15 @@ __all__ = [
     # options
     'yaml_load'
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module(f'.{_LAZY_NAMES[name]}', __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_NAMES))
@@ -8,7 +8,7 @@ import argparse
 from os import path as osp
 
 from basicsr.utils import scandir
-from basicsr.utils.lmdb_util import make_lmdb_from_imgs
+from basicsr.utils.lmdb_util import make_lmdb_from_imgs, make_lmdb_from_imgs_parallel
 
 
 def prepare_keys(folder_path, suffix='png'):
@@ -134,4 +134,39 @@ def create_lmdb_for_SIDD():
         cv2.imwrite(osp.join(folder_path, 'ValidationBlocksSrgb_{}.png'.format(i)), cv2.cvtColor(data[i,...], cv2.COLOR_RGB2BGR)) 
     img_path_list, keys = prepare_keys(folder_path, 'png')
     make_lmdb_from_imgs(folder_path, lmdb_path, img_path_list, keys)
-    '''
\ No newline at end of file
+    '''
+
+
+def create_lmdb_for_df2k(root='./datasets/DF2K', scales=(2, 3, 4), sub=False, n_thread=8):
+    """DF2K HR and LR-bicubic lmdb for PairedImageDataset with io_backend lmdb.
+
+    Creates DF2K_train_HR.lmdb and DF2K_train_LR_bicubic/X{scale}.lmdb (the
+    `_sub` folders of extract_subimages.py if `sub`). The `x{scale}` suffix of
+    the LR file names is dropped from the keys, so that all the meta_info.txt
+    have the same keys, as paired_paths_from_lmdb expects.
+
+    Args:
+        root (str): DF2K root.
+        scales (tuple[int]): LR scales.
+        sub (bool): Use the sub-image folders. Default: False.
+        n_thread (int): Number of encoding processes.
+    """
+    suffix = '_sub' if sub else ''
+    folders = [(osp.join(root, f'DF2K_train_HR{suffix}'), None)]
+    folders += [(osp.join(root, 'DF2K_train_LR_bicubic', f'X{scale}{suffix}'), scale) for scale in scales]
+    for folder_path, scale in folders:
+        img_path_list, keys = prepare_keys(folder_path, 'png')
+        if scale is not None and not sub:
+            keys = [key[:-len(f'x{scale}')] if key.endswith(f'x{scale}') else key for key in keys]
+        make_lmdb_from_imgs_parallel(folder_path, f'{folder_path}.lmdb', img_path_list, keys, n_thread=n_thread)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Create the DF2K HR / LR-bicubic lmdb.')
+    parser.add_argument('--df2k-root', type=str, default='./datasets/DF2K', help='DF2K root.')
+    parser.add_argument('--scales', nargs='+', type=int, default=[2, 3, 4], help='LR scales.')
+    parser.add_argument('--sub', action='store_true', help='Use the sub-image folders (extract_subimages.py).')
+    parser.add_argument('--n-thread', type=int, default=8, help='Number of encoding processes.')
+    args = parser.parse_args()
+
+    create_lmdb_for_df2k(args.df2k_root, args.scales, args.sub, args.n_thread)
@@ -0,0 +1,47 @@
+import argparse
+from os import path as osp
+
+from basicsr.utils.create_lmdb import prepare_keys
+from basicsr.utils.mmap_util import make_mmap_from_imgs
+
+
+def create_mmap_for_folders(folders, output_dir=None, suffix='png', n_thread=8):
+    """Pack each image folder into a memory-mapped raw container.
+
+    The container of `path/to/X2` is `path/to/X2.mmap` (or `output_dir/X2.mmap`).
+
+    Args:
+        folders (list[str]): Image folders, e.g. the HR folder and the LR X2/X3/X4 folders.
+        output_dir (str | None): Output directory. Default: next to each folder.
+        suffix (str): Image suffix. Default: 'png'.
+        n_thread (int): Number of decoding processes.
+    """
+    for folder_path in folders:
+        folder_path = folder_path.rstrip('/\\')
+        name = f'{osp.basename(folder_path)}.mmap'
+        mmap_path = osp.join(output_dir, name) if output_dir else osp.join(osp.dirname(folder_path), name)
+        img_path_list, keys = prepare_keys(folder_path, suffix)
+        make_mmap_from_imgs(folder_path, mmap_path, img_path_list, keys, n_thread=n_thread)
+
+
+def create_mmap_for_df2k(root='./datasets/DF2K', scales=(2, 3, 4), n_thread=8):
+    """DF2K preset: DF2K_train_HR and DF2K_train_LR_bicubic/X{scale}."""
+    folders = [osp.join(root, 'DF2K_train_HR')]
+    folders += [osp.join(root, 'DF2K_train_LR_bicubic', f'X{scale}') for scale in scales]
+    create_mmap_for_folders(folders, n_thread=n_thread)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pack image folders into memory-mapped raw uint8 containers.')
+    parser.add_argument('--folders', nargs='+', default=None, help='Image folders (default: the DF2K preset).')
+    parser.add_argument('--df2k-root', type=str, default='./datasets/DF2K', help='Root of the DF2K preset.')
+    parser.add_argument('--scales', nargs='+', type=int, default=[2, 3, 4], help='LR scales of the DF2K preset.')
+    parser.add_argument('--output-dir', type=str, default=None, help='Output directory (default: next to the folders).')
+    parser.add_argument('--suffix', type=str, default='png', help='Image suffix.')
+    parser.add_argument('--n-thread', type=int, default=8, help='Number of decoding processes.')
+    args = parser.parse_args()
+
+    if args.folders:
+        create_mmap_for_folders(args.folders, args.output_dir, args.suffix, args.n_thread)
+    else:
+        create_mmap_for_df2k(args.df2k_root, args.scales, args.n_thread)
@@ -0,0 +1,203 @@
+import argparse
+import cv2
+import math
+import numpy as np
+import os
+from multiprocessing import Pool
+from os import path as osp
+from tqdm import tqdm
+
+from basicsr.utils import scandir
+
+
+def crop_positions(size, crop_size, step, thresh_size, align=1):
+    """Top-left positions of the overlapping crops along one axis.
+
+    Crops start every `step` pixels. If the remainder after the last crop is
+    larger than `thresh_size`, one more crop is added at the end, moved back
+    to a multiple of `align` so that it falls on the LR pixel grid.
+
+    Args:
+        size (int): Image size along the axis (HR).
+        crop_size (int): Crop size (HR).
+        step (int): Step between crops (HR).
+        thresh_size (int): Threshold size of the remainder.
+        align (int): Alignment of the positions, e.g. the lcm of the scales. Default: 1.
+
+    Returns:
+        list[int]: Positions.
+    """
+    positions = list(range(0, size - crop_size + 1, step))
+    if positions and size - (positions[-1] + crop_size) > thresh_size:
+        last = (size - crop_size) // align * align
+        if last > positions[-1]:
+            positions.append(last)
+    return positions
+
+
+def worker(name, opt):
+    """Crop one HR image and its LR images into sub-images.
+
+    Sub-image i of `0001.png` is saved as `0001_s00i.png` in every save folder,
+    so HR and LR sub-images have the same names (filename_tmpl '{}').
+
+    Args:
+        name (str): HR image name, e.g. '0001.png'.
+        opt (dict): Options of extract_subimages.
+
+    Returns:
+        list[str]: Meta information lines of the HR sub-images.
+    """
+    crop_size, step, thresh_size = opt['crop_size'], opt['step'], opt['thresh_size']
+    basename, ext = osp.splitext(name)
+    img = cv2.imread(osp.join(opt['input_folder'], name), cv2.IMREAD_UNCHANGED)
+    if img is None:
+        raise IOError(f"Cannot read HR image: {osp.join(opt['input_folder'], name)}")
+    lr_imgs = {}
+    for scale, (lr_folder, _) in opt['lr_folders'].items():
+        lr_name = f"{opt['lr_tmpl'].format(basename, scale)}{ext}"
+        lr_imgs[scale] = cv2.imread(osp.join(lr_folder, lr_name), cv2.IMREAD_UNCHANGED)
+        if lr_imgs[scale] is None:
+            raise IOError(f'Cannot read LR image: {osp.join(lr_folder, lr_name)}')
+
+    h, w = img.shape[0:2]
+    for scale, lr_img in lr_imgs.items():
+        # positions are taken on the HR grid, the LR image must cover it
+        h, w = min(h, lr_img.shape[0] * scale), min(w, lr_img.shape[1] * scale)
+    h_space = crop_positions(h, crop_size, step, thresh_size, opt['align'])
+    w_space = crop_positions(w, crop_size, step, thresh_size, opt['align'])
+
+    meta_info = []
+    index = 0
+    for x in h_space:
+        for y in w_space:
+            index += 1
+            sub_name = f'{basename}_s{index:03d}{ext}'
+            cropped_img = np.ascontiguousarray(img[x:x + crop_size, y:y + crop_size, ...])
+            cv2.imwrite(
+                osp.join(opt['save_folder'], sub_name), cropped_img,
+                [cv2.IMWRITE_PNG_COMPRESSION, opt['compression_level']])
+            for scale, lr_img in lr_imgs.items():
+                lr_x, lr_y, lr_crop_size = x // scale, y // scale, crop_size // scale
+                cropped_lr = np.ascontiguousarray(lr_img[lr_x:lr_x + lr_crop_size, lr_y:lr_y + lr_crop_size, ...])
+                cv2.imwrite(
+                    osp.join(opt['lr_folders'][scale][1], sub_name), cropped_lr,
+                    [cv2.IMWRITE_PNG_COMPRESSION, opt['compression_level']])
+            c = cropped_img.shape[2] if cropped_img.ndim == 3 else 1
+            meta_info.append(f'{sub_name} ({crop_size},{crop_size},{c})')
+    return meta_info
+
+
+def _worker(args):
+    return worker(*args)
+
+
+def extract_subimages(opt):
+    """Crop HR images and the matching LR images into overlapping sub-images.
+
+    Smaller files mean far less decode work per training sample. Each process
+    of the pool handles one HR image (and its LR images) at a time and writes
+    the sub-images directly, so memory stays bounded whatever the dataset size.
+
+    The meta information file lists the HR sub-images, one `name (h,w,c)` per
+    line, and can be used as `meta_info_file` of PairedImageDataset
+    (paired_paths_from_meta_info_file) with filename_tmpl '{}'.
+
+    Args:
+        opt (dict): Configuration dict. It contains:
+        input_folder (str): Path to the HR folder.
+        save_folder (str): Path to save the HR sub-images.
+        lr_folders (dict): Scale -> (LR folder, path to save the LR sub-images).
+        lr_tmpl (str): LR file name from the HR basename and the scale. Default: '{}x{}'.
+        crop_size (int): HR crop size. Must be divisible by the scales.
+        step (int): HR step for overlapped sliding window. Must be divisible by the scales.
+        thresh_size (int): Threshold size. Patches whose size is lower than thresh_size will be dropped.
+        n_thread (int): Thread number.
+        compression_level (int): PNG compression level.
+        meta_info (str): Path of the meta information file.
+    """
+    opt.setdefault('lr_folders', {})
+    opt.setdefault('lr_tmpl', '{}x{}')
+    opt['align'] = 1
+    for scale in opt['lr_folders']:
+        if opt['crop_size'] % scale or opt['step'] % scale:
+            raise ValueError(f"crop_size {opt['crop_size']} and step {opt['step']} must be divisible by {scale}.")
+        opt['align'] = opt['align'] * scale // math.gcd(opt['align'], scale)
+
+    save_folders = [opt['save_folder']] + [save_folder for _, save_folder in opt['lr_folders'].values()]
+    for save_folder in save_folders:
+        if osp.exists(save_folder):
+            print(f'Folder {save_folder} already exists. Exit.')
+            return False
+    for save_folder in save_folders:
+        os.makedirs(save_folder)
+        print(f'mkdir {save_folder} ...')
+
+    img_list = sorted(scandir(opt['input_folder'], suffix='png', recursive=False))
+    meta_info = []
+    pbar = tqdm(total=len(img_list), unit='image', desc='Extract')
+    with Pool(opt['n_thread']) as pool:
+        for lines in pool.imap_unordered(_worker, [(name, opt) for name in img_list]):
+            meta_info.extend(lines)
+            pbar.update(1)
+    pbar.close()
+
+    with open(opt['meta_info'], 'w') as fout:
+        for line in sorted(meta_info):
+            fout.write(f'{line}\n')
+    print(f'{len(meta_info)} sub-images per folder. Meta information: {opt["meta_info"]}')
+    return True
+
+
+def create_lmdb_for_subimages(folders, n_thread=8):
+    """Pack sub-image folders into LMDB (`folder.lmdb`), keyed by the shared sub-image names."""
+    from basicsr.utils.create_lmdb import prepare_keys
+    from basicsr.utils.lmdb_util import make_lmdb_from_imgs_parallel
+
+    for folder_path in folders:
+        img_path_list, keys = prepare_keys(folder_path, 'png')
+        make_lmdb_from_imgs_parallel(folder_path, f'{folder_path}.lmdb', img_path_list, keys, n_thread=n_thread)
+
+
+def main():
+    """DF2K preset by default: DF2K_train_HR and DF2K_train_LR_bicubic/X{2,3,4}.
+
+    Sub-images go to `<folder>_sub`, e.g. DF2K_train_HR_sub and X2_sub.
+    """
+    parser = argparse.ArgumentParser(description='Extract overlapping HR / LR sub-images for training.')
+    parser.add_argument('--input', type=str, default='datasets/DF2K/DF2K_train_HR', help='HR folder.')
+    parser.add_argument('--lr-root', type=str, default='datasets/DF2K/DF2K_train_LR_bicubic',
+                        help='Root of the LR folders X{scale}.')
+    parser.add_argument('--scales', nargs='*', type=int, default=[2, 3, 4], help='LR scales (none: HR only).')
+    parser.add_argument('--lr-tmpl', type=str, default='{}x{}', help='LR file name from the HR name and the scale.')
+    parser.add_argument('--crop-size', type=int, default=480, help='HR crop size.')
+    parser.add_argument('--step', type=int, default=240, help='HR step.')
+    parser.add_argument('--thresh-size', type=int, default=0, help='Threshold size of the remainder.')
+    parser.add_argument('--n-thread', type=int, default=20, help='Number of processes.')
+    parser.add_argument('--compression-level', type=int, default=3, help='PNG compression level.')
+    parser.add_argument('--meta-info', type=str, default=None,
+                        help='Meta information file (default: meta_info_<HR sub folder>.txt next to it).')
+    parser.add_argument('--lmdb', action='store_true', help='Also pack the sub-image folders into LMDB.')
+    args = parser.parse_args()
+
+    input_folder = args.input.rstrip('/\\')
+    save_folder = f'{input_folder}_sub'
+    opt = {
+        'input_folder': input_folder,
+        'save_folder': save_folder,
+        'lr_folders': {scale: (osp.join(args.lr_root, f'X{scale}'), osp.join(args.lr_root, f'X{scale}_sub'))
+                       for scale in args.scales},
+        'lr_tmpl': args.lr_tmpl,
+        'crop_size': args.crop_size,
+        'step': args.step,
+        'thresh_size': args.thresh_size,
+        'n_thread': args.n_thread,
+        'compression_level': args.compression_level,
+        'meta_info': args.meta_info or osp.join(osp.dirname(save_folder), f'meta_info_{osp.basename(save_folder)}.txt')
+    }
+    if extract_subimages(opt) and args.lmdb:
+        create_lmdb_for_subimages([save_folder] + [folder for _, folder in opt['lr_folders'].values()], args.n_thread)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,4 @@
+import os
 from abc import ABCMeta, abstractmethod
 
 
@@ -72,6 +73,13 @@ class HardDiskBackend(BaseStorageBackend):
 
 class LmdbBackend(BaseStorageBackend):
     """Lmdb storage backend.
+
+    Each process keeps one long-lived read transaction per environment, so a
+    get is a single B-tree lookup instead of a transaction begin / abort. The
+    environments are reopened automatically in a new process, e.g. when the
+    backend was created before the DataLoader workers fork (an lmdb env must
+    not be used across fork).
+
     Args:
         db_paths (str | list[str]): Lmdb database paths.
         client_keys (str | list[str]): Lmdb client keys. Default: 'default'.
@@ -83,6 +91,12 @@ class LmdbBackend(BaseStorageBackend):
             disable the OS filesystem readahead mechanism, which may improve
             random read performance when a database is larger than RAM.
             Default: False.
+        map_size (int | None, optional): Lmdb environment parameter. If None,
+            the size recorded in the database is used. Default: None.
+        zero_copy (bool, optional): If True, return memoryviews into the
+            memory map instead of bytes copies. They can be passed straight to
+            np.frombuffer / cv2.imdecode and stay valid as long as the backend
+            is open in the process. Default: True.
     Attributes:
         db_paths (list): Lmdb database path.
         _client (list): A list of several lmdb envs.
@@ -94,9 +108,11 @@ class LmdbBackend(BaseStorageBackend):
                  readonly=True,
                  lock=False,
                  readahead=False,
+                 map_size=None,
+                 zero_copy=True,
                  **kwargs):
         try:
-            import lmdb
+            import lmdb  # noqa: F401
         except ImportError:
             raise ImportError('Please install lmdb to enable LmdbBackend.')
 
@@ -111,17 +127,29 @@ class LmdbBackend(BaseStorageBackend):
             'client_keys and db_paths should have the same length, '
             f'but received {len(client_keys)} and {len(self.db_paths)}.')
 
+        self.client_keys = client_keys
+        self.zero_copy = zero_copy
+        self._env_kwargs = dict(readonly=readonly, lock=lock, readahead=readahead, **kwargs)
+        if map_size is not None:
+            self._env_kwargs['map_size'] = map_size
         self._client = {}
+        self._txn = {}
+        self._pid = None
+        # environments inherited through fork: never touched again, but kept
+        # referenced so that they are not closed under the parent
+        self._inherited = []
+        self._open()
 
-        for client, path in zip(client_keys, self.db_paths):
-            self._client[client] = lmdb.open(
-                path,
-                readonly=readonly,
-                lock=lock,
-                readahead=readahead,
-                map_size=8*1024*10485760,
-                # max_readers=1,
-                **kwargs)
+    def _open(self):
+        import lmdb
+
+        if self._client:
+            self._inherited.append((self._client, self._txn))
+        self._client, self._txn = {}, {}
+        for client, path in zip(self.client_keys, self.db_paths):
+            self._client[client] = lmdb.open(path, **self._env_kwargs)
+            self._txn[client] = self._client[client].begin(write=False, buffers=self.zero_copy)
+        self._pid = os.getpid()
 
     def get(self, filepath, client_key):
         """Get values according to the filepath from one lmdb named client_key.
@@ -129,19 +157,90 @@ class LmdbBackend(BaseStorageBackend):
             filepath (str | obj:`Path`): Here, filepath is the lmdb key.
             client_key (str): Used for distinguishing differnet lmdb envs.
         """
-        filepath = str(filepath)
-        assert client_key in self._client, (f'client_key {client_key} is not '
-                                            'in lmdb clients.')
-        client = self._client[client_key]
-        with client.begin(write=False) as txn:
-            # print(filepath.encode('ascii'))
-            value_buf = txn.get(filepath.encode('ascii'))
-        return value_buf
+        return self.get_many([filepath], [client_key])[0]
+
+    def get_many(self, filepaths, client_keys):
+        """Get several values, e.g. the lq and gt images of a sample, in one call.
+        Args:
+            filepaths (list[str | obj:`Path`]): Lmdb keys.
+            client_keys (list[str]): Lmdb env of each key.
+        """
+        if self._pid != os.getpid():
+            self._open()
+        values = []
+        for filepath, client_key in zip(filepaths, client_keys):
+            assert client_key in self._client, (f'client_key {client_key} is not '
+                                                'in lmdb clients.')
+            values.append(self._txn[client_key].get(str(filepath).encode('ascii')))
+        return values
+
+    def close(self):
+        """Release the read transactions and close the environments of this process."""
+        if self._pid == os.getpid():
+            for client in self._client:
+                self._txn[client].abort()
+                self._client[client].close()
+        self._client, self._txn = {}, {}
+        self._pid = None
 
     def get_text(self, filepath):
         raise NotImplementedError
 
 
+class ShmBackend(BaseStorageBackend):
+    """Shared-memory in-RAM storage backend.
+
+    Loads the encoded bytes of all the files once into a single anonymous
+    shared memory segment, with an offset index. Create it before the
+    DataLoader workers fork: they then share the segment (no duplicate
+    per-worker caches, no disk reads or page-cache pressure during training)
+    and get zero-copy memoryviews into it. Requires the fork start method.
+
+    Args:
+        filepaths (list[str]): Paths of the files to load. They are given by
+            the dataset (PairedImageDataset and BicubicImageDataset), not by
+            the io_backend options.
+        num_threads (int): Number of reading threads. Default: 16.
+    """
+
+    def __init__(self, filepaths=None, num_threads=16, **kwargs):
+        import mmap
+        from concurrent.futures import ThreadPoolExecutor
+
+        if filepaths is None:
+            raise ValueError('ShmBackend needs the files to load (filepaths), given by the dataset when it is created, '
+                             'before the workers fork. Datasets supporting io_backend shm: PairedImageDataset, '
+                             'BicubicImageDataset.')
+        filepaths = sorted(set(str(v) for v in filepaths))
+        self._index = {}
+        offset = 0
+        for filepath in filepaths:
+            size = os.path.getsize(filepath)
+            self._index[filepath] = (offset, size)
+            offset += size
+        # anonymous MAP_SHARED memory: inherited by forked workers, freed with
+        # the last process (nothing left behind in /dev/shm after a crash)
+        self._buffer = mmap.mmap(-1, max(offset, 1))
+        self._view = memoryview(self._buffer)
+        self.nbytes = offset
+
+        def load(filepath):
+            offset, size = self._index[filepath]
+            with open(filepath, 'rb') as f:
+                if f.readinto(self._view[offset:offset + size]) != size:
+                    raise IOError(f'Short read: {filepath}')
+
+        with ThreadPoolExecutor(num_threads) as executor:
+            list(executor.map(load, filepaths))
+
+    def get(self, filepath):
+        offset, size = self._index[str(filepath)]
+        return self._view[offset:offset + size]
+
+    def get_text(self, filepath):
+        return bytes(self.get(filepath)).decode()
+
+
 class FileClient(object):
     """A general file client to access files in different backend.
     The client loads a file or text in a specified backend from its path
@@ -149,7 +248,7 @@ class FileClient(object):
     accessor with a given name and backend class.
     Attributes:
         backend (str): The storage backend type. Options are "disk",
-            "memcached" and "lmdb".
+            "memcached", "lmdb" and "shm".
         client (:obj:`BaseStorageBackend`): The backend object.
     """
 
@@ -157,6 +256,7 @@ class FileClient(object):
         'disk': HardDiskBackend,
         'memcached': MemcachedBackend,
         'lmdb': LmdbBackend,
+        'shm': ShmBackend,
     }
 
     def __init__(self, backend='disk', **kwargs):
@@ -175,5 +275,14 @@ class FileClient(object):
         else:
             return self.client.get(filepath)
 
+    def get_many(self, filepaths, client_keys='default'):
+        """Get several files in one call (a single lookup per key for lmdb)."""
+        if isinstance(client_keys, str):
+            client_keys = [client_keys] * len(filepaths)
+        if self.backend == 'lmdb':
+            return self.client.get_many(filepaths, client_keys)
+        else:
+            return [self.get(filepath, client_key) for filepath, client_key in zip(filepaths, client_keys)]
+
     def get_text(self, filepath):
         return self.client.get_text(filepath)
\ No newline at end of file
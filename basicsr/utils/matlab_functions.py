@@ -82,6 +82,43 @@ def calculate_weights_indices(in_length, out_length, scale, kernel, kernel_width
     return weights, indices, int(sym_len_s), int(sym_len_e)
 
 
+def _resize_along(img, weights, indices, sym_len_s, sym_len_e, dim):
+    """Apply the imresize weights along one dimension of a (..., h, w) tensor.
+
+    The dimension is extended by symmetric copying, then output i is the
+    weighted sum of its kernel window, accumulated tap by tap. Every tap is a
+    single op over the whole tensor (all outputs, channels and images at once).
+
+    The previous loop implementation summed each window with a BLAS
+    matrix-vector product, whose summation order is not specified, so the
+    results are not bit-exact with it: they agree up to float32 rounding
+    (max abs diff within 1e-5, at most one uint8 level after rounding), as
+    checked by benchmarks/benchmark_imresize.py --check.
+
+    Args:
+        img (Tensor): Input, (..., h, w).
+        weights (Tensor): Weights, (out_length, kernel_width).
+        indices (Tensor): Window indices in the extended input, (out_length, kernel_width).
+        sym_len_s (int): Symmetric extension at the start.
+        sym_len_e (int): Symmetric extension at the end.
+        dim (int): -2 (h) or -1 (w).
+
+    Returns:
+        Tensor: Output, (..., out_length, w) or (..., h, out_length).
+    """
+    in_length = img.size(dim)
+    img_aug = torch.cat((img.narrow(dim, 0, sym_len_s).flip(dim), img,
+                         img.narrow(dim, in_length - sym_len_e, sym_len_e).flip(dim)), dim)
+    start = indices[:, 0].long().to(img.device)
+    weights = weights.to(img.device)
+    shape = (-1, 1) if dim == -2 else (-1, )
+    out = None
+    for k in range(weights.size(1)):
+        term = img_aug.index_select(dim, start + k) * weights[:, k].view(shape)
+        out = term if out is None else out + term
+    return out
+
+
 @torch.no_grad()
 def imresize(img, scale, antialiasing=True):
     """imresize function same as MATLAB.
@@ -89,9 +126,13 @@ def imresize(img, scale, antialiasing=True):
     It now only supports bicubic.
     The same scale applies for both height and width.
 
+    The weights are applied with whole-tensor ops (one per kernel tap), so a
+    batch of images, e.g. the GT crops of a mini-batch, can be resized in one
+    call, on any device.
+
     Args:
         img (Tensor | Numpy array):
-            Tensor: Input image with shape (c, h, w), [0, 1] range.
+            Tensor: Input image with shape (c, h, w) or (b, c, h, w), [0, 1] range.
             Numpy: Input image with shape (h, w, c), [0, 1] range.
         scale (float): Scale factor. The same scale applies for both height
             and width.
@@ -99,7 +140,8 @@ def imresize(img, scale, antialiasing=True):
             Default: True.
 
     Returns:
-        Tensor: Output image with shape (c, h, w), [0, 1] range, w/o round.
+        Tensor: Output image with shape (c, h, w) or (b, c, h, w), [0, 1]
+            range, w/o round.
     """
     squeeze_flag = False
     if type(img).__module__ == np.__name__:  # numpy type
@@ -113,8 +155,9 @@ def imresize(img, scale, antialiasing=True):
         if img.ndim == 2:
             img = img.unsqueeze(0)
             squeeze_flag = True
+        img = img.float()
 
-    in_c, in_h, in_w = img.size()
+    in_h, in_w = img.shape[-2:]
     out_h, out_w = math.ceil(in_h * scale), math.ceil(in_w * scale)
     kernel_width = 4
     kernel = 'cubic'
@@ -124,49 +167,9 @@ def imresize(img, scale, antialiasing=True):
                                                                              antialiasing)
     weights_w, indices_w, sym_len_ws, sym_len_we = calculate_weights_indices(in_w, out_w, scale, kernel, kernel_width,
                                                                              antialiasing)
-    # process H dimension
-    # symmetric copying
-    img_aug = torch.FloatTensor(in_c, in_h + sym_len_hs + sym_len_he, in_w)
-    img_aug.narrow(1, sym_len_hs, in_h).copy_(img)
-
-    sym_patch = img[:, :sym_len_hs, :]
-    inv_idx = torch.arange(sym_patch.size(1) - 1, -1, -1).long()
-    sym_patch_inv = sym_patch.index_select(1, inv_idx)
-    img_aug.narrow(1, 0, sym_len_hs).copy_(sym_patch_inv)
-
-    sym_patch = img[:, -sym_len_he:, :]
-    inv_idx = torch.arange(sym_patch.size(1) - 1, -1, -1).long()
-    sym_patch_inv = sym_patch.index_select(1, inv_idx)
-    img_aug.narrow(1, sym_len_hs + in_h, sym_len_he).copy_(sym_patch_inv)
-
-    out_1 = torch.FloatTensor(in_c, out_h, in_w)
-    kernel_width = weights_h.size(1)
-    for i in range(out_h):
-        idx = int(indices_h[i][0])
-        for j in range(in_c):
-            out_1[j, i, :] = img_aug[j, idx:idx + kernel_width, :].transpose(0, 1).mv(weights_h[i])
-
-    # process W dimension
-    # symmetric copying
-    out_1_aug = torch.FloatTensor(in_c, out_h, in_w + sym_len_ws + sym_len_we)
-    out_1_aug.narrow(2, sym_len_ws, in_w).copy_(out_1)
-
-    sym_patch = out_1[:, :, :sym_len_ws]
-    inv_idx = torch.arange(sym_patch.size(2) - 1, -1, -1).long()
-    sym_patch_inv = sym_patch.index_select(2, inv_idx)
-    out_1_aug.narrow(2, 0, sym_len_ws).copy_(sym_patch_inv)
-
-    sym_patch = out_1[:, :, -sym_len_we:]
-    inv_idx = torch.arange(sym_patch.size(2) - 1, -1, -1).long()
-    sym_patch_inv = sym_patch.index_select(2, inv_idx)
-    out_1_aug.narrow(2, sym_len_ws + in_w, sym_len_we).copy_(sym_patch_inv)
-
-    out_2 = torch.FloatTensor(in_c, out_h, out_w)
-    kernel_width = weights_w.size(1)
-    for i in range(out_w):
-        idx = int(indices_w[i][0])
-        for j in range(in_c):
-            out_2[j, :, i] = out_1_aug[j, :, idx:idx + kernel_width].mv(weights_w[i])
+    # process H dimension, then W dimension
+    out_1 = _resize_along(img, weights_h, indices_h, sym_len_hs, sym_len_he, -2)
+    out_2 = _resize_along(out_1, weights_w, indices_w, sym_len_ws, sym_len_we, -1)
 
     if squeeze_flag:
         out_2 = out_2.squeeze(0)
@@ -0,0 +1,132 @@
+import cv2
+import numpy as np
+import os
+import sys
+from multiprocessing import Pool
+from os import path as osp
+from tqdm import tqdm
+
+DATA_NAME = 'data.bin'
+META_INFO_NAME = 'meta_info.txt'
+
+
+def read_raw_img_worker(path, key):
+    """Read image worker: decode to the HWC BGR uint8 array that imfrombytes (flag 'color') would give.
+
+    Args:
+        path (str): Image path.
+        key (str): Image key.
+
+    Returns:
+        str: Image key.
+        ndarray: Image (HWC, BGR, uint8).
+    """
+    img = cv2.imread(path, cv2.IMREAD_COLOR)
+    if img is None:
+        raise IOError(f'Cannot read image: {path}')
+    return key, img
+
+
+def _read_raw_img_worker(args):
+    return read_raw_img_worker(*args)
+
+
+def make_mmap_from_imgs(data_path, mmap_path, img_path_list, keys, n_thread=8, chunk=64):
+    """Make a memory-mapped raw uint8 container from images.
+
+    Contents of the container:
+
+    ::
+
+        example.mmap
+        ├── data.bin
+        ├── meta_info.txt
+
+    data.bin holds the decoded pixels (HWC, BGR, uint8) of all images back to
+    back. Each line of meta_info.txt records 1)image name (key + .png, as in
+    the lmdb meta_info), 2)image shape and 3)byte offset in data.bin, e.g.
+    `0001.png (1356,2040,3) 0`.
+
+    Reading a crop from the container only touches the rows of the crop, so
+    the per-sample cost is proportional to the crop, not to the image, and
+    there is no decoding at all (at the price of an uncompressed file).
+
+    Images are decoded with a process pool, chunk images at a time, so memory
+    stays bounded.
+
+    Args:
+        data_path (str): Data path for reading images.
+        mmap_path (str): Container save path, ending with '.mmap'.
+        img_path_list (list[str]): Image path list (relative to data_path).
+        keys (list[str]): Image keys.
+        n_thread (int): Number of decoding processes. Default: 8.
+        chunk (int): Number of images decoded ahead of the writer. Default: 64.
+    """
+    assert len(img_path_list) == len(keys), ('img_path_list and keys should have the same length, '
+                                             f'but got {len(img_path_list)} and {len(keys)}')
+    if not mmap_path.endswith('.mmap'):
+        raise ValueError("mmap_path must end with '.mmap'.")
+    if osp.exists(mmap_path):
+        print(f'Folder {mmap_path} already exists. Exit.')
+        sys.exit(1)
+    print(f'Create mmap container for {data_path}, save to {mmap_path}...')
+    os.makedirs(mmap_path)
+
+    offset = 0
+    tasks = [(osp.join(data_path, path), key) for path, key in zip(img_path_list, keys)]
+    pbar = tqdm(total=len(tasks), unit='image')
+    with Pool(n_thread) as pool, open(osp.join(mmap_path, DATA_NAME), 'wb') as data_file, \
+            open(osp.join(mmap_path, META_INFO_NAME), 'w') as txt_file:
+        for start in range(0, len(tasks), chunk):
+            for key, img in pool.imap(_read_raw_img_worker, tasks[start:start + chunk]):
+                h, w, c = img.shape
+                data_file.write(np.ascontiguousarray(img).tobytes())
+                txt_file.write(f'{key}.png ({h},{w},{c}) {offset}\n')
+                offset += img.nbytes
+                pbar.update(1)
+                pbar.set_description(f'Write {key}')
+    pbar.close()
+    print(f'\nFinish writing mmap container: {offset / 1024 ** 3:.2f} GB.')
+
+
+def read_mmap_meta_info(mmap_path):
+    """Read the meta_info.txt of a container.
+
+    Returns:
+        dict: key -> (offset, (h, w, c)), in file order.
+    """
+    index = {}
+    with open(osp.join(mmap_path, META_INFO_NAME), 'r') as fin:
+        for line in fin:
+            name, shape, offset = line.split()
+            shape = tuple(int(v) for v in shape.strip('()').split(','))
+            index[osp.splitext(name)[0]] = (int(offset), shape)
+    return index
+
+
+class MmapImageReader():
+    """Zero-copy reader of a memory-mapped raw uint8 container.
+
+    The file is mapped lazily, once per process (so a reader created before the
+    DataLoader workers fork is reopened in each worker).
+
+    Args:
+        mmap_path (str): Container path.
+    """
+
+    def __init__(self, mmap_path):
+        self.mmap_path = mmap_path
+        self.index = read_mmap_meta_info(mmap_path)
+        self._data = None
+        self._pid = None
+
+    def keys(self):
+        return list(self.index)
+
+    def get(self, key):
+        """Image of a key as a read-only HWC BGR uint8 view into the mapping (no copy)."""
+        if self._data is None or self._pid != os.getpid():
+            self._data = np.memmap(osp.join(self.mmap_path, DATA_NAME), dtype=np.uint8, mode='r')
+            self._pid = os.getpid()
+        offset, shape = self.index[key]
+        return self._data[offset:offset + shape[0] * shape[1] * shape[2]].reshape(shape)
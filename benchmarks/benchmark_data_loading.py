@@ -0,0 +1,144 @@
+"""
+Training-sample throughput of the dataset storage backends, per data worker
+
+Times dataset[i] (read, decode, paired random crop, augmentation, to tensor) in
+one process, i.e. the samples/s of one DataLoader worker, for:
+    disk  PairedImageDataset with io_backend disk (PNG files)
+    lmdb  PairedImageDataset with io_backend lmdb (PNG bytes in LMDB)
+    mmap  PairedMmapDataset (raw uint8 containers, crop at read)
+
+Either point it at existing data (--gt / --lq folders, and optionally --gt-lmdb /
+--lq-lmdb and --gt-mmap / --lq-mmap), or let it build a synthetic DF2K-like set
+(--synthetic N images of --size pixels) with all three formats in a temporary
+directory. The page cache is not dropped between backends: run with a cold cache
+(echo 3 > /proc/sys/vm/drop_caches) to measure the disk-bound case.
+
+Usage:
+    python benchmarks/benchmark_data_loading.py --synthetic 16 --size 1024 --scale 4 --samples 400
+    python benchmarks/benchmark_data_loading.py --gt datasets/DF2K/DF2K_train_HR \
+        --lq datasets/DF2K/DF2K_train_LR_bicubic/X4 --filename-tmpl '{}x4' \
+        --gt-mmap datasets/DF2K/DF2K_train_HR.mmap --lq-mmap datasets/DF2K/DF2K_train_LR_bicubic/X4.mmap
+"""
+import argparse
+import contextlib
+import io
+import os
+import os.path as osp
+import random
+import tempfile
+import time
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import environment, save_results, set_seed
+
+import cv2
+import numpy as np
+
+from basicsr.data.paired_image_dataset import PairedImageDataset
+from basicsr.data.paired_mmap_dataset import PairedMmapDataset
+from basicsr.utils.create_lmdb import prepare_keys
+from basicsr.utils.lmdb_util import make_lmdb_from_imgs
+from basicsr.utils.mmap_util import make_mmap_from_imgs
+
+
+def make_synthetic(root, count, size, scale, seed):
+    """DF2K-like HR / LR-bicubic folders of smooth random images (realistic PNG compression)"""
+    rng = np.random.default_rng(seed)
+    gt_folder, lq_folder = osp.join(root, 'HR'), osp.join(root, f'X{scale}')
+    os.makedirs(gt_folder)
+    os.makedirs(lq_folder)
+    for i in range(count):
+        coarse = rng.integers(0, 256, (size // 16, size // 16, 3), dtype=np.uint8)
+        img = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC)
+        img = np.clip(img.astype(np.int16) + rng.integers(-8, 9, img.shape), 0, 255).astype(np.uint8)
+        cv2.imwrite(osp.join(gt_folder, f'{i:04d}.png'), img)
+        lq = cv2.resize(img, (size // scale, size // scale), interpolation=cv2.INTER_CUBIC)
+        cv2.imwrite(osp.join(lq_folder, f'{i:04d}x{scale}.png'), lq)
+    return gt_folder, lq_folder
+
+
+def build_formats(gt_folder, lq_folder, root, scale):
+    """LMDB (same keys for GT and LQ, as paired_paths_from_lmdb expects) and mmap containers"""
+    paths = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, folder in (('gt', gt_folder), ('lq', lq_folder)):
+            img_path_list, keys = prepare_keys(folder, 'png')
+            lmdb_keys = [key.replace(f'x{scale}', '') for key in keys]
+            paths[f'{name}_lmdb'] = osp.join(root, f'{name}.lmdb')
+            make_lmdb_from_imgs(folder, paths[f'{name}_lmdb'], img_path_list, lmdb_keys, n_thread=4)
+            paths[f'{name}_mmap'] = osp.join(root, f'{name}.mmap')
+            make_mmap_from_imgs(folder, paths[f'{name}_mmap'], img_path_list, keys, n_thread=4)
+    return paths
+
+
+def time_dataset(dataset, samples, seed):
+    random.seed(seed)
+    indices = [random.randrange(len(dataset)) for _ in range(samples)]
+    dataset[indices[0]]  # open files / environments
+    start = time.perf_counter()
+    for index in indices:
+        dataset[index]
+    return samples / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gt', type=str, default=None, help='GT (HR) image folder.')
+    parser.add_argument('--lq', type=str, default=None, help='LQ (LR) image folder.')
+    parser.add_argument('--filename-tmpl', type=str, default='{}', help='LQ file name template, e.g. {}x4.')
+    parser.add_argument('--gt-lmdb', type=str, default=None, help='GT LMDB.')
+    parser.add_argument('--lq-lmdb', type=str, default=None, help='LQ LMDB (same keys as the GT LMDB).')
+    parser.add_argument('--gt-mmap', type=str, default=None, help='GT mmap container.')
+    parser.add_argument('--lq-mmap', type=str, default=None, help='LQ mmap container.')
+    parser.add_argument('--synthetic', type=int, default=None, help='Build a synthetic set of this many images.')
+    parser.add_argument('--size', type=int, default=1024, help='Synthetic HR size.')
+    parser.add_argument('--scale', type=int, default=4, help='Scale factor.')
+    parser.add_argument('--gt-size', type=int, default=128, help='GT crop size.')
+    parser.add_argument('--samples', type=int, default=200, help='Timed samples per backend.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    if args.synthetic is None and (args.gt is None or args.lq is None):
+        parser.error('give --gt and --lq, or --synthetic N')
+    set_seed(args.seed)
+    common_opt = {'phase': 'train', 'scale': args.scale, 'gt_size': args.gt_size, 'use_hflip': True,
+                  'use_rot': True}
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = {'gt': args.gt, 'lq': args.lq, 'gt_lmdb': args.gt_lmdb, 'lq_lmdb': args.lq_lmdb,
+                 'gt_mmap': args.gt_mmap, 'lq_mmap': args.lq_mmap}
+        filename_tmpl = args.filename_tmpl
+        if args.synthetic is not None:
+            print(f"Building {args.synthetic} synthetic {args.size}x{args.size} images (folders, lmdb, mmap)...")
+            paths['gt'], paths['lq'] = make_synthetic(root, args.synthetic, args.size, args.scale, args.seed)
+            paths.update(build_formats(paths['gt'], paths['lq'], root, args.scale))
+            filename_tmpl = f'{{}}x{args.scale}'
+
+        datasets = {'disk': PairedImageDataset(dict(common_opt, dataroot_gt=paths['gt'], dataroot_lq=paths['lq'],
+                                                    filename_tmpl=filename_tmpl, io_backend={'type': 'disk'}))}
+        if paths['gt_lmdb'] and paths['lq_lmdb']:
+            datasets['lmdb'] = PairedImageDataset(dict(common_opt, dataroot_gt=paths['gt_lmdb'],
+                                                       dataroot_lq=paths['lq_lmdb'], io_backend={'type': 'lmdb'}))
+        if paths['gt_mmap'] and paths['lq_mmap']:
+            datasets['mmap'] = PairedMmapDataset(dict(common_opt, dataroot_gt=paths['gt_mmap'],
+                                                      dataroot_lq=paths['lq_mmap'], filename_tmpl=filename_tmpl))
+
+        results = {}
+        for name, dataset in datasets.items():
+            samples_per_s = time_dataset(dataset, args.samples, args.seed)
+            results[name] = {'samples_per_s': round(samples_per_s, 2)}
+            print(f"{name:<8} {samples_per_s:>10.1f} samples/s per worker")
+
+    base = results['disk']['samples_per_s']
+    for name, result in results.items():
+        result['speedup'] = round(result['samples_per_s'] / base, 3)
+        print(f"{name:<8} {result['speedup']:>8.2f}x disk")
+
+    if args.output:
+        save_results({'meta': dict(environment('cpu'), scale=args.scale, gt_size=args.gt_size,
+                                   synthetic=args.synthetic, size=args.size), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Throughput of the batched degradation stage (basicsr/data/batch_degradation.py)
+
+Synthesizes LQ images from random GT crops with the same degradation (blur with a
+random kernel, random resize, Gaussian or Poisson noise, JPEG, resize to the LQ
+size) in two ways and reports samples/s:
+    per-sample  NumPy / OpenCV on one HWC image at a time, as a data worker would
+                (cv2.filter2D, cv2.resize, random_add_*_noise, cv2 JPEG)
+    batched     BatchDegradation on whole (b, c, h, w) batches (filter2D,
+                F.interpolate, *_noise_pt, DiffJPEG)
+Kernel sampling is included in both, and also reported on its own.
+
+Usage:
+    python benchmarks/benchmark_degradation.py --batch 16 --size 256 --scale 4 --batches 10
+    python benchmarks/benchmark_degradation.py --device cuda --threads 8 --output degradation.json
+"""
+import argparse
+import random
+import time
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import environment, save_results, set_seed, synchronize
+
+import cv2
+import numpy as np
+import torch
+
+from basicsr.data.batch_degradation import BatchDegradation
+from basicsr.data.degradations import random_add_gaussian_noise, random_add_jpg_compression, random_add_poisson_noise
+
+INTERPOLATIONS = [cv2.INTER_AREA, cv2.INTER_LINEAR, cv2.INTER_CUBIC]
+
+
+def degrade_numpy(img, stage):
+    """Per-sample reference of BatchDegradation on a HWC float32 image."""
+    h, w = img.shape[0:2]
+    out = cv2.filter2D(img, -1, stage.sample_kernel())
+    updown_type = random.choices(['up', 'down', 'keep'], stage.resize_prob)[0]
+    if updown_type == 'up':
+        resize_scale = np.random.uniform(1, stage.resize_range[1])
+    elif updown_type == 'down':
+        resize_scale = np.random.uniform(stage.resize_range[0], 1)
+    else:
+        resize_scale = 1
+    out = cv2.resize(out, (int(w * resize_scale), int(h * resize_scale)), interpolation=random.choice(INTERPOLATIONS))
+    if np.random.uniform() < stage.gaussian_noise_prob:
+        out = random_add_gaussian_noise(out, stage.noise_range, stage.gray_noise_prob)
+    else:
+        out = random_add_poisson_noise(out, stage.poisson_scale_range, stage.gray_noise_prob)
+    out = random_add_jpg_compression(np.float32(out), stage.jpeg_range)
+    out = cv2.resize(out, (w // stage.scale, h // stage.scale), interpolation=random.choice(INTERPOLATIONS))
+    return np.clip((out * 255.0).round(), 0, 255) / 255.
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--batch', type=int, default=16, help='Batch size.')
+    parser.add_argument('--size', type=int, default=256, help='GT crop size.')
+    parser.add_argument('--scale', type=int, default=4, help='Scale factor.')
+    parser.add_argument('--batches', type=int, default=10, help='Timed batches.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device of the batched stage.')
+    parser.add_argument('--threads', type=int, default=None, help='torch / OpenCV threads.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+        cv2.setNumThreads(args.threads)
+    set_seed(args.seed)
+    device = torch.device(args.device)
+    stage = BatchDegradation({}, args.scale, device)
+    gt = torch.rand(args.batch, 3, args.size, args.size)
+    gt_numpy = [img.permute(1, 2, 0).numpy().copy() for img in gt]
+    gt = gt.to(device)
+    samples = args.batch * args.batches
+
+    # warm-up
+    stage(gt)
+    degrade_numpy(gt_numpy[0], stage)
+    synchronize(device)
+
+    start = time.perf_counter()
+    for _ in range(args.batches * args.batch):
+        stage.sample_kernel()
+    kernel = samples / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(args.batches):
+        for img in gt_numpy:
+            degrade_numpy(img, stage)
+    per_sample = samples / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(args.batches):
+        stage(gt)
+    synchronize(device)
+    batched = samples / (time.perf_counter() - start)
+
+    results = {
+        'kernel_sampling': {'samples_per_s': round(kernel, 2)},
+        'per_sample_numpy': {'samples_per_s': round(per_sample, 2)},
+        'batched': {'samples_per_s': round(batched, 2), 'speedup': round(batched / per_sample, 3)},
+    }
+    print(f"kernel sampling   {kernel:>10.1f} kernels/s")
+    print(f"per-sample numpy  {per_sample:>10.1f} samples/s")
+    print(f"batched ({args.device}) {batched:>10.1f} samples/s  {batched / per_sample:.2f}x")
+
+    if args.output:
+        save_results({'meta': dict(environment(device), batch=args.batch, size=args.size, scale=args.scale),
+                      'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Vectorized MATLAB imresize (basicsr/utils/matlab_functions.py) against the loop implementation
+
+For each input size and scale, compares the vectorized imresize with the previous
+implementation (a Python loop over every output row / column and channel, kept
+below as the reference): exact equality, max absolute difference, pixels that
+differ after rounding to uint8 and the largest such difference. The loop sums each
+window with a BLAS matrix-vector product of unspecified order, so bit equality is
+not guaranteed; the contract is a max absolute difference within --atol and at
+most one uint8 level after rounding. With --check, the script exits with status 1
+when it is broken. Then times both on one image, and the vectorized one on a
+batch of GT crops (--batch), as on-the-fly LQ generation does.
+
+Usage:
+    python benchmarks/benchmark_imresize.py --sizes 128 480 --scales 2 3 4 --batch 16
+    python benchmarks/benchmark_imresize.py --sizes 17 128 480 --scales 2 3 4 --check
+    python benchmarks/benchmark_imresize.py --sizes 256 --scales 4 --device cuda --output imresize.json
+"""
+import argparse
+import math
+import sys
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import environment, save_results, set_seed, time_fn
+
+import torch
+
+from basicsr.utils.matlab_functions import calculate_weights_indices, imresize
+
+
+@torch.no_grad()
+def imresize_loop(img, scale, antialiasing=True):
+    """The previous imresize, for (c, h, w) tensors."""
+    in_c, in_h, in_w = img.size()
+    out_h, out_w = math.ceil(in_h * scale), math.ceil(in_w * scale)
+    kernel_width = 4
+    kernel = 'cubic'
+
+    weights_h, indices_h, sym_len_hs, sym_len_he = calculate_weights_indices(in_h, out_h, scale, kernel, kernel_width,
+                                                                             antialiasing)
+    weights_w, indices_w, sym_len_ws, sym_len_we = calculate_weights_indices(in_w, out_w, scale, kernel, kernel_width,
+                                                                             antialiasing)
+    img_aug = torch.FloatTensor(in_c, in_h + sym_len_hs + sym_len_he, in_w)
+    img_aug.narrow(1, sym_len_hs, in_h).copy_(img)
+    sym_patch = img[:, :sym_len_hs, :]
+    inv_idx = torch.arange(sym_patch.size(1) - 1, -1, -1).long()
+    img_aug.narrow(1, 0, sym_len_hs).copy_(sym_patch.index_select(1, inv_idx))
+    sym_patch = img[:, -sym_len_he:, :]
+    inv_idx = torch.arange(sym_patch.size(1) - 1, -1, -1).long()
+    img_aug.narrow(1, sym_len_hs + in_h, sym_len_he).copy_(sym_patch.index_select(1, inv_idx))
+
+    out_1 = torch.FloatTensor(in_c, out_h, in_w)
+    kernel_width = weights_h.size(1)
+    for i in range(out_h):
+        idx = int(indices_h[i][0])
+        for j in range(in_c):
+            out_1[j, i, :] = img_aug[j, idx:idx + kernel_width, :].transpose(0, 1).mv(weights_h[i])
+
+    out_1_aug = torch.FloatTensor(in_c, out_h, in_w + sym_len_ws + sym_len_we)
+    out_1_aug.narrow(2, sym_len_ws, in_w).copy_(out_1)
+    sym_patch = out_1[:, :, :sym_len_ws]
+    inv_idx = torch.arange(sym_patch.size(2) - 1, -1, -1).long()
+    out_1_aug.narrow(2, 0, sym_len_ws).copy_(sym_patch.index_select(2, inv_idx))
+    sym_patch = out_1[:, :, -sym_len_we:]
+    inv_idx = torch.arange(sym_patch.size(2) - 1, -1, -1).long()
+    out_1_aug.narrow(2, sym_len_ws + in_w, sym_len_we).copy_(sym_patch.index_select(2, inv_idx))
+
+    out_2 = torch.FloatTensor(in_c, out_h, out_w)
+    kernel_width = weights_w.size(1)
+    for i in range(out_w):
+        idx = int(indices_w[i][0])
+        for j in range(in_c):
+            out_2[j, :, i] = out_1_aug[j, :, idx:idx + kernel_width].mv(weights_w[i])
+    return out_2
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', type=int, default=[128, 480], help='Square input sizes.')
+    parser.add_argument('--scales', nargs='+', type=float, default=[2, 3, 4],
+                        help='Downscaling factors (the resize scale is 1 / factor).')
+    parser.add_argument('--batch', type=int, default=16, help='Batch size of the batched timing.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device of the batched timing.')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs.')
+    parser.add_argument('--atol', type=float, default=1e-5, help='Tolerated max absolute difference (float32).')
+    parser.add_argument('--check', action='store_true',
+                        help='Exit with status 1 if an output breaks the contract (only compare, no timing).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    set_seed(args.seed)
+    results = {}
+    failures = []
+    header = f"{'size':>6} {'scale':>6} {'exact':>6} {'max diff':>10} {'uint8 diff':>10}"
+    print(header if args.check else f"{header} {'loop ms':>9} {'vec ms':>8} {'speedup':>8} {'batch ms/img':>13}")
+    for size in args.sizes:
+        img = torch.rand(3, size, size)
+        # uint8 levels, as decoded images
+        img = (img * 255.).round() / 255.
+        for factor in args.scales:
+            scale = 1 / factor
+            reference = imresize_loop(img, scale)
+            output = imresize(img, scale)
+            to_uint8 = lambda x: (x * 255.).round().clamp(0, 255)  # noqa: E731
+            uint8_diff = (to_uint8(reference) - to_uint8(output)).abs()
+            result = {
+                'exact': bool(torch.equal(reference, output)),
+                'max_abs_diff': float((reference - output).abs().max()),
+                'uint8_diff_pixels': int((uint8_diff > 0).sum()),
+                'uint8_max_diff': int(uint8_diff.max()),
+                # elementwise ops: an image resized within a batch is bit-exact with it resized alone
+                'batch_exact': bool(torch.equal(imresize(torch.stack([img, img.flip(-1)]), scale)[0], output)),
+            }
+            if result['max_abs_diff'] > args.atol or result['uint8_max_diff'] > 1 or not result['batch_exact']:
+                failures.append(f'{size}_x{factor:g}')
+            if args.check:
+                results[f'{size}_x{factor:g}'] = result
+                print(f"{size:>6} {factor:>6g} {str(result['exact']):>6} {result['max_abs_diff']:>10.2e} "
+                      f"{result['uint8_diff_pixels']:>10}")
+                continue
+
+            loop = time_fn(lambda: imresize_loop(img, scale), 'cpu', warmup=1, repeats=args.repeats)
+            vec = time_fn(lambda: imresize(img, scale), 'cpu', warmup=1, repeats=args.repeats)
+            batch = img.unsqueeze(0).repeat(args.batch, 1, 1, 1).to(args.device)
+            batched = time_fn(lambda: imresize(batch, scale), args.device, warmup=1, repeats=args.repeats)
+            result.update({
+                'loop_ms': loop['ms_median'],
+                'vectorized_ms': vec['ms_median'],
+                'batch_ms_per_image': round(batched['ms_median'] / args.batch, 4),
+            })
+            result['speedup'] = round(result['loop_ms'] / result['vectorized_ms'], 2)
+            results[f'{size}_x{factor:g}'] = result
+            print(f"{size:>6} {factor:>6g} {str(result['exact']):>6} {result['max_abs_diff']:>10.2e} "
+                  f"{result['uint8_diff_pixels']:>10} {result['loop_ms']:>9.2f} {result['vectorized_ms']:>8.2f} "
+                  f"{result['speedup']:>7.1f}x {result['batch_ms_per_image']:>13.3f}")
+
+    if args.output:
+        save_results({'meta': dict(environment(args.device), batch=args.batch, atol=args.atol), 'results': results},
+                     args.output)
+    if failures:
+        print(f"Out of tolerance (max abs diff > {args.atol:g}, more than one uint8 level, or batched output "
+              f"different): {', '.join(failures)}")
+        if args.check:
+            sys.exit(1)
+    elif args.check:
+        print("All outputs within tolerance.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+End-to-end inference throughput benchmark
+
+Runs the classical and lightweight models over a matrix of scales, input sizes,
+tile sizes, batch sizes and thread counts, and reports images/s, megapixels/s,
+p50 / p95 latency, peak RSS and the throughput in PFT.flops() units (GMAC/s),
+with its efficiency relative to --peak-gmacs (or to the best configuration of the
+run). Models are loaded from their test option files; the pretrained weights are
+used when present and random weights otherwise (timings do not depend on them).
+
+Tiled configurations run through PatchProcessor, one image at a time, so they are
+only measured with batch size 1.
+
+Usage:
+    python benchmarks/benchmark_inference.py --tasks lightweight --scales 4 --sizes 128 256 512
+    python benchmarks/benchmark_inference.py --sizes 512 1024 2048 --tiles none 256 512 --threads 4 8 \
+        --output benchmarks/results/inference_cpu.json
+"""
+import argparse
+import itertools
+import os.path as osp
+import resource
+import sys
+import time
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import MemorySampler, compare_to_baseline, environment, save_results, set_seed, synchronize
+
+import numpy as np
+import torch
+
+from utils.model import checkpoint_path, load_model
+from utils.patch_processor import PatchProcessor
+
+WINDOW_SIZE = 32
+
+
+def _pad(size):
+    return -(-size // WINDOW_SIZE) * WINDOW_SIZE
+
+
+def model_macs(model, size, tile):
+    """PFT.flops() of one size x size image, summed over its tiles (inputs are padded to the window size)"""
+    if tile is None:
+        return model.flops((_pad(size), _pad(size)))
+    _, _, _, slices, _ = PatchProcessor(tile, tile).plan(size, size, model.upscale)
+    return sum(model.flops((_pad(top.stop - top.start), _pad(left.stop - left.start))) for top, left in slices)
+
+
+def run_config(model, device, size, tile, batch, warmup, repeats):
+    image = torch.rand(batch, 3, size, size, device='cpu')
+
+    if tile is None:
+        image = image.to(device)
+
+        def fn():
+            return model(image)
+    else:
+        processor = PatchProcessor(tile, tile, pipeline=True)
+
+        def fn():
+            return processor.process(image, model, device, model.upscale)
+
+    with torch.no_grad():
+        for _ in range(warmup):
+            fn()
+        synchronize(device)
+
+        latencies = []
+        sampler = MemorySampler(device)
+        with sampler:
+            for _ in range(repeats):
+                start = time.perf_counter()
+                fn()
+                synchronize(device)
+                latencies.append(time.perf_counter() - start)
+
+    latency = float(np.mean(latencies))
+    macs = model_macs(model, size, tile) * batch
+    if str(device).startswith('cuda'):
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    else:
+        peak_rss = sampler.base + sampler.peak
+    return {
+        'images_per_s': round(batch / latency, 4),
+        'mpix_per_s': round(batch * size * size / 1e6 / latency, 4),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)) * 1000, 2),
+        'peak_rss_mb': round(peak_rss / 1024 ** 2, 1),
+        'peak_mem_growth_mb': round(max(sampler.peak, 0) / 1024 ** 2, 1),
+        'gmacs': round(macs / 1e9, 3),
+        'gmacs_per_s': round(macs / 1e9 / latency, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', nargs='+', default=['classical', 'lightweight'],
+                        choices=['classical', 'lightweight'], help='Models.')
+    parser.add_argument('--scales', nargs='+', type=int, default=[2, 3, 4], help='Scale factors.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[128, 256, 512, 1024, 2048],
+                        help='Square input sizes.')
+    parser.add_argument('--tiles', nargs='+', type=str, default=['none'],
+                        help='Tile sizes (none: whole image).')
+    parser.add_argument('--batches', nargs='+', type=int, default=[1], help='Batch sizes (whole-image runs).')
+    parser.add_argument('--threads', nargs='+', type=int, default=[torch.get_num_threads()],
+                        help='torch.set_num_threads values.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device.')
+    parser.add_argument('--random-weights', action='store_true', help='Never load checkpoints.')
+    parser.add_argument('--max-mpix', type=float, default=16,
+                        help='Skip configurations with more input megapixels per batch.')
+    parser.add_argument('--peak-gmacs', type=float, default=None,
+                        help='Peak GMAC/s of the device, for the efficiency column (default: best of the run).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed (weights and inputs).')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per configuration.')
+    parser.add_argument('--repeats', type=int, default=3, help='Timed runs per configuration.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results to compare against (p50).')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown flagged as a regression.')
+    args = parser.parse_args()
+
+    tiles = [None if tile == 'none' else int(tile) for tile in args.tiles]
+    results = {}
+
+    for task, scale in itertools.product(args.tasks, args.scales):
+        pretrained = not args.random_weights and osp.exists(checkpoint_path(task, scale))
+        set_seed(args.seed)
+        model = load_model(task, scale, args.device, pretrained=pretrained)
+        print(f"{task} x{scale}: {'pretrained' if pretrained else 'random'} weights, "
+              f"{sum(p.numel() for p in model.parameters()) / 1e6:.3f}M parameters")
+
+        for threads, size, tile, batch in itertools.product(args.threads, args.sizes, tiles, args.batches):
+            if tile is not None and batch > 1:
+                continue  # PatchProcessor runs one image at a time
+            if tile is not None and tile >= size:
+                continue  # same as the whole image
+            if batch * size * size / 1e6 > args.max_mpix:
+                print(f"  skip {size}x{size} batch {batch} (over --max-mpix)")
+                continue
+
+            torch.set_num_threads(threads)
+            set_seed(args.seed)
+            name = f"{task}_x{scale}_{size}_tile{tile or 'none'}_b{batch}_t{threads}"
+            try:
+                result = run_config(model, args.device, size, tile, batch, args.warmup, args.repeats)
+            except RuntimeError as e:  # e.g. out of memory
+                print(f"  {name}: failed ({str(e).splitlines()[0]})")
+                continue
+            result.update({'task': task, 'scale': scale, 'size': size, 'tile': tile, 'batch': batch,
+                           'threads': threads, 'pretrained': pretrained})
+            results[name] = result
+            print(f"  {name:<44} {result['images_per_s']:>8.3f} img/s {result['mpix_per_s']:>8.3f} MP/s "
+                  f"p50 {result['p50_ms']:>9.1f} ms p95 {result['p95_ms']:>9.1f} ms "
+                  f"RSS {result['peak_rss_mb']:>8.1f} MB {result['gmacs_per_s']:>8.2f} GMAC/s")
+
+        del model
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    if not results:
+        print("No configuration was run")
+        return
+
+    peak = args.peak_gmacs or max(result['gmacs_per_s'] for result in results.values())
+    print(f"\nEfficiency relative to {peak:.2f} GMAC/s ({'given peak' if args.peak_gmacs else 'best of the run'}):")
+    for name, result in results.items():
+        result['efficiency'] = round(result['gmacs_per_s'] / peak, 4)
+        print(f"  {name:<44} {100 * result['efficiency']:6.1f}%")
+
+    if args.output:
+        save_results({'meta': dict(environment(args.device), seed=args.seed, repeats=args.repeats,
+                                   peak_gmacs=peak),
+                      'results': results}, args.output)
+
+    if args.baseline and compare_to_baseline(results, args.baseline, args.threshold, key='p50_ms'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Precomputed blur kernel bank (basicsr/data/kernel_bank.py) against on-the-fly kernels
+
+Builds a bank in a temporary directory (or uses --bank), then reports:
+    build    time to precompute the bank
+    load     time to open it, and to touch every kernel once (page cache)
+    sample   per-kernel cost of BatchDegradation.sample_kernel on the fly and
+             from the bank, and per-batch cost of sample_kernels
+    match    distribution check: the spread (second moment radius) of kernels
+             drawn both ways, with the two-sample Kolmogorov-Smirnov statistic
+
+Usage:
+    python benchmarks/benchmark_kernel_bank.py --kernels-per-block 512 --samples 5000
+    python benchmarks/benchmark_kernel_bank.py --bank datasets/kernels.kbank --batch 32
+"""
+import argparse
+import os.path as osp
+import tempfile
+import time
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import environment, save_results, set_seed
+
+import numpy as np
+from scipy import stats
+
+from basicsr.data.batch_degradation import BatchDegradation
+from basicsr.data.kernel_bank import KernelBank, make_kernel_bank
+
+
+def spread(kernels):
+    """sqrt(sum k * r^2) of each (k, k) kernel, r the distance to the center."""
+    size = kernels.shape[-1]
+    ax = np.arange(size) - (size - 1) / 2
+    r2 = ax[None, :] ** 2 + ax[:, None] ** 2
+    return np.sqrt(np.abs((kernels * r2).sum(axis=(-2, -1))))
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bank', type=str, default=None, help='Existing bank (default: build one).')
+    parser.add_argument('--kernels-per-block', type=int, default=512, help='Kernels per block of the built bank.')
+    parser.add_argument('--n-thread', type=int, default=8, help='Processes building the bank.')
+    parser.add_argument('--samples', type=int, default=5000, help='Kernels drawn each way.')
+    parser.add_argument('--batch', type=int, default=16, help='Batch size of sample_kernels.')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    set_seed(args.seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        bank_path = args.bank
+        if bank_path is None:
+            bank_path = osp.join(root, 'kernels.kbank')
+            start = time.perf_counter()
+            make_kernel_bank(bank_path, None, args.kernels_per_block, args.n_thread, args.seed)
+            results['build_s'] = round(time.perf_counter() - start, 3)
+
+        start = time.perf_counter()
+        bank = KernelBank(bank_path)
+        results['open_ms'] = round((time.perf_counter() - start) * 1e3, 3)
+        start = time.perf_counter()
+        float(np.sum(bank.kernels))
+        results['touch_all_ms'] = round((time.perf_counter() - start) * 1e3, 3)
+        results['bank_mb'] = round(bank.kernels.nbytes / 1024 ** 2, 2)
+
+        on_the_fly = BatchDegradation({}, scale=4)
+        from_bank = BatchDegradation({'kernel_bank': bank_path}, scale=4)
+        results['sample_us'] = {
+            'on_the_fly': round(per_call_us(on_the_fly.sample_kernel, args.samples), 2),
+            'bank': round(per_call_us(from_bank.sample_kernel, args.samples), 2),
+        }
+        batches = max(args.samples // args.batch, 1)
+        results['sample_kernels_batch_us'] = {
+            'on_the_fly': round(per_call_us(lambda: on_the_fly.sample_kernels(args.batch), batches), 2),
+            'bank': round(per_call_us(lambda: from_bank.sample_kernels(args.batch), batches), 2),
+        }
+
+        reference = spread(np.stack([on_the_fly.sample_kernel() for _ in range(args.samples)]))
+        banked = spread(np.stack([from_bank.sample_kernel() for _ in range(args.samples)]))
+        ks = stats.ks_2samp(reference, banked)
+        results['match'] = {'spread_mean_on_the_fly': round(float(reference.mean()), 4),
+                            'spread_mean_bank': round(float(banked.mean()), 4),
+                            'ks_statistic': round(float(ks.statistic), 4), 'ks_pvalue': round(float(ks.pvalue), 4)}
+
+    sample, batch = results['sample_us'], results['sample_kernels_batch_us']
+    if 'build_s' in results:
+        print(f"build            {results['build_s']:>10.2f} s")
+    print(f"open / touch     {results['open_ms']:>10.2f} / {results['touch_all_ms']:.2f} ms ({results['bank_mb']} MB)")
+    print(f"sample_kernel    {sample['on_the_fly']:>10.1f} us on the fly, {sample['bank']:.1f} us from the bank "
+          f"({sample['on_the_fly'] / sample['bank']:.1f}x)")
+    print(f"sample_kernels   {batch['on_the_fly']:>10.1f} us on the fly, {batch['bank']:.1f} us from the bank "
+          f"(batch {args.batch})")
+    print(f"spread mean      {results['match']['spread_mean_on_the_fly']:>10.4f} on the fly, "
+          f"{results['match']['spread_mean_bank']:.4f} from the bank, KS {results['match']['ks_statistic']:.4f} "
+          f"(p={results['match']['ks_pvalue']:.3f})")
+
+    if args.output:
+        save_results({'meta': dict(environment('cpu'), samples=args.samples, batch=args.batch,
+                                   kernels_per_block=args.kernels_per_block), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+"""
+Random-read throughput of LmdbBackend (basicsr/utils/file_client.py)
+
+Reads random lq + gt pairs, as PairedImageDataset does, from two LMDB and
+reports reads/s and decoded pairs/s for:
+    per-get txn  the previous backend: one read transaction per key, bytes copies
+    persistent   one long-lived read transaction per environment, bytes copies
+    zero-copy    persistent transaction, memoryviews passed straight to cv2.imdecode
+
+Point it at existing LMDB with --gt-lmdb / --lq-lmdb (same keys, e.g. from
+basicsr/utils/create_lmdb.py), or let it build synthetic ones (--synthetic N
+sub-image sized PNGs) in a temporary directory. The page cache is warm after the
+first mode; drop it between runs to measure the disk-bound case.
+
+Usage:
+    python benchmarks/benchmark_lmdb.py --synthetic 2000 --size 480 --scale 4 --reads 20000
+    python benchmarks/benchmark_lmdb.py --gt-lmdb datasets/DF2K/DF2K_train_HR.lmdb \
+        --lq-lmdb datasets/DF2K/DF2K_train_LR_bicubic/X4.lmdb --decode
+"""
+import argparse
+import contextlib
+import io
+import os.path as osp
+import random
+import tempfile
+import time
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import environment, save_results
+
+import cv2
+import lmdb
+import numpy as np
+
+from basicsr.utils.file_client import FileClient
+from basicsr.utils.lmdb_util import LmdbMaker
+
+
+def make_synthetic(root, count, size, scale, seed):
+    rng = np.random.default_rng(seed)
+    paths = {'gt': osp.join(root, 'gt.lmdb'), 'lq': osp.join(root, 'lq.lmdb')}
+    with contextlib.redirect_stdout(io.StringIO()):
+        makers = {name: LmdbMaker(path) for name, path in paths.items()}
+    for i in range(count):
+        coarse = rng.integers(0, 256, (size // 16, size // 16, 3), dtype=np.uint8)
+        img = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC)
+        for name, sub in (('gt', img), ('lq', cv2.resize(img, (size // scale, size // scale)))):
+            _, img_byte = cv2.imencode('.png', sub, [cv2.IMWRITE_PNG_COMPRESSION, 1])
+            makers[name].put(img_byte, f'{i:06d}', sub.shape)
+    for maker in makers.values():
+        maker.close()
+    return paths
+
+
+class PerGetTxnReader():
+    """The previous LmdbBackend.get: a new read transaction for every key."""
+
+    def __init__(self, paths):
+        self.envs = {name: lmdb.open(path, readonly=True, lock=False, readahead=False, map_size=8 * 1024 * 10485760)
+                     for name, path in paths.items()}
+
+    def get_many(self, filepaths, client_keys):
+        values = []
+        for filepath, client_key in zip(filepaths, client_keys):
+            with self.envs[client_key].begin(write=False) as txn:
+                values.append(txn.get(filepath.encode('ascii')))
+        return values
+
+
+def run(reader, keys, decode):
+    start = time.perf_counter()
+    for key in keys:
+        gt_bytes, lq_bytes = reader.get_many([key, key], ['gt', 'lq'])
+        if decode:
+            cv2.imdecode(np.frombuffer(gt_bytes, np.uint8), cv2.IMREAD_COLOR)
+            cv2.imdecode(np.frombuffer(lq_bytes, np.uint8), cv2.IMREAD_COLOR)
+    return len(keys) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--gt-lmdb', type=str, default=None, help='GT LMDB.')
+    parser.add_argument('--lq-lmdb', type=str, default=None, help='LQ LMDB (same keys as the GT LMDB).')
+    parser.add_argument('--synthetic', type=int, default=None, help='Build synthetic LMDB of this many pairs.')
+    parser.add_argument('--size', type=int, default=480, help='Synthetic GT size.')
+    parser.add_argument('--scale', type=int, default=4, help='Synthetic scale factor.')
+    parser.add_argument('--reads', type=int, default=10000, help='Random pairs read per mode.')
+    parser.add_argument('--decode', action='store_true', help='Also decode the images (cv2.imdecode).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    if args.synthetic is None and (args.gt_lmdb is None or args.lq_lmdb is None):
+        parser.error('give --gt-lmdb and --lq-lmdb, or --synthetic N')
+
+    with tempfile.TemporaryDirectory() as root:
+        if args.synthetic is not None:
+            print(f'Building {args.synthetic} synthetic pairs...')
+            paths = make_synthetic(root, args.synthetic, args.size, args.scale, args.seed)
+        else:
+            paths = {'gt': args.gt_lmdb, 'lq': args.lq_lmdb}
+        with open(osp.join(paths['gt'], 'meta_info.txt')) as fin:
+            all_keys = [line.split('.')[0] for line in fin]
+        random.seed(args.seed)
+        keys = [random.choice(all_keys) for _ in range(args.reads)]
+
+        readers = {
+            'per-get txn': PerGetTxnReader(paths),
+            'persistent': FileClient('lmdb', db_paths=[paths['lq'], paths['gt']], client_keys=['lq', 'gt'],
+                                     zero_copy=False),
+            'zero-copy': FileClient('lmdb', db_paths=[paths['lq'], paths['gt']], client_keys=['lq', 'gt']),
+        }
+        results = {}
+        for name, reader in readers.items():
+            run(reader, keys[:min(len(keys), 1000)], args.decode)  # warm-up (page cache)
+            pairs_per_s = run(reader, keys, args.decode)
+            results[name] = {'pairs_per_s': round(pairs_per_s, 1), 'reads_per_s': round(2 * pairs_per_s, 1)}
+
+    base = results['per-get txn']['pairs_per_s']
+    print(f"\n{'mode':<12} {'pairs/s':>10} {'reads/s':>10} {'speedup':>8}")
+    for name, result in results.items():
+        result['speedup'] = round(result['pairs_per_s'] / base, 3)
+        print(f"{name:<12} {result['pairs_per_s']:>10.0f} {result['reads_per_s']:>10.0f} {result['speedup']:>7.2f}x")
+
+    if args.output:
+        save_results({'meta': dict(environment('cpu'), reads=args.reads, decode=args.decode,
+                                   synthetic=args.synthetic, size=args.size), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
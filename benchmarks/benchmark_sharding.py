@@ -0,0 +1,106 @@
+"""
+Scaling of multi-process CPU inference (utils/sharding.py) with the worker count
+
+Writes synthetic PNG inputs to a temporary directory, then super-resolves them with
+ShardedRunner for each worker count (the CPUs are split evenly among the workers
+unless --threads is given) and reports images/s, the speedup over the first
+worker count and the scaling efficiency (speedup / relative worker count). With
+--tiles, one large image is split into patches distributed over the workers instead.
+
+Usage:
+    python benchmarks/benchmark_sharding.py --task lightweight --scale 4 --workers 1 2 4 8 --affinity numa
+    python benchmarks/benchmark_sharding.py --workers 1 2 4 --tiles 256 --size 1024 --output sharding.json
+"""
+import argparse
+import os.path as osp
+import tempfile
+import time
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import environment, save_results
+
+import numpy as np
+from PIL import Image
+
+from utils.model import checkpoint_path
+from utils.sharding import ShardedRunner
+
+
+def write_inputs(directory, count, size, seed):
+    rng = np.random.default_rng(seed)
+    jobs = []
+    for i in range(count):
+        input_path = osp.join(directory, f'{i:04d}.png')
+        Image.fromarray(rng.integers(0, 256, (size, size, 3), dtype=np.uint8)).save(input_path)
+        jobs.append((f'{i:04d}.png', input_path, osp.join(directory, 'out', f'{i:04d}.png')))
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--task', type=str, default='lightweight', choices=['classical', 'lightweight'])
+    parser.add_argument('--scale', type=int, default=4, help='Scale factor.')
+    parser.add_argument('--workers', nargs='+', type=int, default=[1, 2, 4], help='Worker counts.')
+    parser.add_argument('--threads', type=int, default=None, help='Threads per worker (default: CPUs / workers).')
+    parser.add_argument('--affinity', type=str, default='none', choices=['none', 'cores', 'numa'])
+    parser.add_argument('--images', type=int, default=16, help='Number of input images (file mode).')
+    parser.add_argument('--size', type=int, default=128, help='Square input size.')
+    parser.add_argument('--tiles', type=int, default=None, help='Tile mode: patch size of one --size image.')
+    parser.add_argument('--repeats', type=int, default=2, help='Timed runs per worker count (best is kept).')
+    parser.add_argument('--random-weights', action='store_true', help='Never load checkpoints.')
+    parser.add_argument('--start-method', type=str, default=None, choices=['fork', 'forkserver'],
+                        help='Worker start method (default: fork, forkserver in tile mode, where the parent merges '
+                             'tiles with torch between runs).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the inputs.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    start_method = args.start_method or ('forkserver' if args.tiles else 'fork')
+    pretrained = not args.random_weights and osp.exists(checkpoint_path(args.task, args.scale))
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        jobs = write_inputs(directory, 1 if args.tiles else args.images, args.size, args.seed)
+        image = Image.open(jobs[0][1]).convert('RGB')
+
+        for workers in args.workers:
+            with ShardedRunner(args.task, args.scale, workers=workers, threads=args.threads, affinity=args.affinity,
+                               pretrained=pretrained, start_method=start_method) as runner:
+                # warm-up: every worker runs at least one job
+                if args.tiles:
+                    runner.upscale_image(image, (args.tiles, args.tiles))
+                else:
+                    runner.process_files(jobs[:workers])
+
+                best = None
+                for _ in range(args.repeats):
+                    start = time.perf_counter()
+                    if args.tiles:
+                        runner.upscale_image(image, (args.tiles, args.tiles))
+                        count = 1
+                    else:
+                        count = runner.process_files(jobs)['images']
+                    seconds = time.perf_counter() - start
+                    best = seconds if best is None else min(best, seconds)
+
+            results[str(workers)] = {'workers': workers, 'threads': runner.threads, 'seconds': round(best, 4),
+                                     'images_per_s': round(count / best, 4),
+                                     'mpix_per_s': round(count * args.size ** 2 / 1e6 / best, 4)}
+
+    first = results[str(args.workers[0])]
+    print(f"\n{'workers':>8} {'threads':>12} {'images/s':>10} {'MP/s':>8} {'speedup':>8} {'efficiency':>10}")
+    for result in results.values():
+        speedup = result['images_per_s'] / first['images_per_s']
+        result['speedup'] = round(speedup, 3)
+        result['efficiency'] = round(speedup / (result['workers'] / first['workers']), 3)
+        threads = '/'.join(str(t) for t in sorted(set(result['threads'])))
+        print(f"{result['workers']:>8} {threads:>12} {result['images_per_s']:>10.3f} {result['mpix_per_s']:>8.3f} "
+              f"{result['speedup']:>7.2f}x {100 * result['efficiency']:>9.1f}%")
+
+    if args.output:
+        save_results({'meta': dict(environment('cpu'), task=args.task, scale=args.scale, size=args.size,
+                                   tiles=args.tiles, affinity=args.affinity, pretrained=pretrained),
+                      'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Shared helpers of the benchmark scripts: seeding, timing, memory sampling and baseline comparison"""
+import json
+import os
+import os.path as osp
+import platform
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.abspath(__file__)))
+if ROOT_PATH not in sys.path:
+    sys.path.insert(0, ROOT_PATH)
+
+import numpy as np
+import torch
+
+
+def set_seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def synchronize(device):
+    if str(device).startswith('cuda'):
+        torch.cuda.synchronize()
+
+
+def _current_rss():
+    """Resident set size in bytes (Linux), or None"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class MemorySampler:
+    """
+    Peak memory growth of a code block (peak), from a baseline (base)
+
+    On CUDA, the peak of allocated memory. On CPU, the resident set size is sampled
+    from a background thread (Linux); elsewhere, the growth of the process peak RSS
+    is used, which only shows blocks that set a new peak.
+    """
+
+    def __init__(self, device='cpu', interval=0.0005):
+        self.device = str(device)
+        self.interval = interval
+        self.peak = None
+
+    def __enter__(self):
+        if self.device.startswith('cuda'):
+            torch.cuda.synchronize()
+            torch.cuda.reset_peak_memory_stats()
+            self.base = torch.cuda.memory_allocated()
+            return self
+
+        self.base = _current_rss()
+        self._max = self.base
+        self._stop = threading.Event()
+        if self.base is None:
+            self.base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            return self
+
+        def sample():
+            while not self._stop.is_set():
+                self._max = max(self._max, _current_rss())
+                time.sleep(self.interval)
+
+        self._thread = threading.Thread(target=sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.device.startswith('cuda'):
+            torch.cuda.synchronize()
+            self.peak = torch.cuda.max_memory_allocated() - self.base
+        elif getattr(self, '_thread', None) is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self._max, _current_rss()) - self.base
+        else:
+            self.peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 - self.base
+        return False
+
+
+def time_fn(fn, device='cpu', warmup=2, repeats=10):
+    """
+    Time a callable
+
+    Returns:
+        dict: median / min / mean time in ms and peak memory growth in MB (of the first timed call)
+    """
+    with torch.no_grad():
+        for _ in range(warmup):
+            fn()
+        synchronize(device)
+
+        # the first timed call also measures memory (the sampler thread is not running afterwards)
+        times = []
+        sampler = MemorySampler(device)
+        with sampler:
+            start = time.perf_counter()
+            fn()
+            synchronize(device)
+            times.append(time.perf_counter() - start)
+        memory = sampler.peak
+
+        for _ in range(repeats - 1):
+            start = time.perf_counter()
+            fn()
+            synchronize(device)
+            times.append(time.perf_counter() - start)
+
+    return {
+        'ms_median': round(statistics.median(times) * 1000, 4),
+        'ms_min': round(min(times) * 1000, 4),
+        'ms_mean': round(statistics.mean(times) * 1000, 4),
+        'mem_mb': None if memory is None else round(max(memory, 0) / 1024 ** 2, 3),
+    }
+
+
+def environment(device):
+    """Description of the machine and software, stored with the results"""
+    return {
+        'python': platform.python_version(),
+        'torch': torch.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'device': str(device),
+        'cuda_device': torch.cuda.get_device_name() if str(device).startswith('cuda') else None,
+        'threads': torch.get_num_threads(),
+    }
+
+
+def save_results(results, path):
+    os.makedirs(osp.dirname(osp.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved to: {path}")
+
+
+def compare_to_baseline(results, baseline_path, threshold=0.2, key='ms_median'):
+    """
+    Compare results[name][key] to a stored baseline
+
+    Returns:
+        list: Names of the cases slower than (1 + threshold) x baseline
+    """
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)['results']
+
+    regressions = []
+    print(f"{'case':<36} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, result in results.items():
+        if name not in baseline or baseline[name].get(key) in (None, 0) or result.get(key) is None:
+            continue
+        ratio = result[key] / baseline[name][key]
+        flag = ''
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:<36} {baseline[name][key]:>10.3f} {result[key]:>10.3f} {ratio:>6.2f}x{flag}")
+
+    missing = sorted(set(baseline) - set(results))
+    if missing:
+        print(f"Not measured (in baseline only): {', '.join(missing)}")
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {100 * threshold:.0f}%: {', '.join(regressions)}")
+    else:
+        print(f"No regressions beyond {100 * threshold:.0f}%")
+    return regressions
@@ -0,0 +1,120 @@
+"""
+Import-time benchmark (python -X importtime)
+
+Measures the cumulative import time of the inference entry points in fresh
+interpreters and lists the heavy third-party modules they pull in.
+
+Usage:
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --output benchmarks/results/import_time.json
+    python benchmarks/import_time.py --baseline benchmarks/results/import_time.json --threshold 0.2
+"""
+import argparse
+import json
+import os.path as osp
+import subprocess
+import sys
+
+ROOT_PATH = osp.dirname(osp.dirname(osp.abspath(__file__)))
+
+DEFAULT_TARGETS = [
+    # what `python -m pft_sr.infer` pays before parsing arguments
+    'pft_sr.infer',
+    # what the first upscale() call pays (torch + architecture + option loader)
+    'utils.model',
+    'basicsr.archs.pft_arch',
+    # the training stack, for reference
+    'basicsr.train',
+]
+
+# modules the inference path should never import
+HEAVY_MODULES = ['tensorboard', 'lmdb', 'scipy', 'skimage', 'fairscale', 'cv2', 'torchvision', 'tkinter']
+
+
+def measure(target, repeats=3):
+    """
+    Import a module in fresh interpreters with -X importtime
+
+    Returns:
+        dict: {'total_us': best cumulative time, 'modules': {name: cumulative_us}, 'heavy': [...]}
+    """
+    best = None
+    for _ in range(repeats):
+        proc = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {target}'],
+            cwd=ROOT_PATH, capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"Cannot import {target}:\n{proc.stderr.strip().splitlines()[-1]}")
+
+        modules = {}
+        top_level = {}  # depth 0: the target and the modules imported before it (e.g. site)
+        children = {}  # direct imports of the target
+        for line in proc.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            modules[name.strip()] = int(cumulative)
+            # nesting is shown by two spaces per level, and a module is listed after its imports
+            depth = (len(name) - len(name.lstrip()) - 1) // 2
+            if depth == 0:
+                top_level[name.strip()] = int(cumulative)
+                if name.strip() != target:
+                    children = {}
+            elif depth == 1:
+                children[name.strip()] = int(cumulative)
+        # cumulative times include the nested imports, so only depth 0 entries can be summed
+        total = modules.get(target, sum(top_level.values()))
+        if best is None or total < best['total_us']:
+            best = {'total_us': total, 'modules': modules, 'children': children}
+
+    top_level = {name.split('.')[0] for name in best['modules']}
+    best['heavy'] = sorted(m for m in HEAVY_MODULES if m in top_level)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', nargs='+', default=DEFAULT_TARGETS, help='Modules to import.')
+    parser.add_argument('--repeats', type=int, default=3, help='Fresh interpreters per target (best is kept).')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest direct imports to list.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown flagged as a regression.')
+    args = parser.parse_args()
+
+    results = {}
+    for target in args.targets:
+        result = measure(target, args.repeats)
+        results[target] = {'total_ms': result['total_us'] / 1000, 'heavy': result['heavy']}
+        print(f"{target}: {result['total_us'] / 1000:.1f} ms"
+              + (f" (imports {', '.join(result['heavy'])})" if result['heavy'] else ""))
+        slowest = sorted(((us, name) for name, us in result['children'].items()), reverse=True)[:args.top]
+        for us, name in slowest:
+            print(f"    {us / 1000:8.1f} ms  {name}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved to: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = []
+        for target, result in results.items():
+            if target not in baseline:
+                continue
+            ratio = result['total_ms'] / max(baseline[target]['total_ms'], 1e-9)
+            new_heavy = set(result['heavy']) - set(baseline[target]['heavy'])
+            if ratio > 1 + args.threshold or new_heavy:
+                regressions.append(target)
+                print(f"REGRESSION {target}: {ratio:.2f}x baseline"
+                      + (f", new heavy imports: {', '.join(sorted(new_heavy))}" if new_heavy else ""))
+        if regressions:
+            sys.exit(1)
+        print("No regressions.")
+
+
+if __name__ == '__main__':
+    main()
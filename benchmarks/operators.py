@@ -0,0 +1,173 @@
+"""
+Operator micro-benchmarks of the PFT building blocks
+
+Times (and measures the peak memory growth of) window_partition / window_reverse,
+WindowAttention (dense, and sparse at each top-k of the schedule), ConvFFN and its
+depthwise convolution, PatchEmbed / PatchUnEmbed, the upsamplers and the SMM ops,
+on synthetic inputs with a fixed seed. Runs on CPU by default (the SMM ops use
+their PyTorch fallback there, and the CUDA kernels on CUDA when ops_smm is built).
+
+Usage:
+    python benchmarks/operators.py --output benchmarks/results/operators_cpu.json
+    python benchmarks/operators.py --baseline benchmarks/results/operators_cpu.json --threshold 0.15
+    python benchmarks/operators.py --preset lightweight --only attention
+"""
+import argparse
+import re
+import sys
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import compare_to_baseline, environment, save_results, set_seed, time_fn
+
+import torch
+import torch.nn as nn
+
+from basicsr.archs.pft_arch import (ConvFFN, PatchEmbed, PatchUnEmbed, Upsample, UpsampleOneStep, WindowAttention,
+                                    dwconv, smm_amv, smm_qmk, window_partition, window_reverse)
+
+
+# network settings of the test option files
+PRESETS = {
+    'classical': {'dim': 240, 'num_heads': 6, 'mlp_ratio': 2, 'kernel_size': 7, 'topk': [256, 128, 64, 32, 16]},
+    'lightweight': {'dim': 52, 'num_heads': 4, 'mlp_ratio': 1, 'kernel_size': 7, 'topk': [256, 128, 64, 32]},
+}
+WINDOW_SIZE = 32
+NUM_FEAT = 64
+
+
+def relative_position_index(window_size):
+    """Same as PFT.calculate_rpi_sa"""
+    coords = torch.stack(torch.meshgrid([torch.arange(window_size), torch.arange(window_size)], indexing='ij'))
+    coords_flatten = torch.flatten(coords, 1)
+    relative_coords = (coords_flatten[:, :, None] - coords_flatten[:, None, :]).permute(1, 2, 0).contiguous()
+    relative_coords[:, :, 0] += window_size - 1
+    relative_coords[:, :, 1] += window_size - 1
+    relative_coords[:, :, 0] *= 2 * window_size - 1
+    return relative_coords.sum(-1)
+
+
+def random_topk(rows, n, topk, device):
+    """Random distinct key indices per query: (rows, n, topk)"""
+    return torch.rand(rows, n, n, device=device).argsort(dim=-1)[..., :topk].contiguous()
+
+
+def build_cases(preset, size, batch, device):
+    """
+    Returns:
+        list of (name, callable, description)
+    """
+    cfg = PRESETS[preset]
+    dim, heads = cfg['dim'], cfg['num_heads']
+    hidden = int(dim * cfg['mlp_ratio'])
+    ws, n = WINDOW_SIZE, WINDOW_SIZE * WINDOW_SIZE
+    nw = batch * (size // ws) ** 2
+    x_size = (size, size)
+    cases = []
+
+    # window partition / reverse of the concatenated qkv + LePE features (4 * dim channels)
+    features = torch.randn(batch, size, size, 4 * dim, device=device)
+    windows = window_partition(features, ws)
+    cases.append(('window_partition', lambda: window_partition(features, ws), f"{tuple(features.shape)}"))
+    cases.append(('window_reverse', lambda: window_reverse(windows, ws, size, size), f"{tuple(windows.shape)}"))
+
+    # window attention: dense (first layers), then sparse with the top-k of each stage
+    rpi = relative_position_index(ws).to(device)
+    qkvp = torch.randn(nw, n, 4 * dim, device=device)
+    dense = WindowAttention(dim, layer_id=0, window_size=(ws, ws), num_heads=heads, num_topk=[n]).to(device).eval()
+    cases.append(('attention_dense', lambda: dense(qkvp, [None, None], [None, None], rpi),
+                  f"{nw} windows x {n} tokens"))
+    for topk in cfg['topk']:
+        attention = WindowAttention(dim, layer_id=0, window_size=(ws, ws), num_heads=heads,
+                                    num_topk=[topk]).to(device).eval()
+        indices = random_topk(nw * heads, n, topk, device).view(nw, heads, n, topk)
+        values = torch.softmax(torch.randn(nw, heads, n, topk, device=device), dim=-1)
+        cases.append((f'attention_sparse_top{topk}',
+                      lambda a=attention, v=values, i=indices: a(qkvp, [v, None], [i, None], rpi),
+                      f"{nw} windows x {n} tokens, top-{topk}"))
+
+    # SMM ops at each top-k (b = windows x heads, head_dim = dim / heads)
+    head_dim = dim // heads
+    q = torch.randn(nw * heads, n, head_dim, device=device)
+    k = torch.randn(nw * heads, head_dim, n, device=device)
+    v = torch.randn(nw * heads, n, head_dim, device=device)
+    for topk in cfg['topk']:
+        index = random_topk(nw * heads, n, topk, device).int()
+        attn = torch.rand(nw * heads, n, topk, device=device)
+        cases.append((f'smm_qmk_top{topk}', lambda i=index: smm_qmk(q, k, i), f"{nw * heads} x {n} x top-{topk}"))
+        cases.append((f'smm_amv_top{topk}', lambda a=attn, i=index: smm_amv(a, v, i),
+                      f"{nw * heads} x {n} x top-{topk}"))
+
+    # ConvFFN and its depthwise convolution
+    tokens = torch.randn(batch, size * size, dim, device=device)
+    hidden_tokens = torch.randn(batch, size * size, hidden, device=device)
+    convffn = ConvFFN(dim, hidden, kernel_size=cfg['kernel_size']).to(device).eval()
+    depthwise = dwconv(hidden, kernel_size=cfg['kernel_size']).to(device).eval()
+    cases.append(('convffn', lambda: convffn(tokens, x_size), f"{tuple(tokens.shape)}, hidden {hidden}"))
+    cases.append(('dwconv', lambda: depthwise(hidden_tokens, x_size), f"{tuple(hidden_tokens.shape)}"))
+
+    # patch (un)embedding
+    feature_map = torch.randn(batch, dim, size, size, device=device)
+    embed = PatchEmbed(size, 1, dim, dim, norm_layer=nn.LayerNorm).to(device).eval()
+    unembed = PatchUnEmbed(size, 1, dim, dim).to(device).eval()
+    cases.append(('patch_embed', lambda: embed(feature_map), f"{tuple(feature_map.shape)}"))
+    cases.append(('patch_unembed', lambda: unembed(tokens, x_size), f"{tuple(tokens.shape)}"))
+
+    # upsamplers: pixelshuffle (classical) and pixelshuffledirect (lightweight)
+    if preset == 'classical':
+        feat = torch.randn(batch, NUM_FEAT, size, size, device=device)
+        for scale in (2, 3, 4):
+            upsample = Upsample(scale, NUM_FEAT).to(device).eval()
+            cases.append((f'upsample_x{scale}', lambda u=upsample: u(feat), f"{tuple(feat.shape)}"))
+    else:
+        for scale in (2, 3, 4):
+            upsample = UpsampleOneStep(scale, dim, 3).to(device).eval()
+            cases.append((f'upsample_one_step_x{scale}', lambda u=upsample: u(feature_map),
+                          f"{tuple(feature_map.shape)}"))
+
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--preset', type=str, default='classical', choices=list(PRESETS), help='Network settings.')
+    parser.add_argument('--size', type=int, default=64, help='Feature map size (multiple of the window size 32).')
+    parser.add_argument('--batch', type=int, default=1, help='Batch size.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device.')
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads (default: unchanged).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic inputs.')
+    parser.add_argument('--warmup', type=int, default=2, help='Untimed calls per case.')
+    parser.add_argument('--repeats', type=int, default=10, help='Timed calls per case.')
+    parser.add_argument('--only', type=str, default=None, help='Run the cases matching this regular expression.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    parser.add_argument('--baseline', type=str, default=None, help='JSON results to compare against.')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Relative slowdown flagged as a regression.')
+    args = parser.parse_args()
+
+    if args.size % WINDOW_SIZE:
+        parser.error(f"--size must be a multiple of {WINDOW_SIZE}")
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    set_seed(args.seed)
+
+    results = {}
+    print(f"{'case':<36} {'median ms':>10} {'min ms':>10} {'mem MB':>9}  input")
+    for name, fn, description in build_cases(args.preset, args.size, args.batch, args.device):
+        if args.only is not None and not re.search(args.only, name):
+            continue
+        result = time_fn(fn, args.device, args.warmup, args.repeats)
+        result['input'] = description
+        results[name] = result
+        memory = '-' if result['mem_mb'] is None else f"{result['mem_mb']:.1f}"
+        print(f"{name:<36} {result['ms_median']:>10.3f} {result['ms_min']:>10.3f} {memory:>9}  {description}")
+
+    if args.output:
+        save_results({'meta': dict(environment(args.device), preset=args.preset, size=args.size, batch=args.batch,
+                                   seed=args.seed, repeats=args.repeats),
+                      'results': results}, args.output)
+
+    if args.baseline and compare_to_baseline(results, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
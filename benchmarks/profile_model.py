@@ -0,0 +1,60 @@
+"""
+Per-module profile of a PFT model (see basicsr/archs/pft_profiler.py)
+
+Prints where the time goes (dense vs sparse attention, ConvFFN, norms, ...) and
+optionally writes a Chrome trace (open it in chrome://tracing or ui.perfetto.dev).
+
+Usage:
+    python benchmarks/profile_model.py --task lightweight --scale 4 --size 256
+    python benchmarks/profile_model.py --task classical --scale 2 --size 128 --layers --trace pft_trace.json
+"""
+import argparse
+import os.path as osp
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import set_seed
+
+import torch
+
+from utils.model import checkpoint_path, load_model
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--task', type=str, default='classical', choices=['classical', 'lightweight'], help='Model.')
+    parser.add_argument('--scale', type=int, default=4, help='Scale factor.')
+    parser.add_argument('--size', type=int, default=256, help='Square input size.')
+    parser.add_argument('--batch', type=int, default=1, help='Batch size.')
+    parser.add_argument('--device', type=str, default='cpu', help='Device.')
+    parser.add_argument('--threads', type=int, default=None, help='torch.set_num_threads (default: unchanged).')
+    parser.add_argument('--repeats', type=int, default=3, help='Profiled runs (after one warm-up run).')
+    parser.add_argument('--layers', action='store_true', help='Also list attention / ConvFFN / norms per layer.')
+    parser.add_argument('--trace', type=str, default=None, help='Write a Chrome trace JSON.')
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        torch.set_num_threads(args.threads)
+    set_seed(0)
+    pretrained = osp.exists(checkpoint_path(args.task, args.scale))
+    model = load_model(args.task, args.scale, args.device, pretrained=pretrained)
+    image = torch.rand(args.batch, 3, args.size, args.size, device=args.device)
+
+    with torch.no_grad():
+        model(image)
+        with model.profile(trace=args.trace is not None) as prof:
+            for _ in range(args.repeats):
+                model(image)
+
+    kinds = ('model', 'pftb', 'layer')
+    if args.layers:
+        kinds += ('attention', 'convffn', 'norm', 'qkv projection', 'lepe')
+    print(f"{args.task} x{args.scale}, {args.batch} x {args.size}x{args.size}, {args.repeats} runs, "
+          f"{'pretrained' if pretrained else 'random'} weights")
+    prof.print_table(kinds)
+    if args.trace:
+        prof.save_chrome_trace(args.trace)
+        print(f"Saved to: {args.trace}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Smoke test of the HTTP inference service (pft_sr/service.py) with a CPU model on localhost
+
+Starts `python -m pft_sr.service --random-weights --device cpu` on a free port, then checks:
+    batching   two same-shape images sent concurrently are upscaled and run as one batch
+    metrics    GET /metrics reports the requests and the batch size
+    queue      with the queue full (--max-queue 2), a further request gets 503 and Retry-After
+Exits with status 1 if a check fails.
+
+Usage:
+    python benchmarks/smoke_service.py
+    python benchmarks/smoke_service.py --task lightweight --scale 2 --size 32
+"""
+import argparse
+import http.client
+import io
+import json
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import ROOT_PATH
+
+import numpy as np
+from PIL import Image
+
+MAX_QUEUE = 2
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def request(port, method, target, body=None, timeout=600):
+    """(status, headers, body) of one request"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    try:
+        connection.request(method, target, body=body)
+        response = connection.getresponse()
+        return response.status, dict(response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def wait_ready(proc, port, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"The service exited with status {proc.returncode}")
+        try:
+            if request(port, 'GET', '/health', timeout=1)[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"The service did not start within {timeout}s")
+
+
+def encode(size, seed):
+    array = np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(array).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--task', type=str, default='lightweight', help='Task of the model.')
+    parser.add_argument('--scale', type=int, default=2, help='Scale of the model.')
+    parser.add_argument('--size', type=int, default=32, help='Input image size.')
+    parser.add_argument('--max-delay', type=float, default=1000,
+                        help='Latency window (ms); long, so that concurrent requests fall in one window.')
+    parser.add_argument('--startup-timeout', type=float, default=300, help='Seconds to wait for the service.')
+    args = parser.parse_args()
+
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'pft_sr.service', '--port', str(port), '--device', 'cpu', '--random-weights',
+         '--preload', f'{args.task}:{args.scale}', '--max-delay', str(args.max_delay),
+         '--max-queue', str(MAX_QUEUE)], cwd=ROOT_PATH)
+    target = f'/upscale?task={args.task}&scale={args.scale}'
+    failures = []
+
+    def check(condition, message):
+        print(f"{'ok  ' if condition else 'FAIL'} {message}")
+        if not condition:
+            failures.append(message)
+
+    try:
+        wait_ready(proc, port, args.startup_timeout)
+
+        # batching: two compatible requests within one window
+        with ThreadPoolExecutor(2) as executor:
+            responses = list(executor.map(lambda seed: request(port, 'POST', target, encode(args.size, seed)), [0, 1]))
+        check(all(status == 200 for status, _, _ in responses),
+              f"concurrent requests served: {[status for status, _, _ in responses]}")
+        for status, _, body in responses:
+            if status == 200:
+                size = Image.open(io.BytesIO(body)).size
+                check(size == (args.size * args.scale, args.size * args.scale), f"output size {size}")
+
+        # metrics
+        status, _, body = request(port, 'GET', '/metrics')
+        metrics = json.loads(body) if status == 200 else {}
+        check(status == 200, f"/metrics status {status}")
+        check(metrics.get('requests') == 2, f"requests {metrics.get('requests')}")
+        check(metrics.get('batch_sizes') == {'2': 1}, f"batched together: batch sizes {metrics.get('batch_sizes')}")
+
+        # queue full: MAX_QUEUE requests wait in the window, the next one is rejected
+        with ThreadPoolExecutor(MAX_QUEUE + 1) as executor:
+            futures = [executor.submit(request, port, 'POST', target, encode(args.size, seed))
+                       for seed in range(MAX_QUEUE)]
+            time.sleep(min(args.max_delay / 4000, 0.5))
+            rejected = request(port, 'POST', target, encode(args.size, MAX_QUEUE))
+            served = [future.result()[0] for future in futures]
+        check(rejected[0] == 503, f"request over the queue limit: status {rejected[0]}")
+        check('Retry-After' in rejected[1], f"Retry-After header: {rejected[1].get('Retry-After')}")
+        check(served == [200] * MAX_QUEUE, f"queued requests served: {served}")
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+    if failures:
+        print(f"{len(failures)} check(s) failed.")
+        sys.exit(1)
+    print("All checks passed.")
+
+
+if __name__ == '__main__':
+    main()
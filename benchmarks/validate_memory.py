@@ -0,0 +1,140 @@
+"""
+Validate the analytic peak-memory estimate (PFT.memory) against measured peaks
+
+For each model, input size and batch size, runs one forward pass under torch.no_grad
+and compares the measured peak activation memory with PFT.memory(): on CUDA the peak
+of allocated memory, on CPU the sampled RSS growth (less exact: allocator caching and
+freed pages that are not returned to the OS). With --per-layer on CUDA, the peak of
+each PFTransformerLayer is also measured (with forward hooks) and compared with the
+per-stage estimate.
+
+Usage:
+    python benchmarks/validate_memory.py --device cuda --tasks classical --sizes 64 128 256 --batches 1 2
+    python benchmarks/validate_memory.py --device cuda --per-layer --output benchmarks/results/memory_cuda.json
+"""
+import argparse
+import itertools
+
+from common import ROOT_PATH  # noqa: F401 (puts the repository root on sys.path)
+from common import MemorySampler, environment, save_results, set_seed, synchronize
+
+import torch
+
+from basicsr.archs import pft_arch
+from utils.model import load_model
+
+
+def measure_layers(model, x):
+    """Measured peak allocated CUDA memory (bytes) during each PFTransformerLayer, above the memory before it"""
+    peaks = {}
+    handles = []
+
+    def pre_hook(module, args):
+        torch.cuda.synchronize()
+        torch.cuda.reset_peak_memory_stats()
+        module._memory_before = torch.cuda.memory_allocated()
+
+    def post_hook(name):
+        def hook(module, args, output):
+            torch.cuda.synchronize()
+            peaks[name] = torch.cuda.max_memory_allocated() - module._memory_before
+        return hook
+
+    for i, block in enumerate(model.layers):
+        for layer in block.residual_group.layers:
+            handles.append(layer.register_forward_pre_hook(pre_hook))
+            handles.append(layer.register_forward_hook(post_hook(f'PFTB{i}.layer{layer.layer_id}')))
+    try:
+        with torch.no_grad():
+            model(x)
+    finally:
+        for handle in handles:
+            handle.remove()
+    return peaks
+
+
+def layer_estimates(model, size, batch):
+    """Estimated peak of each PFTransformerLayer on its own (PFTransformerLayer.memory), by stage name"""
+    element_size = next(model.parameters()).element_size()
+    sparse_kernel = pft_arch.smm_cuda is not None and next(model.parameters()).is_cuda
+    n = model.window_size ** 2
+    topk = [None, None]
+    estimates = {}
+    for i, block in enumerate(model.layers):
+        for layer in block.residual_group.layers:
+            shift = 1 if layer.shift_size > 0 else 0
+            peak, _ = layer.memory((size, size), batch, element_size, topk[shift], sparse_kernel)
+            estimates[f'PFTB{i}.layer{layer.layer_id}'] = peak
+            if layer.attn_win.topk < n:
+                topk[shift] = layer.attn_win.topk
+    return estimates
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tasks', nargs='+', default=['classical', 'lightweight'],
+                        choices=['classical', 'lightweight'], help='Models.')
+    parser.add_argument('--scales', nargs='+', type=int, default=[4], help='Scale factors.')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[64, 128, 256],
+                        help='Square input sizes (multiples of the window size 32).')
+    parser.add_argument('--batches', nargs='+', type=int, default=[1, 2], help='Batch sizes.')
+    parser.add_argument('--device', type=str, default='cuda' if torch.cuda.is_available() else 'cpu',
+                        help='Device.')
+    parser.add_argument('--per-layer', action='store_true', help='Also compare each layer (CUDA only).')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed.')
+    parser.add_argument('--output', type=str, default=None, help='Write the results as JSON.')
+    args = parser.parse_args()
+
+    is_cuda = str(args.device).startswith('cuda')
+    results = {}
+    print(f"{'case':<36} {'estimate MB':>12} {'measured MB':>12} {'ratio':>7}")
+    for task, scale in itertools.product(args.tasks, args.scales):
+        set_seed(args.seed)
+        model = load_model(task, scale, args.device, pretrained=False)
+
+        for size, batch in itertools.product(args.sizes, args.batches):
+            name = f"{task}_x{scale}_{size}_b{batch}"
+            x = torch.rand(batch, 3, size, size, device=args.device)
+            estimate = model.memory((size, size), batch=batch)
+            try:
+                with torch.no_grad():
+                    model(x)  # warm-up (allocator, kernels)
+                    synchronize(args.device)
+                    sampler = MemorySampler(args.device)
+                    with sampler:
+                        model(x)
+            except RuntimeError as e:  # e.g. out of memory
+                print(f"{name:<36} failed ({str(e).splitlines()[0]})")
+                continue
+            measured = max(sampler.peak, 0)
+            result = {'estimate_mb': round(estimate / 1024 ** 2, 2), 'measured_mb': round(measured / 1024 ** 2, 2),
+                      'ratio': round(estimate / measured, 3) if measured else None}
+            print(f"{name:<36} {result['estimate_mb']:>12.1f} {result['measured_mb']:>12.1f} "
+                  f"{result['ratio'] or float('nan'):>6.2f}x")
+
+            if args.per_layer and is_cuda:
+                measured_layers = measure_layers(model, x)
+                result['layers'] = {}
+                for layer, layer_estimate in layer_estimates(model, size, batch).items():
+                    layer_measured = measured_layers.get(layer, 0)
+                    result['layers'][layer] = {
+                        'estimate_mb': round(layer_estimate / 1024 ** 2, 2),
+                        'measured_mb': round(layer_measured / 1024 ** 2, 2),
+                        'ratio': round(layer_estimate / layer_measured, 3) if layer_measured else None}
+                    print(f"  {layer:<34} {layer_estimate / 1024 ** 2:>12.1f} {layer_measured / 1024 ** 2:>12.1f}")
+            results[name] = result
+
+        del model
+        if is_cuda:
+            torch.cuda.empty_cache()
+
+    ratios = [r['ratio'] for r in results.values() if r['ratio']]
+    if ratios:
+        print(f"\nEstimate / measured: min {min(ratios):.2f}x, max {max(ratios):.2f}x over {len(ratios)} cases")
+
+    if args.output:
+        save_results({'meta': dict(environment(args.device), seed=args.seed), 'results': results}, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import time
+_START = time.perf_counter()  # before the heavy imports, to measure the whole cold start
+
 import torch
 import os
 import os.path as osp
@@ -5,25 +8,18 @@ import sys
 import argparse
 
 from PIL import Image
-from torchvision import transforms
-from basicsr.archs.pft_arch import PFT
-
-model_path = {
-    "classical": {
-        "2": "experiments/pretrained_models/001_PFT_SRx2_scratch.pth",
-        "3": "experiments/pretrained_models/002_PFT_SRx3_finetune.pth",
-        "4": "experiments/pretrained_models/003_PFT_SRx4_finetune.pth",
-    },
-    "lightweight": {
-        "2": "experiments/pretrained_models/101_PFT_light_SRx2_scratch.pth",
-        "3": "experiments/pretrained_models/102_PFT_light_SRx3_finetune.pth",
-        "4": "experiments/pretrained_models/103_PFT_light_SRx4_finetune.pth",
-    }
-}
+from utils.directory_runner import process_directory, IMAGE_EXTENSIONS
+from utils.inference import upscale_image
+from utils.model import load_model
+from utils.patch_calibration import select_patch_auto, estimate_patch_size, parse_mem_budget, parse_patch_size
+from utils.result_cache import ResultCache, DEFAULT_CACHE_DIR
+from utils.sharding import ShardedRunner
+from utils.video import process_video, VIDEO_EXTENSIONS
+
 
 def get_parser(**parser_kwargs):
     parser = argparse.ArgumentParser(**parser_kwargs)
-    parser.add_argument("-i", "--in_path", type=str, default="", help="Input image or directory path.")
+    parser.add_argument("-i", "--in_path", type=str, default="", help="Input image, video or directory path.")
     parser.add_argument("-o", "--out_path", type=str, default="results/test/", help="Output directory path.")
     parser.add_argument("--scale", type=int, default=4, help="Scale factor for SR.")
     parser.add_argument(
@@ -33,78 +29,141 @@ def get_parser(**parser_kwargs):
             choices=['classical', 'lightweight'],
             help="Task for the model. classical: for classical SR models. lightweight: for lightweight models."
             )
+    parser.add_argument("--patch", type=str, default="none",
+                        help="Patch size. none: process the entire image at once. auto: calibrated, fastest size "
+                             "within --mem-budget. fit: largest size whose estimated peak memory (PFT.memory) fits "
+                             "--mem-budget, without calibration. Or an explicit size, e.g. 256 or 384x256.")
+    parser.add_argument("--mem-budget", type=str, default=None,
+                        help="Memory budget for --patch auto / fit, e.g. 512M or 4G (plain numbers are MB).")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Directory mode: number of threads decoding and encoding images alongside the model.")
+    parser.add_argument("--no-recursive", action="store_true", help="Directory mode: skip sub-directories.")
+    parser.add_argument("--procs", type=int, default=1,
+                        help="CPU only: number of forked worker processes sharing one copy of the weights. Files "
+                             "(directory mode) or the patches of one image are distributed over them.")
+    parser.add_argument("--proc-threads", type=int, default=None,
+                        help="torch threads per worker process (default: its CPUs / the CPUs divided by --procs).")
+    parser.add_argument("--affinity", type=str, default="none", choices=['none', 'cores', 'numa'],
+                        help="Pin the worker processes to groups of CPUs (cores) or to NUMA nodes (numa).")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Directory mode: redo images already recorded as done in the output journal.")
+    parser.add_argument("--cache", action="store_true",
+                        help="Cache SR results (whole images and patches) by content hash.")
+    parser.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="Result cache directory.")
+    parser.add_argument("--cache-size", type=str, default="10G", help="Result cache size limit, e.g. 512M or 10G.")
+    parser.add_argument("--batch-frames", type=int, default=4, help="Video mode: number of frames per batch.")
+    parser.add_argument("--reuse-threshold", type=float, default=None,
+                        help="Video mode: reuse the previous SR tile when the mean absolute LR difference of a "
+                             "tile (0-255) is within this threshold (for static-camera footage).")
+    parser.add_argument("--fourcc", type=str, default=None,
+                        help="Video mode: output codec (default: from the output extension, e.g. mp4v).")
     args = parser.parse_args()
 
     return args
 
 
-def process_image(image_input_path, image_output_path, model, device):
-    with torch.no_grad():
-        image_input = Image.open(image_input_path).convert('RGB')
-        image_input = transforms.ToTensor()(image_input).unsqueeze(0).to(device)
-        image_output = model(image_input).clamp(0.0, 1.0)[0].cpu()
-        image_output = transforms.ToPILImage()(image_output)
-        image_output.save(image_output_path)
+def get_output_name(file, args):
+    file_name = osp.splitext(file)
+    return file_name[0] + '_PFT_' + args.task + '_SRx' + str(args.scale) + file_name[1]
+
+
+def get_patch_size(image_size, model, device, args):
+    if args.patch == 'none':
+        return None
+    if args.patch == 'auto':
+        return select_patch_auto(model, args.task, args.scale, device,
+                                 image_size=image_size, mem_budget=parse_mem_budget(args.mem_budget))
+    if args.patch == 'fit':
+        if args.mem_budget is None:
+            raise ValueError("--patch fit requires --mem-budget")
+        size = estimate_patch_size(model, parse_mem_budget(args.mem_budget), image_size=image_size)
+        return (size, size)
+    return parse_patch_size(args.patch)
+
+
+def process_image(image_input_path, image_output_path, model, device, args, cache=None):
+    image_input = Image.open(image_input_path).convert('RGB')
+    patch_size = get_patch_size(image_input.size, model, device, args)
+    image_output = upscale_image(image_input, model, device, args.scale, patch_size, cache)
+    image_output.save(image_output_path)
+
+def run_sharded(args):
+    """--procs mode: the model is loaded once, shared with the forked workers, and fed from a work queue"""
+    if args.patch == 'auto':
+        raise ValueError("--procs does not support --patch auto (the calibration would run the model before the "
+                         "workers are forked); use --patch fit or an explicit size")
+    if args.in_path.lower().endswith(VIDEO_EXTENSIONS):
+        raise ValueError("--procs does not support video input")
+    if args.cache:
+        raise ValueError("--procs does not support --cache (each forked worker would keep its own LRU state of the "
+                         "same cache directory)")
+    os.makedirs(args.out_path, exist_ok=True)
+
+    with ShardedRunner(args.task, args.scale, workers=args.procs, threads=args.proc_threads,
+                       affinity=args.affinity) as runner:
+        if args.patch == 'fit':
+            patch_size = get_patch_size(None, runner.model, 'cpu', args)
+        elif args.patch == 'none':
+            patch_size = None
+        else:
+            patch_size = parse_patch_size(args.patch)
+
+        if os.path.isdir(args.in_path):
+            runner.process_directory(args.in_path, args.out_path, lambda file: get_output_name(file, args),
+                                     patch_size=patch_size, recursive=not args.no_recursive,
+                                     resume=not args.no_resume)
+        elif patch_size is None:
+            # one whole image runs on a single worker
+            output_path = os.path.join(args.out_path, get_output_name(osp.basename(args.in_path), args))
+            runner.process_files([(osp.basename(args.in_path), args.in_path, output_path)])
+            print(f"Saved to: {output_path}")
+        else:
+            output_path = os.path.join(args.out_path, get_output_name(osp.basename(args.in_path), args))
+            image_output = runner.upscale_image(Image.open(args.in_path).convert('RGB'), patch_size)
+            image_output.save(output_path)
+            print(f"Saved to: {output_path}")
+
 
 def main():
     args = get_parser()
+    if args.procs > 1:
+        run_sharded(args)
+        return
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-    if args.task == 'classical':
-        model = PFT(upscale=args.scale,
-                    embed_dim=240,
-                    depths=[4, 4, 4, 6, 6, 6],
-                    num_heads=6,
-                    num_topk=[1024, 1024, 1024, 1024,
-                             256, 256, 256, 256,
-                             128, 128, 128, 128,
-                             64, 64, 64, 64, 64, 64,
-                             32, 32, 32, 32, 32, 32,
-                             16, 16, 16, 16, 16, 16, ],
-                    window_size=32,
-                    convffn_kernel_size=7,
-                    mlp_ratio=2,
-                    upsampler='pixelshuffle',
-                    use_checkpoint=False,
-                    )  
-    elif args.task == 'lightweight':
-        model = PFT(upscale=args.scale,
-                    embed_dim=52,
-                    depths=[2, 4, 6, 6, 6],
-                    num_heads=4,
-                    num_topk=[1024, 1024,
-                              256, 256, 256, 256,
-                              128, 128, 128, 128, 128, 128,
-                              64, 64, 64, 64, 64, 64,
-                              32, 32, 32, 32, 32, 32],
-                    window_size=32,
-                    convffn_kernel_size=7,
-                    mlp_ratio=1,
-                    upsampler='pixelshuffledirect',
-                    use_checkpoint=False,
-                    )
-
-    state_dict = torch.load(model_path[args.task][str(args.scale)], map_location=device)['params_ema']
-    model.load_state_dict(state_dict, strict=True)
-    model = model.to(device)
-    model.eval()
+    model = load_model(args.task, args.scale, device)
+    print(f"Model loaded in {model.load_stats['total']:.2f}s "
+          f"(build {model.load_stats['build']:.2f}s, weights {model.load_stats['load']:.2f}s)")
 
     if not os.path.exists(args.out_path):
         os.makedirs(args.out_path)
 
+    cache = ResultCache(args.cache_dir, parse_mem_budget(args.cache_size)) if args.cache else None
+
     if os.path.isdir(args.in_path):
-        for file in os.listdir(args.in_path):
-            if file.endswith('.png') or file.endswith('.jpg') or file.endswith('.jpeg'):
-                image_input_path = osp.join(args.in_path, file)
-                file_name = osp.splitext(file)
-                image_output_path = os.path.join(args.out_path, file_name[0] + '_PFT_' + args.task + '_SRx' + str(args.scale) + file_name[1])
-                process_image(image_input_path, image_output_path, model, device)
+        stats = process_directory(
+            args.in_path, args.out_path, model, device, args.scale,
+            output_name=lambda file: get_output_name(file, args),
+            patch_size_fn=lambda image_size: get_patch_size(image_size, model, device, args),
+            cache=cache, workers=args.workers, recursive=not args.no_recursive, resume=not args.no_resume,
+        )
+        if stats['first_output'] is not None:
+            print(f"Cold start (time to first output): {stats['first_output'] - _START:.2f}s")
     else:
-        if args.in_path.endswith('.png') or args.in_path.endswith('.jpg') or args.in_path.endswith('.jpeg'):
+        if args.in_path.lower().endswith(IMAGE_EXTENSIONS):
             image_input_path = args.in_path
-            file_name = osp.splitext(osp.basename(args.in_path))
-            image_output_path = os.path.join(args.out_path, file_name[0] + '_PFT_' + args.task + '_SRx' + str(args.scale) + file_name[1])
-            process_image(image_input_path, image_output_path, model, device)
+            image_output_path = os.path.join(args.out_path, get_output_name(osp.basename(args.in_path), args))
+            process_image(image_input_path, image_output_path, model, device, args, cache)
+            print(f"Cold start (time to first output): {time.perf_counter() - _START:.2f}s")
+        elif args.in_path.lower().endswith(VIDEO_EXTENSIONS):
+            video_output_path = os.path.join(args.out_path, get_output_name(osp.basename(args.in_path), args))
+            process_video(args.in_path, video_output_path, model, device, args.scale,
+                          patch_size_fn=lambda image_size: get_patch_size(image_size, model, device, args),
+                          batch_frames=args.batch_frames, reuse_threshold=args.reuse_threshold, fourcc=args.fourcc)
+            print(f"Saved to: {video_output_path}")
+
+    if cache is not None:
+        cache.print_stats()
 
 
 if __name__ == "__main__":
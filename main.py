@@ -4,7 +4,8 @@ import os.path as osp
 import argparse
 from PIL import Image
 
-from utils import load_model, process_image, select_patch_settings
+from utils import load_model, process_image, select_patch_settings, select_patch_auto, parse_mem_budget, \
+    parse_patch_size, select_roi, process_roi, parse_roi
 
 
 def get_parser(**parser_kwargs):
@@ -20,6 +21,20 @@ def get_parser(**parser_kwargs):
         choices=['classical', 'lightweight'],
         help="Task for the model. classical: for classical SR models. lightweight: for lightweight models."
     )
+    parser.add_argument(
+        "--patch",
+        type=str,
+        default="gui",
+        help="Patch size. gui: choose in the settings dialog. auto: calibrated, fastest size within --mem-budget. "
+             "none: process the entire image at once. Or an explicit size, e.g. 256 or 384x256."
+    )
+    parser.add_argument("--mem-budget", type=str, default=None,
+                        help="Memory budget for --patch auto, e.g. 512M or 4G (plain numbers are MB).")
+    parser.add_argument("--roi", type=str, default=None,
+                        help="Only super-resolve a region. gui: select it with the mouse. Or x1,y1,x2,y2.")
+    parser.add_argument("--roi-margin", type=int, default=None,
+                        help="Context margin around the ROI in pixels. "
+                             "Default: the full receptive field, which matches the full-image result exactly.")
     args = parser.parse_args()
     return args
 
@@ -42,36 +57,67 @@ def main():
     width, height = image.size
     print(f"Image size: {width} x {height}")
 
-    # Patch settings GUI
-    print("\nOpening patch settings...")
-    patch_size = select_patch_settings(image, width, height)
-
-    if patch_size is None:
-        print("Patch settings cancelled.")
-        return
-
-    print(f"Patch size: {patch_size[0]} x {patch_size[1]}")
-
     # Load model
     print("\nLoading model...")
     model = load_model(args.task, args.scale, device)
     print("Model loaded.")
 
+    if args.roi is not None:
+        # ROI settings
+        if args.roi == 'gui':
+            print("\nOpening ROI selector...")
+            roi = select_roi(args.in_path)
+
+            if roi is None:
+                print("ROI selection cancelled.")
+                return
+        else:
+            roi = parse_roi(args.roi)
+    else:
+        # Patch settings
+        if args.patch == 'gui':
+            print("\nOpening patch settings...")
+            patch_size = select_patch_settings(image, width, height)
+
+            if patch_size is None:
+                print("Patch settings cancelled.")
+                return
+        elif args.patch == 'auto':
+            print("\nSelecting patch size...")
+            patch_size = select_patch_auto(
+                model, args.task, args.scale, device,
+                image_size=(width, height), mem_budget=parse_mem_budget(args.mem_budget)
+            )
+        elif args.patch == 'none':
+            patch_size = None
+        else:
+            patch_size = parse_patch_size(args.patch)
+
+        if patch_size is not None:
+            print(f"Patch size: {patch_size[0]} x {patch_size[1]}")
+
     # Create output directory
     if not os.path.exists(args.out_path):
         os.makedirs(args.out_path)
 
     # Generate output filename
     file_name = osp.splitext(osp.basename(args.in_path))
-    output_filename = f"{file_name[0]}_PFT_{args.task}_SRx{args.scale}{file_name[1]}"
+    roi_suffix = "" if args.roi is None else "_roi{}_{}_{}_{}".format(*roi)
+    output_filename = f"{file_name[0]}_PFT_{args.task}_SRx{args.scale}{roi_suffix}{file_name[1]}"
     output_path = os.path.join(args.out_path, output_filename)
 
     # Process image
     print("\nProcessing...")
-    process_image(
-        image, output_path,
-        model, device, args.scale, patch_size
-    )
+    if args.roi is not None:
+        image_output = process_roi(image, roi, model, device, args.scale, args.roi_margin)
+        image_output.save(output_path)
+        print(f"Output size: {image_output.size[0]} x {image_output.size[1]}")
+        print(f"Saved to: {output_path}")
+    else:
+        process_image(
+            image, output_path,
+            model, device, args.scale, patch_size
+        )
 
     print("\nDone!")
 
@@ -0,0 +1 @@
+"""Lean inference entry points for PFT (see pft_sr.infer)."""
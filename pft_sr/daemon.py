@@ -0,0 +1,367 @@
+"""
+Hot-folder daemon
+
+Watches input directories and super-resolves every image dropped into them, with
+one warm model pool for the lifetime of the process (no per-file model load or
+import cost). Jobs are scheduled by priority, then earliest deadline. Images
+larger than --tile are split into tiles that are scheduled one at a time, so a
+small urgent job dropped while a large one is running is interleaved between its
+tiles instead of waiting for it to finish.
+
+Files are picked up once their size and modification time are unchanged between
+two polls (so half-copied files are not read). Outputs are written atomically
+(temporary file + rename) and recorded in a journal in the output directory, so a
+restarted daemon skips completed files.
+
+Each --watch takes comma-separated key=value settings:
+    in        Input directory (required)
+    out       Output directory (default: <in>/results)
+    task      classical | lightweight (default: --task)
+    scale     2 | 3 | 4 (default: --scale)
+    priority  Jobs with a higher priority run first (default: 0)
+    deadline  Seconds after pick-up by which the output is due (default: none)
+
+Usage:
+    python -m pft_sr.daemon --task classical --scale 4 \
+        --watch in=share/urgent,out=share/urgent_sr,priority=10,deadline=30 \
+        --watch in=share/batch,out=share/batch_sr
+"""
+import argparse
+import heapq
+import itertools
+import math
+import os
+import os.path as osp
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+import torch.nn.functional as F
+from torchvision import transforms
+
+from utils.directory_runner import JOURNAL_NAME, Journal, find_images, read_image, save_image_atomic
+from utils.inference import upscale_image
+from utils.model import OPTION_PATH, ModelPool
+from utils.patch_processor import PatchProcessor
+
+
+def parse_watch(value, task, scale):
+    """Parse a --watch value ('in=DIR,out=DIR,priority=N,deadline=SECONDS,task=T,scale=S')"""
+    spec = {'task': task, 'scale': scale, 'priority': 0, 'deadline': None}
+    for item in filter(None, value.split(',')):
+        key, sep, item_value = item.partition('=')
+        if not sep or key not in ('in', 'out', 'task', 'scale', 'priority', 'deadline'):
+            raise ValueError(f"Invalid watch setting: {item}")
+        spec[key] = item_value
+    if 'in' not in spec:
+        raise ValueError(f"Missing input directory (in=...): {value}")
+    spec.setdefault('out', osp.join(spec['in'], 'results'))
+    spec['scale'] = int(spec['scale'])
+    spec['priority'] = int(spec['priority'])
+    spec['deadline'] = None if spec['deadline'] is None else float(spec['deadline'])
+    if spec['task'] not in OPTION_PATH or str(spec['scale']) not in OPTION_PATH[spec['task']]:
+        raise ValueError(f"Unsupported task / scale: {spec['task']} x{spec['scale']}")
+    return spec
+
+
+class Job:
+    """One input image, processed whole or tile by tile"""
+
+    def __init__(self, spec, rel_path, input_path, output_path, seq):
+        self.spec = spec
+        self.rel_path = rel_path
+        self.input_path = input_path
+        self.output_path = output_path
+        self.seq = seq
+        self.discovered = time.time()
+        self.deadline = None if spec['deadline'] is None else self.discovered + spec['deadline']
+        self.started = None
+        self.signature = None
+
+        # tile state (large images)
+        self.size = None
+        self.image = None
+        self.output = None
+        self.plan = None
+        self.remaining = None
+
+    def sort_key(self):
+        """Higher priority first, then earliest deadline, then first discovered"""
+        deadline = self.deadline if self.deadline is not None else math.inf
+        return (-self.spec['priority'], deadline, self.seq)
+
+
+class Scheduler:
+    """Thread-safe priority queue of jobs"""
+
+    def __init__(self):
+        self._heap = []
+        self._cond = threading.Condition()
+
+    def push(self, job):
+        with self._cond:
+            heapq.heappush(self._heap, (job.sort_key(), job))
+            self._cond.notify()
+
+    def pop(self, timeout=None):
+        with self._cond:
+            if not self._heap:
+                self._cond.wait(timeout)
+            if not self._heap:
+                return None
+            return heapq.heappop(self._heap)[1]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class HotFolderDaemon:
+    """Watcher thread -> scheduler -> model (main thread) -> encode threads"""
+
+    def __init__(self, specs, device, pool=None, tile=512, poll=2.0, workers=2, recursive=True):
+        """
+        Args:
+            specs: Watch settings (see parse_watch)
+            device: Device
+            pool: ModelPool (a new one by default)
+            tile: Images with a side above this are processed in tiles of this size
+            poll: Seconds between directory scans
+            workers: Number of encode threads
+            recursive: Also watch sub-directories
+        """
+        self.specs = specs
+        self.device = device
+        self.pool = pool or ModelPool()
+        self.tile = tile
+        self.poll = poll
+        self.recursive = recursive
+        self.scheduler = Scheduler()
+        self.stop = threading.Event()
+
+        self._encoder = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='pft-encode')
+        self._journal_lock = threading.Lock()
+        self._seq = itertools.count()
+        # both only hold files of the last listing; _known entries are dropped once journaled
+        self._seen = {}  # input path -> signature at the last scan
+        self._known = {}  # input path -> signature queued, running or failed (guarded by _journal_lock)
+        self._journals = {}
+        for spec in specs:
+            os.makedirs(spec['out'], exist_ok=True)
+            self._journals[spec['out']] = Journal(osp.join(spec['out'], JOURNAL_NAME))
+
+        self.stats = {'images': 0, 'tiles': 0, 'failed': 0, 'late': 0, 'latency': 0.0}
+
+    @staticmethod
+    def output_name(file, spec):
+        file_name = osp.splitext(file)
+        return f"{file_name[0]}_PFT_{spec['task']}_SRx{spec['scale']}{file_name[1]}"
+
+    # ---------------------------------------------------------------- watcher
+
+    def scan(self):
+        """Queue new (or modified) images whose size and mtime are stable since the last scan"""
+        queued = 0
+        listed = set()
+        for spec in self.specs:
+            if not osp.isdir(spec['in']):
+                continue
+            journal = self._journals[spec['out']]
+            out_root = osp.join(osp.abspath(spec['out']), '')
+            for rel_path in find_images(spec['in'], self.recursive):
+                input_path = osp.join(spec['in'], rel_path)
+                if osp.abspath(input_path).startswith(out_root) or '.tmp.' in osp.basename(rel_path):
+                    continue
+                try:
+                    stat = os.stat(input_path)
+                except OSError:
+                    continue  # removed since the listing
+                listed.add(input_path)
+                signature = (stat.st_size, stat.st_mtime)
+                previous, self._seen[input_path] = self._seen.get(input_path), signature
+                if previous != signature:
+                    continue  # new or still being written: wait for the next scan
+
+                output_path = osp.join(spec['out'], osp.dirname(rel_path),
+                                       self.output_name(osp.basename(rel_path), spec))
+                with self._journal_lock:
+                    if self._known.get(input_path) == signature:
+                        continue
+                    # done with this signature (compared with the stat above, not a new one)
+                    entry = journal.done.get(rel_path)
+                    if (entry is not None and (entry['size'], entry['mtime']) == signature
+                            and osp.exists(output_path)):
+                        continue
+                    self._known[input_path] = signature
+                job = Job(spec, rel_path, input_path, output_path, next(self._seq))
+                job.signature = signature
+                self.scheduler.push(job)
+                queued += 1
+
+        # forget the files that are gone (deleted, moved, or their directory unmounted)
+        for input_path in self._seen.keys() - listed:
+            del self._seen[input_path]
+        with self._journal_lock:
+            for input_path in self._known.keys() - listed:
+                del self._known[input_path]
+        if queued:
+            print(f"Queued {queued} images ({len(self.scheduler)} waiting)")
+
+    def _watch(self):
+        while not self.stop.is_set():
+            try:
+                self.scan()
+            except Exception as e:
+                print(f"Error: scan failed: {e}")
+            self.stop.wait(self.poll)
+
+    # ---------------------------------------------------------------- processing
+
+    def _step(self, job, model):
+        """
+        Run one unit of work of a job: a whole (small) image or one tile
+
+        Returns:
+            PIL Image once the job is complete, else None
+        """
+        scale = job.spec['scale']
+        if job.image is None:
+            image = read_image(job.input_path)
+            job.size = image.size
+            if max(image.size) <= self.tile:
+                return upscale_image(image, model, self.device, scale)
+
+            image_input = transforms.ToTensor()(image).unsqueeze(0).to(next(model.parameters()).dtype)
+            _, C, h, w = image_input.size()
+            mod_pad_h, mod_pad_w, grid, slices, merge_slices = PatchProcessor(self.tile, self.tile).plan(h, w, scale)
+            job.image = F.pad(image_input, (0, mod_pad_w, 0, mod_pad_h), 'reflect')
+            job.output = torch.zeros(1, C, (h + mod_pad_h) * scale, (w + mod_pad_w) * scale)
+            job.plan = (slices, merge_slices)
+            job.remaining = deque(range(len(slices)))
+            print(f"{job.rel_path}: {w} x {h}, {len(slices)} tiles ({grid[0]}x{grid[1]})")
+
+        slices, merge_slices = job.plan
+        idx = job.remaining.popleft()
+        top, left = slices[idx]
+        with torch.no_grad():
+            out = model(job.image[..., top, left].to(self.device)).cpu()
+        top, left, _top, _left = merge_slices[idx]
+        job.output[..., top, left] = out[..., _top, _left]
+        self.stats['tiles'] += 1
+        if job.remaining:
+            return None
+
+        w, h = job.size
+        image_output = job.output[..., :h * scale, :w * scale].clamp(0.0, 1.0)[0]
+        job.image = job.output = None
+        return transforms.ToPILImage()(image_output.float())
+
+    def _finish(self, job, future):
+        try:
+            future.result()
+        except Exception as e:
+            self.stats['failed'] += 1
+            print(f"Error: cannot save {job.output_path}: {e}")
+            return
+        with self._journal_lock:
+            self._journals[job.spec['out']].add(job.rel_path, job.input_path, job.output_path)
+            # the journal skips it from now on (unless the file was modified and queued again meanwhile)
+            if self._known.get(job.input_path) == job.signature:
+                del self._known[job.input_path]
+
+        now = time.time()
+        latency = now - job.discovered
+        self.stats['images'] += 1
+        self.stats['latency'] += latency
+        message = f"Done {job.rel_path} in {latency:.1f}s (waited {job.started - job.discovered:.1f}s)"
+        if job.deadline is not None and now > job.deadline:
+            self.stats['late'] += 1
+            message += f", {now - job.deadline:.1f}s past its deadline"
+        print(message)
+
+    def run(self):
+        print(f"Watching {len(self.specs)} directories on {self.device} (Ctrl+C to stop)")
+        for spec in self.specs:
+            print(f"  {spec['in']} -> {spec['out']} ({spec['task']} x{spec['scale']}, priority {spec['priority']}"
+                  + (f", deadline {spec['deadline']:g}s)" if spec['deadline'] is not None else ")"))
+
+        watcher = threading.Thread(target=self._watch, name='pft-watch', daemon=True)
+        watcher.start()
+        try:
+            while not self.stop.is_set():
+                job = self.scheduler.pop(timeout=self.poll)
+                if job is None:
+                    continue
+                if job.started is None:
+                    job.started = time.time()
+                try:
+                    model = self.pool.get(job.spec['task'], job.spec['scale'], self.device)
+                    image_output = self._step(job, model)
+                except Exception as e:
+                    # not retried until the file changes (its signature stays in _known)
+                    self.stats['failed'] += 1
+                    job.image = job.output = None
+                    print(f"Error: cannot process {job.input_path}: {e}")
+                    continue
+
+                if image_output is None:
+                    self.scheduler.push(job)  # next tile, unless a more urgent job arrived
+                    continue
+                os.makedirs(osp.dirname(osp.abspath(job.output_path)), exist_ok=True)
+                future = self._encoder.submit(save_image_atomic, image_output, job.output_path)
+                future.add_done_callback(lambda f, job=job: self._finish(job, f))
+        except KeyboardInterrupt:
+            print("Stopping")
+        finally:
+            self.stop.set()
+            watcher.join()
+            self._encoder.shutdown(wait=True)
+            for journal in self._journals.values():
+                journal.close()
+            self.print_stats()
+
+    def print_stats(self):
+        images = self.stats['images']
+        mean_latency = self.stats['latency'] / images if images else 0.0
+        print(f"Processed {images} images ({self.stats['tiles']} tiles), {self.stats['failed']} failed, "
+              f"{self.stats['late']} past their deadline, mean latency {mean_latency:.1f}s, "
+              f"{len(self.scheduler)} still queued")
+
+
+def get_parser(**parser_kwargs):
+    parser = argparse.ArgumentParser(**parser_kwargs)
+    parser.add_argument("--watch", type=str, action='append', required=True,
+                        help="Watched directory: in=DIR[,out=DIR][,priority=N][,deadline=SECONDS]"
+                             "[,task=TASK][,scale=S]. Can be given several times.")
+    parser.add_argument("--scale", type=int, default=4, help="Default scale factor for SR.")
+    parser.add_argument(
+        "--task",
+        type=str,
+        default="classical",
+        choices=['classical', 'lightweight'],
+        help="Default task. classical: for classical SR models. lightweight: for lightweight models."
+    )
+    parser.add_argument("--device", type=str, default=None, help="Device (default: cuda if available).")
+    parser.add_argument("--tile", type=int, default=512, help="Images with a side above this are tiled.")
+    parser.add_argument("--poll", type=float, default=2.0, help="Seconds between directory scans.")
+    parser.add_argument("--workers", type=int, default=2, help="Number of encode threads.")
+    parser.add_argument("--no-recursive", action='store_true', help="Do not watch sub-directories.")
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    specs = [parse_watch(value, args.task, args.scale) for value in args.watch]
+    device = args.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+
+    daemon = HotFolderDaemon(specs, device, tile=args.tile, poll=args.poll, workers=args.workers,
+                             recursive=not args.no_recursive)
+    # load the models up front, so the first job does not pay for it
+    for task, scale in sorted({(spec['task'], spec['scale']) for spec in specs}):
+        daemon.pool.get(task, scale, device)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Fast-start PFT inference
+
+Only the standard library is imported at module level; torch, PIL and the PFT
+architecture are imported on first use, and none of the training stack (data,
+losses, metrics, models, tensorboard, lmdb, scipy, skimage) is imported at all.
+
+Usage:
+    python -m pft_sr.infer -i inference_image.png -o results/test/ --scale 4 --task lightweight
+
+    from pft_sr.infer import upscale
+    sr = upscale(Image.open('lr.png').convert('RGB'), task='lightweight', scale=4)
+"""
+import argparse
+import os
+import os.path as osp
+import sys
+
+_models = {}
+
+
+def get_model(task, scale, device):
+    """Load (once per process) the pretrained model of a (task, scale, device)"""
+    key = (task, int(scale), str(device))
+    if key not in _models:
+        from utils.model import load_model
+        _models[key] = load_model(task, scale, device)
+    return _models[key]
+
+
+def _default_device():
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def upscale(image, task='classical', scale=4, device=None, patch_size=None, model=None):
+    """
+    Super-resolve a PIL image
+
+    Args:
+        image: PIL Image (RGB)
+        task: 'classical' or 'lightweight'
+        scale: Upscale factor
+        device: Device or None (cuda if available)
+        patch_size: (width, height) or None (process entire image at once)
+        model: SR model or None (pretrained model of task / scale)
+
+    Returns:
+        PIL Image
+    """
+    import numpy as np
+    import torch
+    from PIL import Image
+
+    device = device or _default_device()
+    if model is None:
+        model = get_model(task, scale, device)
+
+    with torch.no_grad():
+        # HWC uint8 -> 1CHW float in [0, 1] (same as torchvision ToTensor, without importing torchvision)
+        image_input = torch.from_numpy(np.asarray(image, dtype=np.uint8).copy()).permute(2, 0, 1).unsqueeze(0)
+        image_input = image_input.to(next(model.parameters()).dtype).div(255)
+        if patch_size is None:
+            image_output = model(image_input.to(device))
+        else:
+            from utils.patch_processor import PatchProcessor
+            image_output = PatchProcessor(patch_size[0], patch_size[1]).process(image_input, model, device, scale)
+        # same quantization as torchvision ToPILImage
+        image_output = image_output.clamp(0.0, 1.0)[0].float().mul(255).byte().permute(1, 2, 0).cpu().numpy()
+
+    return Image.fromarray(image_output)
+
+
+def get_parser(**parser_kwargs):
+    parser = argparse.ArgumentParser(**parser_kwargs)
+    parser.add_argument("-i", "--in_path", type=str, required=True, help="Input image path(s).", nargs='+')
+    parser.add_argument("-o", "--out_path", type=str, default="results/test/", help="Output directory path.")
+    parser.add_argument("--scale", type=int, default=4, help="Scale factor for SR.")
+    parser.add_argument(
+        "--task",
+        type=str,
+        default="classical",
+        choices=['classical', 'lightweight'],
+        help="Task for the model. classical: for classical SR models. lightweight: for lightweight models."
+    )
+    parser.add_argument("--patch", type=str, default="none",
+                        help="Patch size. none: process the entire image at once. Or an explicit size, e.g. 256.")
+    parser.add_argument("--device", type=str, default=None, help="Device (default: cuda if available).")
+    return parser
+
+
+def main(argv=None):
+    # Parse the arguments before importing anything heavy, so --help and errors are instant
+    args = get_parser().parse_args(argv)
+
+    from PIL import Image
+
+    patch_size = None
+    if args.patch != 'none':
+        from utils.patch_calibration import parse_patch_size
+        patch_size = parse_patch_size(args.patch)
+
+    device = args.device or _default_device()
+    os.makedirs(args.out_path, exist_ok=True)
+    for in_path in args.in_path:
+        if not osp.isfile(in_path):
+            print(f"Error: Input file not found: {in_path}", file=sys.stderr)
+            continue
+        file_name = osp.splitext(osp.basename(in_path))
+        out_path = osp.join(args.out_path, f"{file_name[0]}_PFT_{args.task}_SRx{args.scale}{file_name[1]}")
+        image_output = upscale(Image.open(in_path).convert('RGB'), args.task, args.scale, device, patch_size)
+        image_output.save(out_path)
+        print(f"Saved to: {out_path}")
+
+
+if __name__ == "__main__":
+    main()
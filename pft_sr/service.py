@@ -0,0 +1,469 @@
+"""
+Local HTTP inference service with dynamic micro-batching
+
+Requests are queued, and compatible ones (same task and scale, same input shape
+after rounding up to a multiple of --bucket pixels) are run through the model as
+one batch, collected within a latency window of --max-delay milliseconds. Images
+are padded to their bucket the same way PFT pads to its window size, so with the
+default bucket (the window size, 32) batched results are identical to unbatched
+ones; larger buckets batch more requests together, at the cost of small
+differences along the bottom / right border.
+
+The number of waiting requests is bounded (--max-queue): when the queue is full,
+requests are rejected immediately with 503 and a Retry-After header.
+
+Endpoints:
+    POST /upscale?task=classical&scale=4    body: encoded image, response: PNG
+    GET  /metrics                           latency percentiles, queue depth, batch sizes (JSON)
+    GET  /health
+
+Usage:
+    python -m pft_sr.service --port 8000 --device cpu --preload lightweight:4
+    curl --data-binary @inference_image.png "http://127.0.0.1:8000/upscale?task=lightweight&scale=4" -o sr.png
+"""
+import argparse
+import asyncio
+import http.client
+import io
+import itertools
+import json
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import torch
+from PIL import Image
+
+from utils.model import OPTION_PATH, ModelPool
+from utils.patch_calibration import fit_batch_size
+from utils.patch_processor import PatchProcessor
+
+WINDOW_SIZE = 32
+
+
+class _Job:
+    """One queued request"""
+
+    __slots__ = ('key', 'array', 'future', 'received', 'queued')
+
+    def __init__(self, key, array, future, received):
+        self.key = key
+        self.array = array
+        self.future = future
+        self.received = received
+        self.queued = time.perf_counter()
+
+
+def _percentiles(values, percents=(50, 90, 99)):
+    if not values:
+        return {f"p{p}": None for p in percents}
+    return {f"p{p}": round(float(v) * 1000, 2) for p, v in zip(percents, np.percentile(list(values), percents))}
+
+
+class InferenceService:
+    """
+    asyncio HTTP server in front of a micro-batching scheduler
+
+    The event loop only parses requests and schedules work: images are decoded and
+    encoded in a thread pool, and the model runs in a single inference thread, one
+    batch at a time. While a batch runs, new requests accumulate and are grouped by
+    batch key (task, scale, bucketed shape); the oldest group runs next.
+    """
+
+    def __init__(self, device='cpu', pool=None, max_batch=8, max_delay=0.01, max_queue=64, bucket=WINDOW_SIZE,
+                 max_pixels=512 * 512, patch_size=None, io_workers=4, max_body=64 * 1024 ** 2, window=10000,
+                 mem_budget=None):
+        """
+        Args:
+            device: Device
+            pool: ModelPool (a new one by default)
+            max_batch: Maximum number of images per batch
+            max_delay: Latency window (seconds) to wait for compatible requests
+            max_queue: Maximum number of waiting requests (more are rejected with 503)
+            bucket: Input shapes are rounded up to a multiple of bucket pixels (batch key)
+            max_pixels: Larger images are not batched (and processed in patches if patch_size is set)
+            patch_size: (width, height) or None
+            io_workers: Number of decode / encode threads
+            max_body: Maximum request body size in bytes
+            window: Number of recent requests the latency percentiles are computed over
+            mem_budget: Memory budget in bytes or None. Batches are split into chunks whose
+                estimated peak memory (PFT.memory) fits it.
+        """
+        self.device = device
+        self.pool = pool or ModelPool()
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.bucket = bucket
+        self.max_pixels = max_pixels
+        self.patch_size = patch_size
+        self.max_body = max_body
+        self.mem_budget = mem_budget
+
+        self._io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='pft-io')
+        self._inference = ThreadPoolExecutor(max_workers=1, thread_name_prefix='pft-inference')
+        self._queue = None  # created on the running loop in start()
+        self._pending = {}  # batch key -> deque of jobs, in arrival order
+        self._solo_ids = itertools.count()
+        self._server = None
+        self._batcher = None
+
+        # metrics
+        self.waiting = 0
+        self.max_waiting = 0
+        self.running = 0
+        self.requests = 0
+        self.rejected = 0
+        self.errors = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.latency = deque(maxlen=window)
+        self.queue_time = deque(maxlen=window)
+        self.batch_time = deque(maxlen=window)
+        self.started = time.time()
+
+    # ---------------------------------------------------------------- scheduling
+
+    def batch_key(self, task, scale, array):
+        h, w = array.shape[:2]
+        if h * w > self.max_pixels:
+            return (task, scale, None, next(self._solo_ids))
+        bucket_h = -(-h // self.bucket) * self.bucket
+        bucket_w = -(-w // self.bucket) * self.bucket
+        return (task, scale, (bucket_h, bucket_w), None)
+
+    def _add(self, job):
+        self._pending.setdefault(job.key, deque()).append(job)
+
+    def _drain(self):
+        while True:
+            try:
+                self._add(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return
+
+    async def _batch_loop(self):
+        while True:
+            self._drain()
+            if not any(self._pending.values()):
+                self._add(await self._queue.get())
+                continue
+
+            # the group with the oldest request runs next, once it is full or its window has passed
+            key = min((k for k, jobs in self._pending.items() if jobs), key=lambda k: self._pending[k][0].queued)
+            jobs = self._pending[key]
+            deadline = jobs[0].queued + self.max_delay
+            while len(jobs) < self.max_batch and key[3] is None:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    self._add(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            batch = [jobs.popleft() for _ in range(min(len(jobs), self.max_batch))]
+            if not jobs:
+                del self._pending[key]
+            await self._run_batch(key, batch)
+
+    async def _run_batch(self, key, batch):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        self.waiting -= len(batch)
+        self.running = len(batch)
+        for job in batch:
+            self.queue_time.append(start - job.queued)
+        try:
+            outputs = await loop.run_in_executor(self._inference, self._infer, key, [job.array for job in batch])
+        except Exception as e:
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+        finally:
+            self.running = 0
+        self.batches += 1
+        self.batch_sizes[len(batch)] += 1
+        self.batch_time.append(time.perf_counter() - start)
+        for job, output in zip(batch, outputs):
+            if not job.future.done():  # the client may have disconnected
+                job.future.set_result(output)
+
+    def _infer(self, key, arrays):
+        """Run one batch (inference thread): list of HWC uint8 arrays -> list of HWC uint8 arrays"""
+        task, scale, shape, _ = key
+        model = self.pool.get(task, scale, self.device)
+        dtype = next(model.parameters()).dtype
+
+        if shape is None:
+            batch = arrays[0][None]
+        else:
+            # symmetric padding, as PFT pads its input to the window size
+            batch = np.stack([np.pad(a, ((0, shape[0] - a.shape[0]), (0, shape[1] - a.shape[1]), (0, 0)),
+                                     mode='symmetric') for a in arrays])
+
+        with torch.no_grad():
+            image_input = torch.from_numpy(batch).permute(0, 3, 1, 2).to(dtype).div(255)
+            if shape is None and self.patch_size is not None:
+                image_output = PatchProcessor(self.patch_size[0], self.patch_size[1]).process(
+                    image_input, model, self.device, scale)
+            else:
+                chunk = fit_batch_size(model, image_input.shape[-2:], self.mem_budget, len(image_input))
+                image_output = torch.cat([model(part.to(self.device)) for part in image_input.split(chunk)])
+            # same quantization as torchvision ToPILImage
+            image_output = image_output.clamp(0.0, 1.0).float().mul(255).byte().permute(0, 2, 3, 1).cpu().numpy()
+
+        return [image_output[i, :a.shape[0] * scale, :a.shape[1] * scale] for i, a in enumerate(arrays)]
+
+    # ---------------------------------------------------------------- requests
+
+    @staticmethod
+    def _decode(data):
+        image = Image.open(io.BytesIO(data))
+        return np.asarray(image.convert('RGB'), dtype=np.uint8)
+
+    @staticmethod
+    def _encode(array):
+        buffer = io.BytesIO()
+        Image.fromarray(array).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    async def upscale(self, data, task, scale):
+        """
+        Queue one encoded image and wait for its result
+
+        Returns:
+            (HTTP status, content type, body)
+        """
+        received = time.perf_counter()
+        if task not in OPTION_PATH or str(scale) not in OPTION_PATH[task]:
+            return HTTPStatus.BAD_REQUEST, 'text/plain', f"Unsupported task / scale: {task} x{scale}".encode()
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            return HTTPStatus.SERVICE_UNAVAILABLE, 'text/plain', b"Queue is full"
+
+        # reserve a queue slot before decoding, so decoding is bounded too
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        loop = asyncio.get_running_loop()
+        try:
+            array = await loop.run_in_executor(self._io, self._decode, data)
+        except Exception as e:
+            self.waiting -= 1
+            return HTTPStatus.BAD_REQUEST, 'text/plain', f"Cannot decode image: {e}".encode()
+
+        job = _Job(self.batch_key(task, scale, array), array, loop.create_future(), received)
+        self._queue.put_nowait(job)
+        self.requests += 1
+        try:
+            output = await job.future
+            body = await loop.run_in_executor(self._io, self._encode, output)
+        except Exception as e:
+            self.errors += 1
+            return HTTPStatus.INTERNAL_SERVER_ERROR, 'text/plain', f"Inference failed: {e}".encode()
+        self.latency.append(time.perf_counter() - received)
+        return HTTPStatus.OK, 'image/png', body
+
+    def metrics(self):
+        elapsed = time.time() - self.started
+        served = sum(self.batch_sizes.values())
+        return {
+            'uptime': round(elapsed, 1),
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'queue_depth': self.waiting,
+            'max_queue_depth': self.max_waiting,
+            'running': self.running,
+            'batches': self.batches,
+            'mean_batch_size': round(served / self.batches, 2) if self.batches else None,
+            'batch_sizes': {str(k): v for k, v in sorted(self.batch_sizes.items())},
+            'latency_ms': _percentiles(self.latency),
+            'queue_ms': _percentiles(self.queue_time),
+            'batch_ms': _percentiles(self.batch_time),
+            'models': len(self.pool),
+        }
+
+    async def _route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health' and method == 'GET':
+            return HTTPStatus.OK, 'application/json', b'{"status": "ok"}'
+        if url.path == '/metrics' and method == 'GET':
+            return HTTPStatus.OK, 'application/json', json.dumps(self.metrics()).encode()
+        if url.path == '/upscale':
+            if method != 'POST':
+                return HTTPStatus.METHOD_NOT_ALLOWED, 'text/plain', b"Use POST"
+            query = parse_qs(url.query)
+            task = query.get('task', ['classical'])[0]
+            try:
+                scale = int(query.get('scale', ['4'])[0])
+            except ValueError:
+                return HTTPStatus.BAD_REQUEST, 'text/plain', b"Invalid scale"
+            return await self.upscale(body, task, scale)
+        return HTTPStatus.NOT_FOUND, 'text/plain', b"Not found"
+
+    async def _handle(self, reader, writer):
+        """Minimal HTTP/1.1 connection handler (keep-alive, Content-Length bodies)"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                except ValueError:
+                    status, content_type, payload = HTTPStatus.BAD_REQUEST, 'text/plain', b"Bad request"
+                    version, length = 'HTTP/1.0', None
+                if length is not None and length > self.max_body:
+                    status, content_type, payload = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'text/plain', b"Too large"
+                    version = 'HTTP/1.0'
+                elif length is not None:
+                    body = await reader.readexactly(length) if length else b''
+                    status, content_type, payload = await self._route(method, target, body)
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                response = [f"HTTP/1.1 {status.value} {status.phrase}",
+                            f"Content-Type: {content_type}",
+                            f"Content-Length: {len(payload)}",
+                            f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                if status == HTTPStatus.SERVICE_UNAVAILABLE:
+                    response.append(f"Retry-After: {max(1, round(self.max_delay * self.max_queue))}")
+                writer.write(('\r\n'.join(response) + '\r\n\r\n').encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # ---------------------------------------------------------------- lifecycle
+
+    async def preload(self, models):
+        """Load (task, scale) models into the pool before serving"""
+        loop = asyncio.get_running_loop()
+        for task, scale in models:
+            start = time.perf_counter()
+            await loop.run_in_executor(self._inference, self.pool.get, task, scale, self.device)
+            print(f"Loaded {task} x{scale} in {time.perf_counter() - start:.2f}s")
+
+    async def start(self, host='127.0.0.1', port=8000):
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._batch_loop())
+        self._server = await asyncio.start_server(self._handle, host, port)
+        return self._server
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._batcher is not None:
+            self._batcher.cancel()
+        self._io.shutdown(wait=False)
+        self._inference.shutdown(wait=False)
+
+
+def request_upscale(data, task='classical', scale=4, host='127.0.0.1', port=8000, timeout=600):
+    """
+    Client helper: send an encoded image to a running service
+
+    Returns:
+        (HTTP status code, response body)
+    """
+    connection = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        connection.request('POST', f"/upscale?task={task}&scale={scale}", body=data,
+                           headers={'Content-Type': 'application/octet-stream'})
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def parse_model_list(value):
+    """Parse 'task:scale,task:scale'"""
+    models = []
+    for item in filter(None, value.split(',')):
+        task, _, scale = item.partition(':')
+        if task not in OPTION_PATH or scale not in OPTION_PATH[task]:
+            raise ValueError(f"Invalid model: {item} (expected task:scale, e.g. lightweight:4)")
+        models.append((task, int(scale)))
+    return models
+
+
+def get_parser(**parser_kwargs):
+    parser = argparse.ArgumentParser(**parser_kwargs)
+    parser.add_argument("--host", type=str, default="127.0.0.1", help="Address to listen on.")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on.")
+    parser.add_argument("--device", type=str, default=None, help="Device (default: cuda if available).")
+    parser.add_argument("--preload", type=str, default="",
+                        help="Models to load at startup, e.g. classical:4,lightweight:2.")
+    parser.add_argument("--max-batch", type=int, default=8, help="Maximum number of images per batch.")
+    parser.add_argument("--max-delay", type=float, default=10,
+                        help="Latency window (ms) to collect compatible requests into a batch.")
+    parser.add_argument("--max-queue", type=int, default=64,
+                        help="Maximum number of waiting requests (more are rejected with 503).")
+    parser.add_argument("--bucket", type=int, default=WINDOW_SIZE,
+                        help="Round input shapes up to a multiple of this for batching.")
+    parser.add_argument("--max-pixels", type=int, default=512 * 512,
+                        help="Images with more pixels are not batched.")
+    parser.add_argument("--patch", type=str, default="none",
+                        help="Patch size for images above --max-pixels. none: process them at once.")
+    parser.add_argument("--mem-budget", type=str, default=None,
+                        help="Split batches whose estimated peak memory exceeds this, e.g. 4G (plain numbers "
+                             "are MB).")
+    parser.add_argument("--workers", type=int, default=4, help="Number of decode / encode threads.")
+    parser.add_argument("--random-weights", action='store_true',
+                        help="Do not load pretrained weights (for testing without checkpoints).")
+    return parser
+
+
+async def serve(args):
+    from utils.patch_calibration import parse_mem_budget, parse_patch_size
+
+    device = args.device or ('cuda' if torch.cuda.is_available() else 'cpu')
+    service = InferenceService(
+        device=device,
+        pool=ModelPool(pretrained=not args.random_weights),
+        max_batch=args.max_batch,
+        max_delay=args.max_delay / 1000,
+        max_queue=args.max_queue,
+        bucket=args.bucket,
+        max_pixels=args.max_pixels,
+        patch_size=None if args.patch == 'none' else parse_patch_size(args.patch),
+        io_workers=args.workers,
+        mem_budget=parse_mem_budget(args.mem_budget),
+    )
+    await service.preload(parse_model_list(args.preload))
+    server = await service.start(args.host, args.port)
+    print(f"Serving on http://{args.host}:{args.port} ({device}, max batch {args.max_batch}, "
+          f"window {args.max_delay:g} ms, queue {args.max_queue})")
+    try:
+        await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,53 @@
-from .roi_selector import select_roi
-from .model import load_model
-from .inference import process_image
-from .patch_settings_gui import select_patch_settings
+import importlib
+
+# Public names and the modules defining them. Modules are imported lazily on first access
+# (PEP 562), so headless entry points do not import the GUI toolkits (tkinter, cv2 windows).
+_LAZY_NAMES = {
+    'select_roi': 'roi_selector',
+    'process_roi': 'roi',
+    'parse_roi': 'roi',
+    'roi_context_box': 'roi',
+    'load_model': 'model',
+    'ModelPool': 'model',
+    'process_image': 'inference',
+    'upscale_image': 'inference',
+    'ResultCache': 'result_cache',
+    'select_patch_settings': 'patch_settings_gui',
+    'select_patch_auto': 'patch_calibration',
+    'estimate_patch_size': 'patch_calibration',
+    'parse_mem_budget': 'patch_calibration',
+    'parse_patch_size': 'patch_calibration',
+    'process_video': 'video',
+    'ShardedRunner': 'sharding',
+}
 
 __all__ = [
     'select_roi',
+    'process_roi',
+    'parse_roi',
+    'roi_context_box',
     'load_model',
+    'ModelPool',
     'process_image',
+    'upscale_image',
+    'ResultCache',
     'select_patch_settings',
+    'select_patch_auto',
+    'estimate_patch_size',
+    'parse_mem_budget',
+    'parse_patch_size',
+    'process_video',
+    'ShardedRunner',
 ]
+
+
+def __getattr__(name):
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module(f'.{_LAZY_NAMES[name]}', __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_NAMES))
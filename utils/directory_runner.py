@@ -0,0 +1,198 @@
+import json
+import os
+import os.path as osp
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from .inference import upscale_image
+
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp')
+JOURNAL_NAME = '.pft_journal.jsonl'
+
+
+def find_images(root, recursive=True):
+    """Image paths under root (relative to root, sorted), extensions matched case-insensitively"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for file in sorted(filenames):
+            if file.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(osp.relpath(osp.join(dirpath, file), root))
+        if not recursive:
+            break
+    return paths
+
+
+class Journal:
+    """
+    Append-only record of completed outputs, used to resume an interrupted run
+
+    An entry is only written after its output has been atomically saved, and it
+    records the input size and modification time, so edited inputs are redone.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if osp.exists(path):
+            with open(path, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # partially written last line of a killed run
+                    self.done[entry['input']] = entry
+        self._file = open(path, 'a')
+
+    @staticmethod
+    def _signature(input_path):
+        stat = os.stat(input_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def is_done(self, rel_path, input_path, output_path):
+        entry = self.done.get(rel_path)
+        if entry is None or not osp.exists(output_path):
+            return False
+        signature = self._signature(input_path)
+        return entry['size'] == signature['size'] and entry['mtime'] == signature['mtime']
+
+    def add(self, rel_path, input_path, output_path):
+        entry = {'input': rel_path, 'output': output_path}
+        entry.update(self._signature(input_path))
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self.done[rel_path] = entry
+
+    def close(self):
+        self._file.close()
+
+
+def read_image(input_path):
+    """Decode an image file to an RGB PIL Image"""
+    image = Image.open(input_path)
+    image.load()
+    return image.convert('RGB')
+
+
+def save_image_atomic(image, output_path):
+    """Write to a temporary file first, so a killed run never leaves a truncated output"""
+    root, ext = osp.splitext(output_path)
+    tmp_path = f"{root}.tmp{ext}"
+    image.save(tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def process_directory(in_dir, out_dir, model, device, scale, output_name, patch_size_fn=None, cache=None,
+                      workers=4, recursive=True, resume=True):
+    """
+    Super-resolve every image in a directory
+
+    Decoding and encoding run in a thread pool and overlap with the model, which
+    runs on the calling thread. Completed outputs are recorded in a journal in
+    out_dir, so a re-run skips them.
+
+    Args:
+        in_dir: Input directory
+        out_dir: Output directory (the input sub-directory structure is kept)
+        model: SR model
+        device: Device
+        scale: Upscale factor
+        output_name: callable(file_name) -> output file name
+        patch_size_fn: callable((width, height)) -> patch size or None
+        cache: ResultCache or None
+        workers: Number of decode / encode threads
+        recursive: Also process sub-directories
+        resume: Skip outputs recorded in the journal
+
+    Returns:
+        dict: Run statistics ('first_output' is the perf_counter time the first output was saved)
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    journal_path = osp.join(out_dir, JOURNAL_NAME)
+    if not resume and osp.exists(journal_path):
+        os.remove(journal_path)
+    journal = Journal(journal_path)
+
+    jobs = []
+    skipped = 0
+    out_root = osp.join(osp.abspath(out_dir), '')
+    for rel_path in find_images(in_dir, recursive):
+        input_path = osp.join(in_dir, rel_path)
+        if osp.abspath(input_path).startswith(out_root):
+            continue  # outputs of a previous run inside the input directory
+        output_path = osp.join(out_dir, osp.dirname(rel_path), output_name(osp.basename(rel_path)))
+        if journal.is_done(rel_path, input_path, output_path):
+            skipped += 1
+        else:
+            jobs.append((rel_path, input_path, output_path))
+    print(f"Found {len(jobs) + skipped} images, {skipped} already done, {len(jobs)} to process")
+
+    stats = {'images': 0, 'skipped': skipped, 'input_mpix': 0.0, 'output_mpix': 0.0, 'failed': 0,
+             'first_output': None}
+    start = time.perf_counter()
+    max_pending = max(1, workers) * 2
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        decoding = deque()
+        encoding = deque()
+        next_job = 0
+
+        def finish_encode():
+            # an image counts as processed (or failed) only once its output is saved
+            rel_path, input_path, output_path, future, input_mpix, output_mpix = encoding.popleft()
+            try:
+                future.result()
+                journal.add(rel_path, input_path, output_path)
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"Error: cannot save {output_path}: {e}")
+                return
+            if stats['first_output'] is None:
+                stats['first_output'] = time.perf_counter()
+            stats['images'] += 1
+            stats['input_mpix'] += input_mpix
+            stats['output_mpix'] += output_mpix
+
+        while next_job < len(jobs) or decoding:
+            # Keep a bounded number of images decoding ahead of the model
+            while next_job < len(jobs) and len(decoding) < max_pending:
+                job = jobs[next_job]
+                decoding.append((job, pool.submit(read_image, job[1])))
+                next_job += 1
+
+            (rel_path, input_path, output_path), future = decoding.popleft()
+            try:
+                image = future.result()
+            except Exception as e:
+                stats['failed'] += 1
+                print(f"Error: cannot read {input_path}: {e}")
+                continue
+
+            print(f"[{stats['images'] + stats['failed'] + len(encoding) + 1}/{len(jobs)}] {rel_path}")
+            patch_size = patch_size_fn(image.size) if patch_size_fn is not None else None
+            image_output = upscale_image(image, model, device, scale, patch_size, cache)
+
+            os.makedirs(osp.dirname(output_path), exist_ok=True)
+            future = pool.submit(save_image_atomic, image_output, output_path)
+            encoding.append((rel_path, input_path, output_path, future, image.size[0] * image.size[1] / 1e6,
+                             image_output.size[0] * image_output.size[1] / 1e6))
+            while len(encoding) > max_pending or (encoding and encoding[0][3].done()):
+                finish_encode()
+
+        while encoding:
+            finish_encode()
+
+    journal.close()
+    stats['seconds'] = time.perf_counter() - start
+
+    seconds = max(stats['seconds'], 1e-9)
+    print(f"Processed {stats['images']} images in {stats['seconds']:.1f}s "
+          f"({stats['skipped']} skipped, {stats['failed']} failed): "
+          f"{stats['images'] / seconds:.2f} images/s, "
+          f"{stats['input_mpix'] / seconds:.3f} MP/s input, {stats['output_mpix'] / seconds:.3f} MP/s output")
+
+    return stats
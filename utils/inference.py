@@ -1,41 +1,77 @@
+import numpy as np
 import torch
+from PIL import Image
 from torchvision import transforms
 
 from .patch_processor import PatchProcessor
+from .result_cache import content_digest, model_digest
 
 
-def process_image(image, output_path, model, device, scale, patch_size=None):
+def upscale_image(image, model, device, scale, patch_size=None, cache=None):
     """
-    Process image to generate SR image
+    Generate SR image
 
     Args:
         image: PIL Image
-        output_path: Output image path
         model: SR model
         device: Device
         scale: Upscale factor
         patch_size: (width, height) or None (process entire image at once)
+        cache: ResultCache or None. Whole images are cached by content, model and
+            patch settings; in patch mode, patches are cached as well.
+
+    Returns:
+        PIL Image
     """
-    with torch.no_grad():
-        print(f"Input size: {image.size[0]} x {image.size[1]}")
+    key = None
+    if cache is not None:
+        key = cache.make_key('image', content_digest(np.asarray(image)), model_digest(model), scale, patch_size)
+        cached = cache.get(key)
+        if cached is not None:
+            print("Cache hit")
+            return Image.fromarray(cached)
 
-        # Convert to tensor
-        image_input = transforms.ToTensor()(image).unsqueeze(0).to(device)
+    with torch.no_grad():
+        # Convert to tensor (in the model dtype)
+        image_input = transforms.ToTensor()(image).unsqueeze(0).to(next(model.parameters()).dtype)
 
         # Inference
         if patch_size is None:
             # Process entire image at once
-            image_output = model(image_input).clamp(0.0, 1.0)[0].cpu()
+            image_output = model(image_input.to(device)).clamp(0.0, 1.0)[0].cpu()
         else:
-            # Patch-based processing
+            # Patch-based processing (patches are moved to the device by the processor)
             print(f"Patch mode: {patch_size[0]} x {patch_size[1]}")
-            processor = PatchProcessor(patch_size[0], patch_size[1])
+            processor = PatchProcessor(patch_size[0], patch_size[1], cache=cache)
             image_output = processor.process(image_input, model, device, scale)
             image_output = image_output.clamp(0.0, 1.0)[0].cpu()
 
-        # Save result
-        image_output = transforms.ToPILImage()(image_output)
-        image_output.save(output_path)
+    image_output = transforms.ToPILImage()(image_output.float())
+    if key is not None:
+        cache.put(key, np.asarray(image_output))
+
+    return image_output
+
+
+def process_image(image, output_path, model, device, scale, patch_size=None, cache=None):
+    """
+    Process image to generate SR image
+
+    Args:
+        image: PIL Image
+        output_path: Output image path
+        model: SR model
+        device: Device
+        scale: Upscale factor
+        patch_size: (width, height) or None (process entire image at once)
+        cache: ResultCache or None
+    """
+    print(f"Input size: {image.size[0]} x {image.size[1]}")
+
+    image_output = upscale_image(image, model, device, scale, patch_size, cache)
+
+    # Save result
+    image_output.save(output_path)
 
-        print(f"Output size: {image_output.size[0]} x {image_output.size[1]}")
-        print(f"Saved to: {output_path}")
+    print(f"Output size: {image_output.size[0]} x {image_output.size[1]}")
+    print(f"Saved to: {output_path}")
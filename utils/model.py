@@ -1,67 +1,172 @@
+import os.path as osp
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
 import torch
+import yaml
 from basicsr.archs.pft_arch import PFT
 
 
-MODEL_PATH = {
+ROOT_PATH = osp.dirname(osp.dirname(osp.abspath(__file__)))
+
+OPTION_PATH = {
     "classical": {
-        "2": "experiments/pretrained_models/001_PFT_SRx2_scratch.pth",
-        "3": "experiments/pretrained_models/002_PFT_SRx3_finetune.pth",
-        "4": "experiments/pretrained_models/003_PFT_SRx4_finetune.pth",
+        "2": "options/test/001_PFT_SRx2_scratch.yml",
+        "3": "options/test/002_PFT_SRx3_finetune.yml",
+        "4": "options/test/003_PFT_SRx4_finetune.yml",
     },
     "lightweight": {
-        "2": "experiments/pretrained_models/101_PFT_light_SRx2_scratch.pth",
-        "3": "experiments/pretrained_models/102_PFT_light_SRx3_finetune.pth",
-        "4": "experiments/pretrained_models/103_PFT_light_SRx4_finetune.pth",
+        "2": "options/test/101_PFT_light_SRx2_scratch.yml",
+        "3": "options/test/102_PFT_light_SRx3_finetune.yml",
+        "4": "options/test/103_PFT_light_SRx4_finetune.yml",
     }
 }
 
 
-def load_model(task, scale, device):
-    if task == 'classical':
-        model = PFT(
-            upscale=scale,
-            embed_dim=240,
-            depths=[4, 4, 4, 6, 6, 6],
-            num_heads=6,
-            num_topk=[1024, 1024, 1024, 1024,
-                      256, 256, 256, 256,
-                      128, 128, 128, 128,
-                      64, 64, 64, 64, 64, 64,
-                      32, 32, 32, 32, 32, 32,
-                      16, 16, 16, 16, 16, 16],
-            window_size=32,
-            convffn_kernel_size=7,
-            mlp_ratio=2,
-            upsampler='pixelshuffle',
-            use_checkpoint=False,
-        )
-    elif task == 'lightweight':
-        model = PFT(
-            upscale=scale,
-            embed_dim=52,
-            depths=[2, 4, 6, 6, 6],
-            num_heads=4,
-            num_topk=[1024, 1024,
-                      256, 256, 256, 256,
-                      128, 128, 128, 128, 128, 128,
-                      64, 64, 64, 64, 64, 64,
-                      32, 32, 32, 32, 32, 32],
-            window_size=32,
-            convffn_kernel_size=7,
-            mlp_ratio=1,
-            upsampler='pixelshuffledirect',
-            use_checkpoint=False,
-        )
-    else:
+def _resolve(path):
+    """Paths in the option files are relative to the repository root"""
+    if osp.isabs(path) or osp.exists(path):
+        return path
+    return osp.join(ROOT_PATH, path)
+
+
+def load_options(task, scale):
+    """Load the test option file of a (task, scale) pair"""
+    if task not in OPTION_PATH:
         raise ValueError(f"Unknown task: {task}")
+    if str(scale) not in OPTION_PATH[task]:
+        raise ValueError(f"Unsupported scale for {task}: {scale}")
+    with open(_resolve(OPTION_PATH[task][str(scale)]), 'r') as f:
+        return yaml.safe_load(f)
+
+
+def checkpoint_path(task, scale):
+    """Pretrained weights path of a (task, scale) pair"""
+    return _resolve(load_options(task, scale)['path']['pretrain_network_g'])
+
+
+def build_model(opt):
+    """Build PFT from the network_g block of an option dict"""
+    network_opt = dict(opt['network_g'])
+    network_type = network_opt.pop('type')
+    if network_type != 'PFT':
+        raise ValueError(f"Unsupported network type: {network_type}")
+    network_opt['use_checkpoint'] = False
+    return PFT(**network_opt)
+
+
+def load_state_dict(load_path, param_key='params_ema'):
+    """
+    Load a checkpoint with memory-mapped (zero-copy) reads
+
+    Tensors stay backed by the page cache of the checkpoint file until they are
+    copied, so loading does not read the whole file into RAM first, and processes
+    loading the same checkpoint share its pages.
+    """
+    try:
+        load_net = torch.load(load_path, map_location='cpu', mmap=True, weights_only=True)
+    except (RuntimeError, TypeError, pickle.UnpicklingError):
+        # weights_only rejects checkpoints holding non-tensor objects (UnpicklingError), which loaded with the
+        # torch < 2.6 default; legacy (non-zipfile) checkpoints cannot be memory-mapped
+        try:
+            load_net = torch.load(load_path, map_location='cpu', mmap=True, weights_only=False)
+        except (RuntimeError, TypeError):
+            load_net = torch.load(load_path, map_location='cpu', weights_only=False)
+    if param_key is not None:
+        if param_key not in load_net and 'params' in load_net:
+            param_key = 'params'
+        load_net = load_net[param_key]
+    return load_net
+
+
+def load_model(task, scale, device, dtype=torch.float32, pretrained=True):
+    """
+    Build PFT from its test option file and load the pretrained weights
 
-    state_dict = torch.load(
-        MODEL_PATH[task][str(scale)],
-        map_location=device,
-        weights_only=False
-    )['params_ema']
-    model.load_state_dict(state_dict, strict=True)
-    model = model.to(device)
+    Args:
+        task: 'classical' or 'lightweight'
+        scale: Upscale factor
+        device: Device
+        dtype: Model dtype
+        pretrained: Load the pretrained weights (False keeps the random initialization,
+            e.g. for benchmarks and tests without checkpoints)
+
+    Returns:
+        model: SR model in eval mode, with load timings in model.load_stats
+    """
+    start = time.perf_counter()
+    opt = load_options(task, scale)
+    model = build_model(opt)
+    built = time.perf_counter()
+
+    if pretrained:
+        path_opt = opt['path']
+        state_dict = load_state_dict(_resolve(path_opt['pretrain_network_g']),
+                                     path_opt.get('param_key_g', 'params_ema'))
+        # assign=True keeps CPU parameters memory-mapped instead of copying them
+        on_cpu = str(device) == 'cpu' and dtype == torch.float32
+        model.load_state_dict(state_dict, strict=path_opt.get('strict_load_g', True), assign=on_cpu)
+    model = model.to(device=device, dtype=dtype)
     model.eval()
+    loaded = time.perf_counter()
 
+    model.load_stats = {'build': built - start, 'load': loaded - built, 'total': loaded - start}
     return model
+
+
+class ModelPool:
+    """
+    In-process pool of loaded models keyed by (task, scale, dtype, device)
+
+    The least recently used models are evicted when the parameter memory of the
+    pool exceeds max_bytes (or the pool holds more than max_models models).
+    """
+
+    def __init__(self, max_bytes=None, max_models=None, pretrained=True):
+        self.max_bytes = max_bytes
+        self.max_models = max_models
+        self.pretrained = pretrained
+        self.total_bytes = 0
+        self.loads = 0
+        self.hits = 0
+        self._models = OrderedDict()  # key -> (model, bytes), least recently used first
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _model_bytes(model):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def get(self, task, scale, device, dtype=torch.float32):
+        key = (task, int(scale), str(dtype), str(device))
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return self._models[key][0]
+
+            model = load_model(task, scale, device, dtype, self.pretrained)
+            size = self._model_bytes(model)
+            self._models[key] = (model, size)
+            self.total_bytes += size
+            self.loads += 1
+            self._evict()
+        return model
+
+    def _evict(self):
+        while len(self._models) > 1 and (
+                (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+                or (self.max_models is not None and len(self._models) > self.max_models)):
+            key, (model, size) = self._models.popitem(last=False)
+            self.total_bytes -= size
+            print(f"Model pool: evicted {key}")
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, key):
+        return key in self._models
@@ -0,0 +1,323 @@
+import json
+import os
+import os.path as osp
+import time
+
+import torch
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+WINDOW_SIZE = 32
+CANDIDATE_PATCH_SIZES = [64, 128, 192, 256, 320, 384, 448, 512]
+DEFAULT_CACHE_PATH = osp.join(osp.expanduser('~'), '.cache', 'pft-sr', 'patch_calibration.json')
+
+
+def _device_name(device):
+    if str(device).startswith('cuda') and torch.cuda.is_available():
+        return torch.cuda.get_device_name(torch.device(device)).replace(' ', '_')
+    return 'cpu'
+
+
+def calibration_key(task, scale, device):
+    """Cache key of one calibration: (task, scale, device, thread count)"""
+    return f"{task}_x{scale}_{_device_name(device)}_t{torch.get_num_threads()}"
+
+
+def _current_rss():
+    """Resident set size of this process in bytes (0 if unknown)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _hwm_rss():
+    """Peak resident set size of this process since the last _reset_peak_rss, in bytes (None if unknown)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Reset the peak resident set size (VmHWM) to the current one (Linux); False if unsupported"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return False
+    return _hwm_rss() is not None
+
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes (0 if unknown)"""
+    hwm = _hwm_rss()
+    if hwm is not None:
+        return hwm
+    if resource is None:
+        return 0
+    # ru_maxrss is reported in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _synchronize(device):
+    if str(device).startswith('cuda'):
+        torch.cuda.synchronize()
+
+
+def calibrate_patch_sizes(model, device, candidates=None, repeats=2):
+    """
+    Measure latency and peak memory of the model on square patches
+
+    On CPU the peak is the RSS high-water mark, reset before each size where
+    the kernel supports it (Linux /proc/self/clear_refs). Otherwise it is the
+    lifetime peak of the process: a size whose run does not raise it (e.g.
+    below the memory spike of the model load) is recorded as unmeasured
+    (peak_mem None). Candidates are measured in ascending order, so a peak is
+    an upper bound of the footprint of its size.
+
+    Args:
+        model: SR model
+        device: Device
+        candidates: Window-aligned patch sizes (default: CANDIDATE_PATCH_SIZES)
+        repeats: Number of timed runs per size (after one warm-up run)
+
+    Returns:
+        dict: {str(size): {'latency': sec, 'sec_per_mpix': sec, 'peak_mem': bytes or None}}
+    """
+    candidates = sorted(candidates or CANDIDATE_PATCH_SIZES)
+    is_cuda = str(device).startswith('cuda')
+    baseline = torch.cuda.memory_allocated(device) if is_cuda else _current_rss()
+    resettable = not is_cuda and _reset_peak_rss()
+    lifetime_peak = _peak_rss()
+
+    results = {}
+    with torch.no_grad():
+        for size in candidates:
+            if size % WINDOW_SIZE != 0:
+                raise ValueError(f"Patch size {size} is not a multiple of the window size {WINDOW_SIZE}.")
+            print(f"  Calibrating {size} x {size}", end='\r')
+            dummy = torch.rand(1, 3, size, size, device=device)
+            if is_cuda:
+                torch.cuda.reset_peak_memory_stats(device)
+            elif resettable:
+                _reset_peak_rss()
+                baseline = _current_rss()
+            try:
+                model(dummy)
+                _synchronize(device)
+                start = time.perf_counter()
+                for _ in range(repeats):
+                    model(dummy)
+                _synchronize(device)
+            except RuntimeError as e:
+                # Out of memory: this size and every larger one will not fit
+                if 'out of memory' not in str(e):
+                    raise
+                if is_cuda:
+                    torch.cuda.empty_cache()
+                print(f"  Calibrating {size} x {size} - out of memory")
+                break
+            latency = (time.perf_counter() - start) / repeats
+
+            if is_cuda:
+                peak_mem = torch.cuda.max_memory_allocated(device) - baseline
+                torch.cuda.empty_cache()
+            elif resettable:
+                peak_mem = max(0, _peak_rss() - baseline)
+            else:
+                peak = _peak_rss()
+                # a peak that did not rise comes from earlier (e.g. the model load), not from this size
+                peak_mem = peak - baseline if peak > lifetime_peak else None
+                lifetime_peak = max(lifetime_peak, peak)
+
+            results[str(size)] = {
+                'latency': latency,
+                'sec_per_mpix': latency / (size * size / 1e6),
+                'peak_mem': peak_mem,
+            }
+    print(f"  Calibrated {len(results)}/{len(candidates)} patch sizes")
+
+    return results
+
+
+def load_calibration(cache_path=DEFAULT_CACHE_PATH):
+    if not osp.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f"Warning: ignoring unreadable calibration cache: {cache_path}")
+        return {}
+
+
+def save_calibration(calibration, cache_path=DEFAULT_CACHE_PATH):
+    os.makedirs(osp.dirname(osp.abspath(cache_path)), exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(calibration, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def pick_patch_size(results, mem_budget=None, image_size=None):
+    """
+    Pick the fastest patch size (per megapixel) that fits the memory budget
+
+    Args:
+        results: Calibration results of calibrate_patch_sizes
+        mem_budget: Memory budget in bytes or None (no limit)
+        image_size: (width, height) or None. Sizes beyond the (window-aligned)
+            image size are skipped, since they only add padding.
+
+    Returns:
+        int: Patch size
+    """
+    sizes = sorted(int(s) for s in results)
+    if not sizes:
+        raise ValueError("No calibration results to choose a patch size from.")
+
+    if image_size is not None:
+        max_side = max(image_size)
+        limit = ((max_side + WINDOW_SIZE - 1) // WINDOW_SIZE) * WINDOW_SIZE
+        sizes = [s for s in sizes if s <= limit] or sizes[:1]
+
+    fitting = [s for s in sizes if mem_budget is None or _peak_bound(results, s) <= mem_budget]
+    if not fitting:
+        print(f"Warning: no patch size fits the memory budget, using the smallest ({sizes[0]}).")
+        return sizes[0]
+
+    return min(fitting, key=lambda s: results[str(s)]['sec_per_mpix'])
+
+
+def _peak_bound(results, size):
+    """
+    Peak memory of a calibrated size, or for an unmeasured one (peak_mem None) the peak of the next
+    larger measured size, which bounds it. Infinite if no larger size was measured.
+    """
+    for s in sorted(int(s) for s in results):
+        if s >= size and results[str(s)]['peak_mem'] is not None:
+            return results[str(s)]['peak_mem']
+    return float('inf')
+
+
+def _model_bytes(model):
+    return sum(p.numel() * p.element_size() for p in model.parameters()) + \
+        sum(b.numel() * b.element_size() for b in model.buffers())
+
+
+def estimated_peak_mem(model, size, batch=1):
+    """
+    Analytic peak memory (bytes) of the model on batch x size (height, width) inputs: PFT.memory()
+    plus the weights, without running the model
+    """
+    return model.memory(size, batch=batch) + _model_bytes(model)
+
+
+def estimate_patch_size(model, mem_budget, image_size=None, candidates=None):
+    """
+    Largest patch size whose estimated peak memory fits the budget (no calibration run)
+
+    Args:
+        model: PFT model
+        mem_budget: Memory budget in bytes
+        image_size: (width, height) or None. Sizes beyond the (window-aligned) image size are skipped.
+        candidates: Window-aligned patch sizes (default: CANDIDATE_PATCH_SIZES)
+
+    Returns:
+        int: Patch size
+    """
+    sizes = sorted(candidates or CANDIDATE_PATCH_SIZES)
+    if image_size is not None:
+        limit = ((max(image_size) + WINDOW_SIZE - 1) // WINDOW_SIZE) * WINDOW_SIZE
+        sizes = [s for s in sizes if s <= limit] or sizes[:1]
+
+    fitting = [s for s in sizes if estimated_peak_mem(model, (s, s)) <= mem_budget]
+    if not fitting:
+        print(f"Warning: no patch size fits the memory budget, using the smallest ({sizes[0]}).")
+        return sizes[0]
+    return fitting[-1]
+
+
+def fit_batch_size(model, size, mem_budget, max_batch):
+    """
+    Largest batch size (at most max_batch, at least 1) of size (height, width) inputs whose
+    estimated peak memory fits the budget
+    """
+    if mem_budget is None:
+        return max_batch
+    weights = _model_bytes(model)
+    batch = max_batch
+    while batch > 1 and model.memory(size, batch=batch) + weights > mem_budget:
+        batch -= 1
+    return batch
+
+
+def select_patch_auto(model, task, scale, device, image_size=None, mem_budget=None,
+                      cache_path=DEFAULT_CACHE_PATH, recalibrate=False):
+    """
+    Choose the patch size automatically (headless replacement of select_patch_settings)
+
+    Calibration results are cached per (task, scale, device, thread count), so
+    only the first run on a machine pays for the calibration.
+
+    Args:
+        model: SR model
+        task: 'classical' or 'lightweight'
+        scale: Upscale factor
+        device: Device
+        image_size: (width, height) of the image to process or None
+        mem_budget: Memory budget in bytes or None (no limit)
+        cache_path: Calibration cache file path
+        recalibrate: Ignore cached results
+
+    Returns:
+        (patch_width, patch_height)
+    """
+    key = calibration_key(task, scale, device)
+    calibration = load_calibration(cache_path)
+
+    if recalibrate or key not in calibration:
+        print(f"Calibrating patch sizes for {key}...")
+        calibration[key] = calibrate_patch_sizes(model, device)
+        save_calibration(calibration, cache_path)
+        print(f"Calibration saved to: {cache_path}")
+
+    size = pick_patch_size(calibration[key], mem_budget, image_size)
+    stats = calibration[key][str(size)]
+    peak = 'unmeasured' if stats['peak_mem'] is None else f"{stats['peak_mem'] / 1024 ** 2:.0f} MB"
+    print(f"Auto patch size: {size} x {size} ({stats['sec_per_mpix']:.3f} s/MP, peak {peak})")
+
+    return (size, size)
+
+
+def parse_mem_budget(value):
+    """Parse a memory budget such as '512M', '4G' or '4096' (MB) into bytes"""
+    if value is None:
+        return None
+    value = str(value).strip().upper()
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    if value[-1:] == 'B':
+        value = value[:-1]
+    if value[-1:] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(float(value) * units['M'])
+
+
+def parse_patch_size(value):
+    """Parse an explicit patch size such as '256' or '384x256' into (width, height)"""
+    parts = str(value).lower().split('x')
+    if len(parts) == 1:
+        return (int(parts[0]), int(parts[0]))
+    if len(parts) == 2:
+        return (int(parts[0]), int(parts[1]))
+    raise ValueError(f"Invalid patch size: {value}")
@@ -1,14 +1,42 @@
+import queue
+import threading
+import time
+
 import torch
 import torch.nn.functional as F
 
+from .result_cache import content_digest, model_digest
+
+
+_END = object()
+
 
 class PatchProcessor:
     """Splits image into patches for inference and merges results"""
 
-    def __init__(self, patch_width=256, patch_height=256, overlap_ratio=0.1):
+    def __init__(self, patch_width=256, patch_height=256, overlap_ratio=0.1, pipeline=True, prefetch=2,
+                 tile_callback=None, cache=None):
+        """
+        Args:
+            patch_width: Patch width
+            patch_height: Patch height
+            overlap_ratio: Overlap between neighbouring patches (ratio of the patch size)
+            pipeline: Overlap patch extraction, inference and merge in separate threads
+            prefetch: Number of patches prepared ahead of the model (pipeline mode)
+            tile_callback: Optional callable(idx, (top, left), tile) called from the merge
+                thread after a tile has been written (e.g. to encode it). top/left are the
+                output slices of the tile, tile is the merged (1, C, h, w) CPU tensor.
+            cache: Optional ResultCache. Patch outputs are cached by patch content, so
+                unchanged regions of an edited image are not recomputed.
+        """
         self.patch_width = patch_width
         self.patch_height = patch_height
         self.overlap_ratio = overlap_ratio
+        self.pipeline = pipeline
+        self.prefetch = prefetch
+        self.tile_callback = tile_callback
+        self.cache = cache
+        self.timings = {}
 
     def process(self, image_tensor, model, device, scale):
         """
@@ -23,8 +51,58 @@ class PatchProcessor:
         Returns:
             output_tensor: Output image tensor (1, C, H*scale, W*scale)
         """
+        start = time.perf_counter()
+        self.timings = {'prefetch': 0.0, 'inference': 0.0, 'merge': 0.0}
+
         _, C, h, w = image_tensor.size()
+        mod_pad_h, mod_pad_w, (ral, row), slices, merge_slices = self.plan(h, w, scale)
+
+        # Apply padding
+        img = F.pad(image_tensor, (0, mod_pad_w, 0, mod_pad_h), 'reflect')
+        _, _, H, W = img.size()
+
+        total_patches = len(slices)
+        print(f"Processing {total_patches} patches ({ral}x{row})")
+
+        _img = torch.zeros(1, C, H * scale, W * scale)
+        model_key = model_digest(model) if self.cache is not None else None
+
+        if self.pipeline:
+            self._run_pipeline(img, slices, merge_slices, _img, model, device, model_key)
+        else:
+            self._run_sequential(img, slices, merge_slices, _img, model, device, model_key)
+
+        # Clear cache once after all patches processed
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        print(f"  Patch {total_patches}/{total_patches} - Done")
+
+        # Remove padding
+        _, _, h_out, w_out = _img.size()
+        output = _img[:, :, 0:h_out - mod_pad_h * scale, 0:w_out - mod_pad_w * scale]
+
+        self.timings['total'] = time.perf_counter() - start
+        self._print_timings()
+
+        return output
 
+    def plan(self, h, w, scale):
+        """
+        Patch layout of an image
+
+        Args:
+            h: Image height
+            w: Image width
+            scale: Upscale factor
+
+        Returns:
+            mod_pad_h, mod_pad_w: Bottom / right (reflect) padding of the input
+            (rows, columns): Patch grid
+            slices: (top, left) input slices of each patch (in the padded input)
+            merge_slices: (top, left, _top, _left) output region of each patch and the
+                matching region inside the patch output
+        """
         # Calculate number of patches
         split_token_h = max(1, h // self.patch_height + (1 if h % self.patch_height else 0))
         split_token_w = max(1, w // self.patch_width + (1 if w % self.patch_width else 0))
@@ -36,9 +114,7 @@ class PatchProcessor:
         if w % split_token_w != 0:
             mod_pad_w = split_token_w - w % split_token_w
 
-        # Apply padding
-        img = F.pad(image_tensor, (0, mod_pad_w, 0, mod_pad_h), 'reflect')
-        _, _, H, W = img.size()
+        H, W = h + mod_pad_h, w + mod_pad_w
 
         # Calculate patch size
         split_h = H // split_token_h
@@ -75,30 +151,8 @@ class PatchProcessor:
 
                 slices.append((top, left))
 
-        # Extract patches
-        img_chops = []
-        for top, left in slices:
-            img_chops.append(img[..., top, left])
-
-        total_patches = len(img_chops)
-        print(f"Processing {total_patches} patches ({ral}x{row})")
-
-        # Inference on each patch
-        outputs = []
-        for idx, chop in enumerate(img_chops):
-            print(f"  Patch {idx + 1}/{total_patches}", end='\r')
-            out = model(chop.to(device))
-            outputs.append(out.cpu())
-
-        # Clear cache once after all patches processed
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-
-        print(f"  Patch {total_patches}/{total_patches} - Done")
-
-        # Merge results
-        _img = torch.zeros(1, C, H * scale, W * scale)
-
+        # Calculate merge slices: (output region, region inside the patch output)
+        merge_slices = []
         for i in range(ral):
             for j in range(row):
                 top = slice(i * split_h * scale, (i + 1) * split_h * scale)
@@ -114,10 +168,166 @@ class PatchProcessor:
                 else:
                     _left = slice(shave_w * scale, (shave_w + split_w) * scale)
 
-                _img[..., top, left] = outputs[i * row + j][..., _top, _left]
+                merge_slices.append((top, left, _top, _left))
 
-        # Remove padding
-        _, _, h_out, w_out = _img.size()
-        output = _img[:, :, 0:h_out - mod_pad_h * scale, 0:w_out - mod_pad_w * scale]
+        return mod_pad_h, mod_pad_w, (ral, row), slices, merge_slices
 
-        return output
+    @staticmethod
+    def _wait(out):
+        """Wait for the device work producing out (CUDA runs asynchronously), so it is timed as inference"""
+        if out.is_cuda:
+            event = torch.cuda.Event()
+            event.record(torch.cuda.current_stream(out.device))
+            event.synchronize()
+
+    def _prepare(self, img, top, left, device, model_key=None):
+        """
+        Extract one patch, ready for a fast (asynchronous) transfer to the device
+
+        Returns:
+            (chop, cache key or None, cached output or None)
+        """
+        chop = img[..., top, left].contiguous()
+        key, cached = None, None
+        if self.cache is not None:
+            key = self.cache.make_key('patch', content_digest(chop), model_key)
+            cached = self.cache.get_tensor(key)
+            if cached is not None:
+                return None, key, cached
+        if str(device).startswith('cuda') and chop.device.type == 'cpu':
+            chop = chop.pin_memory()
+        return chop, key, cached
+
+    def _merge(self, idx, out, merge_slices, _img):
+        top, left, _top, _left = merge_slices[idx]
+        _img[..., top, left] = out[..., _top, _left]
+        if self.tile_callback is not None:
+            self.tile_callback(idx, (top, left), _img[..., top, left])
+
+    def _run_sequential(self, img, slices, merge_slices, _img, model, device, model_key=None):
+        total_patches = len(slices)
+        outputs = []
+        for idx, (top, left) in enumerate(slices):
+            print(f"  Patch {idx + 1}/{total_patches}", end='\r')
+            t0 = time.perf_counter()
+            chop, key, out = self._prepare(img, top, left, device, model_key)
+            t1 = time.perf_counter()
+            if out is None:
+                out = model(chop.to(device))
+                self._wait(out)
+            t2 = time.perf_counter()
+            out = out.cpu()
+            if chop is not None and key is not None:
+                self.cache.put(key, out)
+            outputs.append(out)
+            t3 = time.perf_counter()
+            self.timings['prefetch'] += t1 - t0
+            self.timings['inference'] += t2 - t1
+            self.timings['merge'] += t3 - t2
+
+        t0 = time.perf_counter()
+        for idx, out in enumerate(outputs):
+            self._merge(idx, out, merge_slices, _img)
+        self.timings['merge'] += time.perf_counter() - t0
+
+    def _run_pipeline(self, img, slices, merge_slices, _img, model, device, model_key=None):
+        """
+        Producer/consumer pipeline:
+            prefetch thread -> (bounded queue) -> model (this thread) -> (bounded queue) -> merge thread
+        """
+        total_patches = len(slices)
+        in_queue = queue.Queue(maxsize=max(1, self.prefetch))
+        out_queue = queue.Queue(maxsize=max(1, self.prefetch))
+        stop = threading.Event()
+        errors = []
+
+        def _put(q, item):
+            # Give up when the other side has failed, instead of blocking forever
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def _get(q):
+            while not stop.is_set():
+                try:
+                    return q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            return _END
+
+        def producer():
+            try:
+                for idx, (top, left) in enumerate(slices):
+                    t0 = time.perf_counter()
+                    item = (idx,) + self._prepare(img, top, left, device, model_key)
+                    self.timings['prefetch'] += time.perf_counter() - t0
+                    if not _put(in_queue, item):
+                        return
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+            finally:
+                _put(in_queue, _END)
+
+        def consumer():
+            try:
+                while True:
+                    item = _get(out_queue)
+                    if item is _END:
+                        return
+                    idx, out, key = item
+                    t0 = time.perf_counter()
+                    out = out.cpu()
+                    if key is not None:
+                        self.cache.put(key, out)
+                    self._merge(idx, out, merge_slices, _img)
+                    self.timings['merge'] += time.perf_counter() - t0
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+        producer_thread = threading.Thread(target=producer, name='patch-prefetch', daemon=True)
+        consumer_thread = threading.Thread(target=consumer, name='patch-merge', daemon=True)
+        producer_thread.start()
+        consumer_thread.start()
+
+        try:
+            while True:
+                item = _get(in_queue)
+                if item is _END:
+                    break
+                idx, chop, key, out = item
+                print(f"  Patch {idx + 1}/{total_patches}", end='\r')
+                if out is None:
+                    t0 = time.perf_counter()
+                    out = model(chop.to(device, non_blocking=True))
+                    self._wait(out)
+                    self.timings['inference'] += time.perf_counter() - t0
+                else:
+                    key = None  # cache hit, nothing to store
+                if not _put(out_queue, (idx, out, key)):
+                    break
+        except Exception:
+            stop.set()
+            raise
+        finally:
+            # gives up if the consumer fails meanwhile (a blocking put on a full queue would hang)
+            _put(out_queue, _END)
+            consumer_thread.join()
+            stop.set()
+            producer_thread.join()
+
+        if errors:
+            raise errors[0]
+
+    def _print_timings(self):
+        total = self.timings['total']
+        if total <= 0:
+            return
+        print("  Stage timings: " + ", ".join(
+            f"{stage} {self.timings[stage]:.3f}s" for stage in ('prefetch', 'inference', 'merge', 'total')
+        ) + f" (model utilization {100 * self.timings['inference'] / total:.1f}%)")
@@ -0,0 +1,137 @@
+import hashlib
+import os
+import os.path as osp
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import torch
+
+
+DEFAULT_CACHE_DIR = osp.join(osp.expanduser('~'), '.cache', 'pft-sr', 'results')
+DEFAULT_CACHE_SIZE = 10 * 1024 ** 3
+
+
+def content_digest(data):
+    """Hash of a tensor / array / bytes content"""
+    if isinstance(data, torch.Tensor):
+        data = data.detach().cpu().contiguous().numpy()
+    if isinstance(data, np.ndarray):
+        header = f"{data.dtype}{data.shape}".encode()
+        data = np.ascontiguousarray(data).data
+    else:
+        header = b''
+    h = hashlib.blake2b(header, digest_size=20)
+    h.update(data)
+    return h.hexdigest()
+
+
+def model_digest(model):
+    """Hash of the model weights and its top-k schedule (memoized on the model)"""
+    digest = getattr(model, '_result_cache_digest', None)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=20)
+        for name, tensor in model.state_dict().items():
+            h.update(name.encode())
+            h.update(content_digest(tensor).encode())
+        topk = [m.topk for m in model.modules() if hasattr(m, 'topk') and isinstance(m.topk, int)]
+        h.update(repr((getattr(model, 'upscale', None), getattr(model, 'window_size', None), topk)).encode())
+        digest = h.hexdigest()
+        model._result_cache_digest = digest
+    return digest
+
+
+class ResultCache:
+    """
+    Disk-backed cache of SR outputs with size-bounded LRU eviction
+
+    Entries are stored as .npy files named by the hash of their key; the access
+    order is kept in memory and mirrored to the file modification times, so it
+    survives between runs.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> size, least recently used first
+
+        os.makedirs(cache_dir, exist_ok=True)
+        entries = []
+        for root, _, files in os.walk(cache_dir):
+            for file in files:
+                if file.endswith('.npy'):
+                    stat = os.stat(osp.join(root, file))
+                    entries.append((stat.st_mtime, file[:-4], stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self.total_bytes += size
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.blake2b(repr(parts).encode(), digest_size=20).hexdigest()
+
+    def _path(self, key):
+        return osp.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def get(self, key):
+        """Return the cached array (or None) and update the statistics"""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        path = self._path(key)
+        try:
+            array = np.load(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            # Removed by another process or truncated: treat as a miss
+            with self._lock:
+                self.total_bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return array
+
+    def get_tensor(self, key):
+        array = self.get(key)
+        return None if array is None else torch.from_numpy(array)
+
+    def put(self, key, data):
+        if isinstance(data, torch.Tensor):
+            data = data.detach().cpu().numpy()
+        path = self._path(key)
+        os.makedirs(osp.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, data)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+
+    def print_stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = 100 * self.hits / lookups if lookups else 0.0
+        print(f"Cache: {self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), "
+              f"{self.evictions} evictions, {self.total_bytes / 1024 ** 2:.1f} / "
+              f"{self.max_bytes / 1024 ** 2:.0f} MB in {self.cache_dir}")
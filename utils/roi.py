@@ -0,0 +1,142 @@
+import torch
+from torchvision import transforms
+
+
+def _conv_radius(module):
+    """Spatial radius of a (sequence of) convolution(s)"""
+    radius = 0
+    for m in module.modules():
+        if isinstance(m, torch.nn.Conv2d):
+            radius += (m.kernel_size[0] - 1) // 2 * m.dilation[0]
+    return radius
+
+
+def _window_cover(start, end, window_size, offset):
+    """Smallest union of windows (boundaries at offset + k * window_size) covering [start, end)"""
+    start = (start - offset) // window_size * window_size + offset
+    end = -((offset - end) // window_size) * window_size + offset
+    return start, end
+
+
+def receptive_field(model, start, end):
+    """
+    Input interval (along one axis, LR pixels) that the output pixels of [start, end) depend on
+
+    The interval is propagated backwards through the network: convolutions grow it by
+    their radius, (shifted) window attention snaps it to the enclosing windows, and the
+    LePE / ConvFFN depthwise convolutions grow it by their radius. Since windows and
+    kernels are separable, the same function serves both axes.
+
+    Args:
+        model: PFT model
+        start: First LR pixel of the output region
+        end: End (exclusive) LR pixel of the output region
+
+    Returns:
+        (start, end) of the input interval (not clamped to the image)
+    """
+    window_size = model.window_size
+
+    # reconstruction (upsampling convs are counted at LR resolution, which is conservative)
+    for name in ('conv_last', 'upsample', 'conv_before_upsample', 'conv_after_body'):
+        if hasattr(model, name):
+            radius = _conv_radius(getattr(model, name))
+            start, end = start - radius, end + radius
+
+    # deep feature extraction
+    for block in reversed(model.layers):
+        radius = _conv_radius(block.conv)
+        start, end = start - radius, end + radius
+        for layer in reversed(block.residual_group.layers):
+            # ConvFFN
+            radius = _conv_radius(layer.convffn.dwconv)
+            start, end = start - radius, end + radius
+            # (S)W-MSA with LePE
+            win_start, win_end = _window_cover(start, end, window_size, layer.shift_size)
+            radius = _conv_radius(layer.v_LePE)
+            start, end = min(win_start, start - radius), max(win_end, end + radius)
+
+    # shallow feature extraction
+    radius = _conv_radius(model.conv_first)
+    return start - radius, end + radius
+
+
+def roi_context_box(model, roi, image_size, margin=None):
+    """
+    Input box to run the model on, so that the ROI output matches the full-image result
+
+    The box origin is aligned to the window grid of the full image, which keeps the
+    (shifted) window partitions inside the box identical to the full-image ones.
+
+    Args:
+        model: PFT model
+        roi: (x1, y1, x2, y2) in LR pixels
+        image_size: (width, height)
+        margin: Context margin in LR pixels or None (full receptive field: exact result)
+
+    Returns:
+        (x1, y1, x2, y2) of the context box
+    """
+    x1, y1, x2, y2 = roi
+    width, height = image_size
+    window_size = model.window_size
+
+    if margin is None:
+        cx1, cx2 = receptive_field(model, x1, x2)
+        cy1, cy2 = receptive_field(model, y1, y2)
+    else:
+        cx1, cx2 = x1 - margin, x2 + margin
+        cy1, cy2 = y1 - margin, y2 + margin
+
+    cx1 = max(0, cx1) // window_size * window_size
+    cy1 = max(0, cy1) // window_size * window_size
+    cx2 = min(width, cx2)
+    cy2 = min(height, cy2)
+
+    return (cx1, cy1, cx2, cy2)
+
+
+def parse_roi(value):
+    """Parse an ROI given as 'x1,y1,x2,y2'"""
+    try:
+        x1, y1, x2, y2 = (int(v) for v in str(value).split(','))
+    except ValueError:
+        raise ValueError(f"Invalid ROI: {value} (expected x1,y1,x2,y2)")
+    return (x1, y1, x2, y2)
+
+
+def process_roi(image, roi, model, device, scale, margin=None):
+    """
+    Super-resolve only a region of interest
+
+    Args:
+        image: PIL Image
+        roi: (x1, y1, x2, y2) in LR pixels (e.g. from select_roi)
+        model: SR model
+        device: Device
+        scale: Upscale factor
+        margin: Context margin in LR pixels or None (full receptive field: exact result)
+
+    Returns:
+        PIL Image of size ((x2 - x1) * scale, (y2 - y1) * scale)
+    """
+    width, height = image.size
+    x1, y1, x2, y2 = roi
+    x1, x2 = max(0, min(x1, x2)), min(width, max(x1, x2))
+    y1, y2 = max(0, min(y1, y2)), min(height, max(y1, y2))
+    if x2 <= x1 or y2 <= y1:
+        raise ValueError(f"Empty ROI: {roi}")
+
+    cx1, cy1, cx2, cy2 = roi_context_box(model, (x1, y1, x2, y2), (width, height), margin)
+    print(f"ROI: ({x1}, {y1}) - ({x2}, {y2}), {x2 - x1} x {y2 - y1}")
+    print(f"Context: ({cx1}, {cy1}) - ({cx2}, {cy2}), {cx2 - cx1} x {cy2 - cy1}")
+
+    with torch.no_grad():
+        image_input = transforms.ToTensor()(image.crop((cx1, cy1, cx2, cy2))).unsqueeze(0).to(device)
+        image_output = model(image_input)
+        image_output = image_output[...,
+                                    (y1 - cy1) * scale:(y2 - cy1) * scale,
+                                    (x1 - cx1) * scale:(x2 - cx1) * scale]
+        image_output = image_output.clamp(0.0, 1.0)[0].cpu()
+
+    return transforms.ToPILImage()(image_output)
@@ -0,0 +1,346 @@
+import glob
+import os
+import os.path as osp
+import queue
+import re
+import time
+
+import torch
+import torch.multiprocessing as mp
+import torch.nn.functional as F
+from torchvision import transforms
+
+from .directory_runner import JOURNAL_NAME, Journal, find_images, read_image, save_image_atomic
+from .inference import upscale_image
+from .model import load_model
+from .patch_processor import PatchProcessor
+
+
+def parse_cpulist(text):
+    """Parse a Linux CPU list such as '0-3,8-11' into a set of CPU ids"""
+    cpus = set()
+    for part in filter(None, text.strip().split(',')):
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _allowed_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return set(os.sched_getaffinity(0))
+    return set(range(os.cpu_count() or 1))
+
+
+def numa_nodes():
+    """CPUs of each NUMA node (Linux sysfs) that this process may run on; one node if unknown"""
+    allowed = _allowed_cpus()
+    paths = glob.glob('/sys/devices/system/node/node[0-9]*/cpulist')
+    nodes = []
+    for path in sorted(paths, key=lambda p: int(re.search(r'node(\d+)', p).group(1))):
+        with open(path, 'r') as f:
+            cpus = parse_cpulist(f.read()) & allowed
+        if cpus:
+            nodes.append(sorted(cpus))
+    return nodes or [sorted(allowed)]
+
+
+def plan_affinity(workers, mode='none'):
+    """
+    CPUs of each worker
+
+    Args:
+        workers: Number of workers
+        mode: 'none' (no pinning), 'cores' (split the allowed CPUs into contiguous
+            groups) or 'numa' (spread the workers over the NUMA nodes and split the
+            CPUs of each node among its workers)
+
+    Returns:
+        list: Sorted CPU list of each worker, or None per worker for 'none'
+    """
+    if mode == 'none':
+        return [None] * workers
+    if mode == 'cores':
+        groups = [sorted(_allowed_cpus())]
+    elif mode == 'numa':
+        groups = numa_nodes()
+    else:
+        raise ValueError(f"Unknown affinity mode: {mode}")
+
+    # workers are assigned round-robin to the groups, then each group is split evenly
+    members = [list(range(g, workers, len(groups))) for g in range(len(groups))]
+    plan = [None] * workers
+    for cpus, ranks in zip(groups, members):
+        if not ranks:
+            continue
+        if len(cpus) < len(ranks):
+            for i, rank in enumerate(ranks):
+                plan[rank] = [cpus[i % len(cpus)]]
+            continue
+        size, extra = divmod(len(cpus), len(ranks))
+        start = 0
+        for i, rank in enumerate(ranks):
+            end = start + size + (1 if i < extra else 0)
+            plan[rank] = cpus[start:end]
+            start = end
+    return plan
+
+
+def share_weights(model):
+    """
+    Move the parameters and buffers of a CPU model into shared memory
+
+    Forked workers then map the same pages instead of each holding a copy (copy-on-write
+    pages of a plain fork get duplicated as soon as anything touches them).
+
+    Returns:
+        int: Shared bytes
+    """
+    total = 0
+    for tensor in list(model.parameters()) + list(model.buffers()):
+        tensor.share_memory_()
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def _worker(rank, model, scale, cpus, threads, jobs, results):
+    """Worker process: run jobs from the queue until the None sentinel"""
+    if cpus is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(threads)
+
+    while True:
+        job = jobs.get()
+        if job is None:
+            break
+        kind, key = job[0], job[1]
+        start = time.perf_counter()
+        result = {'kind': kind, 'key': key, 'rank': rank, 'error': None, 'output': None, 'mpix': 0.0}
+        try:
+            if kind == 'file':
+                input_path, output_path, patch_size = job[2], job[3], job[4]
+                image = read_image(input_path)
+                image_output = upscale_image(image, model, 'cpu', scale, patch_size)
+                os.makedirs(osp.dirname(output_path), exist_ok=True)
+                save_image_atomic(image_output, output_path)
+                result['mpix'] = image.size[0] * image.size[1] / 1e6
+            else:
+                tile = job[2]
+                with torch.no_grad():
+                    result['output'] = model(tile)
+                result['mpix'] = tile.shape[-2] * tile.shape[-1] / 1e6
+        except Exception as e:
+            result['error'] = f"{type(e).__name__}: {e}"
+        result['seconds'] = time.perf_counter() - start
+        results.put(result)
+
+
+class ShardedRunner:
+    """
+    Multi-process CPU inference: N forked workers sharing one copy of the weights
+
+    The model is loaded once in the parent, its weights are moved to shared memory,
+    and N workers are forked, each with its own torch.set_num_threads and optionally
+    pinned to a group of CPUs (or a NUMA node). Whole files or the tiles of one large
+    image are distributed through a work queue, so faster workers take more jobs.
+
+    Several smaller processes scale better than one process using every core: each
+    keeps its intra-op thread pool (and, pinned, its memory) within a socket.
+
+    Example:
+        with ShardedRunner('lightweight', 4, workers=4, affinity='numa') as runner:
+            runner.process_directory('inputs', 'outputs', output_name)
+    """
+
+    def __init__(self, task, scale, workers=2, threads=None, affinity='none', dtype=torch.float32, pretrained=True,
+                 start_method='fork'):
+        """
+        Args:
+            task: 'classical' or 'lightweight'
+            scale: Upscale factor
+            workers: Number of worker processes
+            threads: torch threads per worker (default: its CPUs when pinned, otherwise
+                the allowed CPUs divided by the number of workers)
+            affinity: 'none', 'cores' or 'numa' (see plan_affinity)
+            dtype: Model dtype
+            pretrained: Load the pretrained weights
+            start_method: 'fork', or 'forkserver' when the parent has already run
+                multi-threaded torch code (the workers then receive the shared weights
+                through shared-memory handles instead of inheriting them)
+        """
+        self.task = task
+        self.scale = scale
+        self.workers = max(1, workers)
+        self.affinity = plan_affinity(self.workers, affinity)
+        default_threads = max(1, len(_allowed_cpus()) // self.workers)
+        self.threads = [threads or (len(cpus) if cpus else default_threads) for cpus in self.affinity]
+        self.dtype = dtype
+        self.pretrained = pretrained
+        self.start_method = start_method
+        self.model = None
+        self._processes = []
+
+    def start(self):
+        # with fork, no multi-threaded torch code may have run in the parent (OpenMP thread pools do not survive it)
+        self.model = load_model(self.task, self.scale, 'cpu', self.dtype, pretrained=self.pretrained)
+        self.shared_bytes = share_weights(self.model)
+
+        ctx = mp.get_context(self.start_method)
+        self._jobs = ctx.Queue()
+        self._results = ctx.Queue()
+        for rank in range(self.workers):
+            process = ctx.Process(target=_worker, name=f'pft-shard-{rank}', daemon=True,
+                                  args=(rank, self.model, self.scale, self.affinity[rank], self.threads[rank],
+                                        self._jobs, self._results))
+            process.start()
+            self._processes.append(process)
+
+        print(f"Started {self.workers} workers ({self.shared_bytes / 1024 ** 2:.1f} MB shared weights): "
+              + ", ".join(f"{t} threads" + (f" on CPUs {_format_cpus(c)}" if c else "")
+                          for t, c in zip(self.threads, self.affinity)))
+        return self
+
+    def close(self):
+        for _ in self._processes:
+            self._jobs.put(None)
+        for process in self._processes:
+            process.join()
+        self._processes = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _collect(self, count):
+        """Yield count results, failing (instead of waiting forever) if a worker died"""
+        received = 0
+        while received < count:
+            try:
+                result = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if not all(process.is_alive() for process in self._processes):
+                    raise RuntimeError("A worker process exited unexpectedly")
+                continue
+            received += 1
+            yield result
+
+    def process_files(self, jobs, journal=None, patch_size=None):
+        """
+        Super-resolve files
+
+        Args:
+            jobs: list of (rel_path, input_path, output_path)
+            journal: Journal recording completed outputs, or None
+            patch_size: (width, height) or None (whole images)
+
+        Returns:
+            dict: Run statistics, including the per-worker image counts
+        """
+        stats = {'images': 0, 'failed': 0, 'input_mpix': 0.0, 'busy': [0.0] * self.workers,
+                 'per_worker': [0] * self.workers}
+        start = time.perf_counter()
+        paths = {}
+        for rel_path, input_path, output_path in jobs:
+            paths[rel_path] = (input_path, output_path)
+            self._jobs.put(('file', rel_path, input_path, output_path, patch_size))
+
+        for result in self._collect(len(jobs)):
+            rel_path = result['key']
+            stats['busy'][result['rank']] += result['seconds']
+            if result['error'] is not None:
+                stats['failed'] += 1
+                print(f"Error: {rel_path}: {result['error']}")
+                continue
+            if journal is not None:
+                journal.add(rel_path, *paths[rel_path])
+            stats['images'] += 1
+            stats['input_mpix'] += result['mpix']
+            stats['per_worker'][result['rank']] += 1
+            print(f"[{stats['images'] + stats['failed']}/{len(jobs)}] {rel_path} (worker {result['rank']})")
+
+        stats['seconds'] = time.perf_counter() - start
+        return stats
+
+    def upscale_tensor(self, image_tensor, patch_size):
+        """
+        Super-resolve one image by distributing its tiles (PatchProcessor layout) over the workers
+
+        Args:
+            image_tensor: Input image tensor (1, C, H, W) in the model dtype
+            patch_size: (width, height)
+
+        Returns:
+            output_tensor: Output image tensor (1, C, H*scale, W*scale)
+        """
+        scale = self.scale
+        _, C, h, w = image_tensor.size()
+        mod_pad_h, mod_pad_w, (ral, row), slices, merge_slices = PatchProcessor(*patch_size).plan(h, w, scale)
+        img = F.pad(image_tensor, (0, mod_pad_w, 0, mod_pad_h), 'reflect')
+        _, _, H, W = img.size()
+        print(f"Processing {len(slices)} patches ({ral}x{row}) on {self.workers} workers")
+
+        for idx, (top, left) in enumerate(slices):
+            self._jobs.put(('tile', idx, img[..., top, left].contiguous()))
+
+        _img = torch.zeros(1, C, H * scale, W * scale, dtype=image_tensor.dtype)
+        for result in self._collect(len(slices)):
+            if result['error'] is not None:
+                raise RuntimeError(f"Tile {result['key']} failed: {result['error']}")
+            top, left, _top, _left = merge_slices[result['key']]
+            _img[..., top, left] = result['output'][..., _top, _left]
+
+        return _img[:, :, 0:H * scale - mod_pad_h * scale, 0:W * scale - mod_pad_w * scale]
+
+    def upscale_image(self, image, patch_size):
+        """Super-resolve one PIL Image, its tiles distributed over the workers"""
+        image_input = transforms.ToTensor()(image).unsqueeze(0).to(self.dtype)
+        image_output = self.upscale_tensor(image_input, patch_size).clamp(0.0, 1.0)[0]
+        return transforms.ToPILImage()(image_output.float())
+
+    def process_directory(self, in_dir, out_dir, output_name, patch_size=None, recursive=True, resume=True):
+        """Super-resolve every image in a directory (same layout and journal as process_directory)"""
+        os.makedirs(out_dir, exist_ok=True)
+        journal_path = osp.join(out_dir, JOURNAL_NAME)
+        if not resume and osp.exists(journal_path):
+            os.remove(journal_path)
+        journal = Journal(journal_path)
+
+        jobs = []
+        skipped = 0
+        out_root = osp.join(osp.abspath(out_dir), '')
+        for rel_path in find_images(in_dir, recursive):
+            input_path = osp.join(in_dir, rel_path)
+            if osp.abspath(input_path).startswith(out_root):
+                continue
+            output_path = osp.join(out_dir, osp.dirname(rel_path), output_name(osp.basename(rel_path)))
+            if journal.is_done(rel_path, input_path, output_path):
+                skipped += 1
+            else:
+                jobs.append((rel_path, input_path, output_path))
+        print(f"Found {len(jobs) + skipped} images, {skipped} already done, {len(jobs)} to process")
+
+        try:
+            stats = self.process_files(jobs, journal, patch_size)
+        finally:
+            journal.close()
+        stats['skipped'] = skipped
+
+        seconds = max(stats['seconds'], 1e-9)
+        print(f"Processed {stats['images']} images in {stats['seconds']:.1f}s "
+              f"({stats['skipped']} skipped, {stats['failed']} failed) on {self.workers} workers: "
+              f"{stats['images'] / seconds:.2f} images/s, {stats['input_mpix'] / seconds:.3f} MP/s input")
+        print("  Images per worker: " + ", ".join(str(n) for n in stats['per_worker']))
+        return stats
+
+
+def _format_cpus(cpus):
+    """Compact CPU list, e.g. [0, 1, 2, 3, 8] -> '0-3,8'"""
+    ranges = []
+    for cpu in cpus:
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
@@ -0,0 +1,233 @@
+import os.path as osp
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+import torch
+
+from .patch_processor import PatchProcessor
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.m4v', '.mov', '.avi', '.mkv', '.webm')
+FOURCC = {'.mp4': 'mp4v', '.m4v': 'mp4v', '.mov': 'mp4v', '.avi': 'XVID', '.mkv': 'XVID', '.webm': 'VP80'}
+
+_END = object()
+
+
+class TemporalTileReuse:
+    """
+    Per tile position, the LR tile last sent to the model and its SR output
+
+    A new tile whose mean absolute difference to that reference LR tile is within
+    threshold (in 0-255 pixel values) reuses the reference SR tile. Comparing with
+    the last computed tile (not the previous frame) keeps slow changes from
+    accumulating into drift.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.references = {}  # tile index -> (LR tile uint8, SR tile)
+
+    def matches(self, lr_tile, reference):
+        if reference is None:
+            return False
+        return (lr_tile.float() - reference.float()).abs().mean().item() <= self.threshold
+
+
+def _run_tile(model, device, dtype, lr_tiles, reuse, idx):
+    """
+    Super-resolve one tile position for a batch of frames
+
+    Args:
+        lr_tiles: (N, C, h, w) uint8 tiles of consecutive frames
+
+    Returns:
+        (list of N SR tiles, number of reused tiles)
+    """
+    reference_lr, reference_sr = (None, None)
+    if reuse is not None:
+        reference_lr, reference_sr = reuse.references.get(idx, (None, None))
+
+    # sources: SR tile of each frame, as a tensor (reused) or an index into the computed batch
+    sources = []
+    compute = []
+    for k in range(lr_tiles.size(0)):
+        if reuse is not None and reuse.matches(lr_tiles[k], reference_lr):
+            sources.append(reference_sr)
+        else:
+            compute.append(k)
+            reference_lr, reference_sr = lr_tiles[k], len(compute) - 1
+            sources.append(reference_sr)
+
+    if compute:
+        with torch.no_grad():
+            out = model(lr_tiles[compute].to(dtype).div(255).to(device)).clamp(0.0, 1.0).cpu()
+    outputs = [out[s] if isinstance(s, int) else s for s in sources]
+
+    if reuse is not None:
+        reuse.references[idx] = (reference_lr, out[reference_sr] if isinstance(reference_sr, int) else reference_sr)
+    return outputs, lr_tiles.size(0) - len(compute)
+
+
+def process_video(input_path, output_path, model, device, scale, patch_size_fn=None, batch_frames=4,
+                  reuse_threshold=None, fourcc=None, prefetch=8):
+    """
+    Super-resolve a video
+
+    Frames are decoded (cv2.VideoCapture) and encoded (cv2.VideoWriter) in separate
+    threads while the model runs. Each frame is split into the PatchProcessor tile
+    layout, and the tiles at the same position of batch_frames consecutive frames
+    are run as one batch. Audio is not copied.
+
+    Args:
+        input_path: Input video path
+        output_path: Output video path
+        model: SR model
+        device: Device
+        scale: Upscale factor
+        patch_size_fn: callable((width, height)) -> patch size or None (whole frames)
+        batch_frames: Number of frames per batch
+        reuse_threshold: Reuse the previous SR tile for tiles whose mean absolute LR
+            difference (0-255) is within this threshold, or None to recompute every tile
+        fourcc: Output codec (default: from the output extension)
+        prefetch: Number of frames decoded ahead of the model
+
+    Returns:
+        dict: Run statistics
+    """
+    capture = cv2.VideoCapture(input_path)
+    if not capture.isOpened():
+        raise IOError(f"Cannot open video: {input_path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    fourcc = fourcc or FOURCC.get(osp.splitext(output_path)[1].lower(), 'mp4v')
+    writer = cv2.VideoWriter(output_path, cv2.VideoWriter_fourcc(*fourcc), fps, (width * scale, height * scale))
+    if not writer.isOpened():
+        capture.release()
+        raise IOError(f"Cannot open video writer ({fourcc}): {output_path}")
+
+    patch_size = patch_size_fn((width, height)) if patch_size_fn is not None else None
+    patch_width, patch_height = patch_size or (width, height)
+    mod_pad_h, mod_pad_w, grid, slices, merge_slices = PatchProcessor(patch_width, patch_height).plan(
+        height, width, scale)
+    print(f"Video: {width} x {height}, {fps:.2f} fps, {frame_count} frames, "
+          f"{len(slices)} tiles per frame ({grid[0]}x{grid[1]})")
+
+    dtype = next(model.parameters()).dtype
+    reuse = TemporalTileReuse(reuse_threshold) if reuse_threshold is not None else None
+    stats = {'frames': 0, 'tiles': 0, 'reused': 0}
+    frames_queue = queue.Queue(maxsize=max(1, prefetch))
+    write_queue = queue.Queue(maxsize=max(1, prefetch))
+    stop = threading.Event()
+    errors = []
+
+    def _put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def reader():
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok or not _put(frames_queue, frame):
+                    break
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(frames_queue, _END)
+
+    def encoder():
+        try:
+            while True:
+                frame = _get(write_queue)
+                if frame is _END:
+                    return
+                writer.write(frame)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+
+    reader_thread = threading.Thread(target=reader, name='video-decode', daemon=True)
+    encoder_thread = threading.Thread(target=encoder, name='video-encode', daemon=True)
+    reader_thread.start()
+    encoder_thread.start()
+    start = time.perf_counter()
+
+    try:
+        done = False
+        while not done:
+            frames = []
+            while len(frames) < batch_frames:
+                frame = _get(frames_queue)
+                if frame is _END:
+                    done = True
+                    break
+                frames.append(frame)
+            if not frames:
+                break
+
+            # BGR -> RGB, reflect padding as in PatchProcessor, NCHW uint8
+            batch = np.stack(frames)[..., ::-1]
+            batch = np.pad(batch, ((0, 0), (0, mod_pad_h), (0, mod_pad_w), (0, 0)), mode='reflect')
+            batch = torch.from_numpy(np.ascontiguousarray(batch)).permute(0, 3, 1, 2)
+            n, C, H, W = batch.size()
+
+            output = torch.zeros(n, C, H * scale, W * scale)
+            for idx, (top, left) in enumerate(slices):
+                tiles, reused = _run_tile(model, device, dtype, batch[..., top, left], reuse, idx)
+                out_top, out_left, _top, _left = merge_slices[idx]
+                for k, tile in enumerate(tiles):
+                    output[k, :, out_top, out_left] = tile[:, _top, _left]
+                stats['tiles'] += n
+                stats['reused'] += reused
+
+            # same quantization as torchvision ToPILImage, RGB -> BGR
+            output = output[..., :height * scale, :width * scale].mul(255).byte().permute(0, 2, 3, 1).numpy()
+            for frame in output:
+                if not _put(write_queue, np.ascontiguousarray(frame[..., ::-1])):
+                    break
+
+            stats['frames'] += n
+            elapsed = time.perf_counter() - start
+            print(f"  Frame {stats['frames']}/{frame_count} ({stats['frames'] / elapsed:.2f} fps)", end='\r')
+    except Exception:
+        stop.set()
+        raise
+    finally:
+        if not stop.is_set():
+            write_queue.put(_END)
+        encoder_thread.join()
+        stop.set()
+        reader_thread.join()
+        capture.release()
+        writer.release()
+
+    if errors:
+        raise errors[0]
+
+    stats['seconds'] = time.perf_counter() - start
+    stats['fps'] = stats['frames'] / max(stats['seconds'], 1e-9)
+    stats['reuse_rate'] = stats['reused'] / stats['tiles'] if stats['tiles'] else 0.0
+    print(f"\nProcessed {stats['frames']} frames in {stats['seconds']:.1f}s: {stats['fps']:.2f} fps"
+          + (f", {100 * stats['reuse_rate']:.1f}% of tiles reused ({stats['reused']}/{stats['tiles']})"
+             if reuse is not None else ""))
+    return stats